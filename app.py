@@ -38,12 +38,18 @@ def create_app():
     from routes.admin import admin_bp
     from routes.api import api_bp
     from routes.files import files_bp
+    from routes.metrics import metrics_bp
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(qr_bp)
     app.register_blueprint(admin_bp)
     app.register_blueprint(api_bp)
     app.register_blueprint(files_bp)
+    app.register_blueprint(metrics_bp)
+    
+    # Rendre la connexion MySQL au pool à la fin de chaque requête
+    from database import db
+    app.teardown_appcontext(db.release_connection)
     
     return app
 
@@ -3,10 +3,22 @@ Scanne tous les dossiers, sous-dossiers et fichiers pour créer les QR codes cor
 """
 
 import os
+import time
 import logging
+import argparse
+from collections import Counter
 from pathlib import Path
 from database import db
-from qr_generator import qr_generator 
+import queries
+from qr_generator import qr_generator, QR_IMAGE_FORMATS
+from qr_render_pipeline import QRRenderPipeline
+from qr_image_cache import qr_image_cache
+from scan_manifest import ScanManifest
+from content_hasher import ContentHasher
+from sequence_allocator import sequence_allocator
+from resolve_cache import resolve_cache
+from counters import increment_documents, increment_subcategories
+from metrics import scanner_phase_seconds, scanner_phase_entries, scanner_items
 from dotenv import load_dotenv
 
 # Charger les variables d'environnement
@@ -17,10 +29,43 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class ArchiveScanner:
-    def __init__(self):
+    def __init__(self, bulk=False, chunk_size=None, render_workers=None):
         self.archives_path = Path(os.environ.get('ARCHIVES_FOLDER', 'Archives'))
         self.base_url = os.environ.get('BASE_URL', 'http://localhost:5000')
         
+        # Mode bulk: existence vérifiée en mémoire, écritures par lots transactionnels
+        self.bulk = bulk
+        self.chunk_size = chunk_size or int(os.environ.get('SCAN_BULK_CHUNK_SIZE', 1000))
+        self._known_files = set()
+        self._known_qr = set()
+        self._pending = []
+        
+        # Rendu des images QR en parallèle de l'enregistrement en base
+        self.render_workers = render_workers
+        self.render_pipeline = None
+        self.render_stats = None
+        
+        # Caches du scan incrémental
+        self._category_ids = {}
+        self._subcategory_infos = {}
+        
+        # Empreintes de contenu (détection des déplacements et renommages)
+        self.hasher = ContentHasher()
+        self._file_hashes = {}
+        
+        # Compteurs de progression (lus par les tâches de scan en arrière-plan)
+        self.progress = {
+            'phase': 'pending',
+            'directories': 0,
+            'files_new': 0,
+            'files_existing': 0,
+            'files_moved': 0,
+            'files_hashed': 0,
+            'errors': 0
+        }
+        self._phase_started = time.monotonic()
+        self._published = {}
+    
     def scan_and_register_all(self):
         """Scanner complètement la structure Archives/ et enregistrer tout en base"""
         logger.info("=== Début du scan de la structure Archives/ ===")
@@ -30,16 +75,27 @@ class ArchiveScanner:
             self.archives_path.mkdir(parents=True, exist_ok=True)
             logger.info(f"Dossier {os.environ.get('ARCHIVES_FOLDER', 'Archives')} créé")
             
+        self._start_rendering()
         try:
+            if self.bulk:
+                self._preload_existing()
+            
             # 1. Scanner et enregistrer les catégories (dossiers racine)
+            self._enter_phase('categories')
             categories = self._scan_categories()
             
             # 2. Scanner et enregistrer les sous-catégories
+            self._enter_phase('subcategories')
             subcategories = self._scan_subcategories(categories)
             
             # 3. Scanner et enregistrer tous les fichiers
+            self._enter_phase('files')
             files = self._scan_files(subcategories)
             
+            if self.bulk:
+                self._flush_pending()
+            self._enter_phase('rendering')
+            
             # Compter les nouveaux vs existants
             new_files = [f for f in files if f and f.get('status') == 'new']
             existing_files = [f for f in files if f and f.get('status') == 'existing']
@@ -49,6 +105,10 @@ class ArchiveScanner:
             logger.info(f"{len(subcategories)} sous-catégories") 
             logger.info(f"{len(new_files)} nouveaux fichiers ajoutés")
             logger.info(f"{len(existing_files)} fichiers existants ignorés")
+            logger.info(f"{self.progress['files_moved']} documents déplacés")
+            if self.bulk:
+                failed_files = [f for f in files if f and f.get('status') == 'error']
+                logger.info(f"{len(failed_files)} fichiers en erreur")
             logger.info(f"{len(files)} fichiers traités au total")
             
             return True
@@ -56,6 +116,288 @@ class ArchiveScanner:
         except Exception as e:
             logger.error(f"Erreur lors du scan: {e}")
             return False
+        finally:
+            self._finish_rendering()
+            self._enter_phase('done')
+    
+    def scan_incremental(self, manifest_path=None):
+        """Re-scanner uniquement les dossiers modifiés depuis le dernier scan (manifeste persistant)"""
+        logger.info("=== Début du scan incrémental de la structure Archives/ ===")
+        
+        if not self.archives_path.exists():
+            logger.warning(f"Le dossier {self.archives_path} n'existe pas - création...")
+            self.archives_path.mkdir(parents=True, exist_ok=True)
+        
+        self._start_rendering()
+        try:
+            manifest = ScanManifest(manifest_path).load()
+            directories, changes = manifest.diff(self.archives_path)
+            logger.info(f"{changes['listed_dirs']} dossiers modifiés listés, {changes['skipped_dirs']} dossiers inchangés ignorés")
+            self.progress['directories'] += changes['listed_dirs']
+            
+            if self.bulk:
+                self._preload_existing()
+            
+            result = self.apply_changes(
+                changes['new_dirs'], changes['new_files'], changes['modified_files'], changes['deleted_files']
+            )
+            
+            # Les dossiers et fichiers en échec seront retentés au prochain scan
+            for directory in result['failed_dirs']:
+                manifest.forget_directory(directories, directory)
+            for file_path in result['failed']:
+                manifest.forget_file(directories, file_path)
+            for file_path in result['unhashed']:
+                manifest.mark_modified(directories, file_path)
+            
+            manifest.directories = directories
+            manifest.save()
+            self._enter_phase('rendering')
+            
+            logger.info(f"=== Scan incrémental terminé ===")
+            logger.info(f"{len(result['registered'])} nouveaux fichiers ajoutés")
+            logger.info(f"{len(result['moved'])} documents déplacés")
+            logger.info(f"{len(changes['modified_files']) - len(result['unhashed'])} fichiers modifiés ré-hachés")
+            logger.info(f"{result['retired']} documents retirés")
+            logger.info(f"{len(result['failed']) + len(result['unhashed'])} fichiers en erreur")
+            
+            return True
+        
+        except Exception as e:
+            logger.error(f"Erreur lors du scan incrémental: {e}")
+            return False
+        finally:
+            self._finish_rendering()
+            self._enter_phase('done')
+    
+    def apply_changes(self, new_dirs, new_files, modified_files, deleted_files, deleted_dirs=()):
+        """Appliquer des changements de l'arborescence (scan incrémental, surveillance de Archives/)
+        
+        `deleted_files` sont des chemins tels qu'enregistrés dans documents.file_path; les documents
+        des dossiers de `deleted_dirs` sont retirés aussi. Retourne un dict: nouveaux fichiers
+        enregistrés, fichiers en échec, chemins déplacés, fichiers modifiés non hachés, dossiers
+        en échec et nombre de documents retirés.
+        """
+        deleted_files = list(deleted_files)
+        for directory in deleted_dirs:
+            deleted_files.extend(self._documents_under(ScanManifest.key(directory)))
+        
+        # 1. Nouveaux dossiers de catégorie / sous-catégorie (parents d'abord)
+        self._enter_phase('directories')
+        failed_dirs = []
+        for directory in sorted(new_dirs, key=lambda path: len(path.parts)):
+            try:
+                self._register_directory(directory)
+            except Exception as e:
+                logger.error(f"Erreur lors de l'enregistrement du dossier {directory}: {e}")
+                self.progress['errors'] += 1
+                failed_dirs.append(directory)
+        
+        # 2. Fichiers déplacés ou renommés: rattachés à leur document par empreinte
+        self._enter_phase('hashing')
+        moved_files, moved_from = self._match_moves(new_files, deleted_files)
+        
+        # Fichiers remplacés sous le même nom: empreinte, taille et mtime mis à jour
+        unhashed = self._rehash_files(modified_files)
+        self.progress['errors'] += len(unhashed)
+        
+        # 3. Nouveaux fichiers
+        self._enter_phase('files')
+        files = []
+        for file_path in new_files:
+            if ScanManifest.key(file_path) in moved_files:
+                continue
+            file_info = self._register_changed_file(file_path)
+            if file_info is not False:
+                files.append((file_path, file_info))
+                self._count_file(file_info)
+        
+        if self.bulk:
+            self._flush_pending()
+        
+        # 4. Fichiers supprimés
+        self._enter_phase('retiring')
+        retired = sum(self._retire_file(path) for path in deleted_files if path not in moved_from)
+        
+        return {
+            'registered': [path for path, info in files if info and info.get('status') == 'new'],
+            'failed': [path for path, info in files if not info or info.get('status') == 'error'],
+            'moved': moved_files,
+            'unhashed': unhashed,
+            'failed_dirs': failed_dirs,
+            'retired': retired
+        }
+    
+    def registered_paths(self, paths):
+        """Chemins (clés du manifeste) parmi `paths` qui ont déjà un document en base"""
+        keys = [ScanManifest.key(path) for path in paths]
+        registered = set()
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            rows = db.execute_query_safe(
+                queries.DOCUMENT_PATHS_IN.format(placeholders=placeholders),
+                tuple(chunk)
+            ) or []
+            registered.update(row['file_path'] for row in rows)
+        return registered
+    
+    def _enter_phase(self, phase):
+        """Passer à une phase du scan (durée de la phase précédente comptabilisée)"""
+        now = time.monotonic()
+        previous = self.progress['phase']
+        if previous not in ('pending', 'done'):
+            scanner_phase_seconds.inc((previous,), now - self._phase_started)
+        scanner_phase_entries.inc((phase,))
+        self._phase_started = now
+        self.progress['phase'] = phase
+        
+        # Fin du scan: compteurs de progression publiés (écart depuis la dernière publication)
+        if phase == 'done':
+            for key in ('directories', 'files_new', 'files_existing', 'files_moved', 'files_hashed', 'errors'):
+                delta = self.progress[key] - self._published.get(key, 0)
+                if delta:
+                    scanner_items.inc((key,), delta)
+                    self._published[key] = self.progress[key]
+    
+    def progress_snapshot(self):
+        """Copie des compteurs de progression, y compris les QR rendus"""
+        snapshot = dict(self.progress)
+        stats = self.render_pipeline.stats if self.render_pipeline else self.render_stats
+        snapshot['qr_rendered'] = stats['rendered'] if stats else 0
+        snapshot['qr_failed'] = stats['failed'] if stats else 0
+        return snapshot
+    
+    def _count_file(self, file_info):
+        """Comptabiliser le résultat de l'enregistrement d'un fichier"""
+        if not file_info:
+            self.progress['errors'] += 1
+        elif file_info.get('status') == 'existing':
+            self.progress['files_existing'] += 1
+        elif not self.bulk:
+            self.progress['files_new'] += 1
+        # Mode bulk: les nouveaux fichiers sont comptés à la validation de leur lot
+    
+    def _start_rendering(self):
+        """Démarrer le pipeline de rendu des images QR pour ce scan"""
+        self.render_pipeline = QRRenderPipeline(workers=self.render_workers).start()
+    
+    def _finish_rendering(self):
+        """Attendre la fin des rendus QR en cours et conserver les statistiques"""
+        if self.render_pipeline:
+            self.render_stats = self.render_pipeline.close()
+            self.render_pipeline = None
+    
+    def _render_qr(self, qr_identifier, qr_payload):
+        """Générer l'image QR (via le pipeline parallèle pendant un scan)"""
+        if self.render_pipeline:
+            return self.render_pipeline.submit(qr_identifier, qr_payload)
+        return qr_generator.generate_qr_code(qr_identifier, qr_payload)
+    
+    def _register_directory(self, directory):
+        """Scan incrémental: enregistrer un nouveau dossier de catégorie ou de sous-catégorie"""
+        parts = directory.relative_to(self.archives_path).parts
+        
+        if len(parts) == 1:
+            logger.info(f"Traitement catégorie: {parts[0]}")
+            category_id = self._get_category_id(parts[0])
+            self._create_category_qr(category_id, parts[0])
+        elif len(parts) == 2:
+            logger.info(f"   Traitement sous-catégorie: {parts[0]}/{parts[1]}")
+            subcat_info = self._get_subcategory_info(parts[0], parts[1])
+            self._create_subcategory_qr(subcat_info['id'], parts[0], parts[1])
+    
+    def _register_changed_file(self, file_path):
+        """Scan incrémental: enregistrer un fichier selon sa position dans l'arborescence"""
+        parts = file_path.relative_to(self.archives_path).parts
+        
+        if len(parts) == 1:
+            logger.info(f"   Fichier racine: {file_path.name}")
+            return self._register_root_file(file_path)
+        
+        # Les fichiers posés directement dans un dossier de catégorie ne sont pas enregistrés
+        if len(parts) == 2:
+            return False
+        
+        logger.info(f"   Fichier: {file_path.relative_to(self.archives_path)}")
+        try:
+            subcat_info = self._get_subcategory_info(parts[0], parts[1])
+        except Exception:
+            return None
+        return self._register_file(file_path, subcat_info, self._extract_year_from_path(file_path))
+    
+    def _get_category_id(self, category_name):
+        """Scan incrémental: ID de catégorie mis en cache pour la durée du scan"""
+        if category_name not in self._category_ids:
+            self._category_ids[category_name] = self._get_or_create_category(category_name)
+        return self._category_ids[category_name]
+    
+    def _get_subcategory_info(self, category_name, subcategory_name):
+        """Scan incrémental: informations de sous-catégorie mises en cache pour la durée du scan"""
+        key = (category_name, subcategory_name)
+        if key not in self._subcategory_infos:
+            category_id = self._get_category_id(category_name)
+            self._subcategory_infos[key] = {
+                'id': self._get_or_create_subcategory(category_id, subcategory_name),
+                'category_name': category_name,
+                'subcategory_name': subcategory_name,
+                'category_id': category_id
+            }
+        return self._subcategory_infos[key]
+    
+    def _retire_file(self, relative_path):
+        """Retirer de la base un document dont le fichier a disparu"""
+        try:
+            filename = relative_path.rsplit('/', 1)[-1]
+            query = """
+            SELECT d.id, d.document_code, d.subcategory_id, c.name as category_name, sc.name as subcategory_name,
+                   q.qr_payload, q.qr_image_path
+            FROM documents d
+            JOIN subcategories sc ON d.subcategory_id = sc.id
+            JOIN categories c ON sc.category_id = c.id
+            LEFT JOIN qrcodes q ON q.document_id = d.id
+            WHERE d.filename = %s AND d.file_path = %s
+            """
+            existing_doc = db.execute_query_safe(query, (filename, relative_path))
+            if not existing_doc:
+                return 0
+            
+            # Les QR codes associés sont supprimés en cascade
+            db.execute_query("DELETE FROM documents WHERE id = %s", (existing_doc[0]['id'],))
+            increment_documents(existing_doc[0]['subcategory_id'], -1)
+            
+            # Images partagées par payload: supprimées seulement si plus aucun QR ne les référence
+            qr_payload = existing_doc[0]['qr_payload']
+            if qr_payload and not db.execute_query_safe(
+                "SELECT 1 FROM qrcodes WHERE qr_image_path = %s LIMIT 1", (existing_doc[0]['qr_image_path'],)
+            ):
+                qr_generator.delete_qr_images(qr_payload)
+            for image_format in QR_IMAGE_FORMATS:
+                qr_image_cache.discard(f"{existing_doc[0]['document_code']}.{image_format}")
+            resolve_cache.invalidate_document(
+                existing_doc[0]['document_code'],
+                existing_doc[0]['category_name'],
+                existing_doc[0]['subcategory_name']
+            )
+            
+            logger.info(f"   Document retiré: {existing_doc[0]['document_code']} ({relative_path})")
+            return 1
+        except Exception as e:
+            logger.error(f"Erreur lors du retrait du document {relative_path}: {e}")
+            return 0
+    
+    def _documents_under(self, relative_dir):
+        """Chemins des documents enregistrés sous un dossier"""
+        prefix = relative_dir.rstrip('/').replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        rows = db.execute_query_safe(
+            queries.DOCUMENT_PATHS_UNDER,
+            (f"{prefix}/%",)
+        ) or []
+        return [row['file_path'] for row in rows]
+    
+    def _retire_directory(self, relative_dir):
+        """Retirer de la base tous les documents d'un dossier disparu"""
+        return sum(self._retire_file(path) for path in self._documents_under(relative_dir))
     
     def _scan_categories(self):
         """Scanner et enregistrer toutes les catégories (dossiers racine)"""
@@ -67,6 +409,7 @@ class ArchiveScanner:
                 if item.is_dir():
                     category_name = item.name
                     logger.info(f"Traitement catégorie: {category_name}")
+                    self.progress['directories'] += 1
                     
                     # Créer ou récupérer la catégorie en base
                     category_id = self._get_or_create_category(category_name)
@@ -97,6 +440,7 @@ class ArchiveScanner:
                     if item.is_dir():
                         subcat_name = item.name
                         logger.info(f"   Traitement sous-catégorie: {cat_name}/{subcat_name}")
+                        self.progress['directories'] += 1
                         
                         # Créer ou récupérer la sous-catégorie
                         subcat_id = self._get_or_create_subcategory(category_id, subcat_name)
@@ -123,52 +467,236 @@ class ArchiveScanner:
         files = []
         
         try:
-            # Scanner les fichiers dans les sous-catégories
+            # Inventaire des PDF: sous-catégories (récursivement) puis racine
+            subcat_files = []
             for subcat_key, subcat_info in subcategories.items():
                 subcat_path = subcat_info['path']
-                files.extend(self._scan_files_in_directory(subcat_path, subcat_info))
+                subcat_files.extend((item, subcat_info) for item in self._list_files_in_directory(subcat_path))
+            root_files = [
+                item for item in self.archives_path.iterdir()
+                if item.is_file() and item.suffix.lower() == '.pdf'
+            ]
             
-            # Scanner les fichiers directement dans les catégories
-            for item in self.archives_path.iterdir():
-                if item.is_file() and item.suffix.lower() == '.pdf':
-                    logger.info(f"   Fichier racine: {item.name}")
-                    file_info = self._register_root_file(item)
-                    if file_info:
-                        files.append(file_info)
+            # Empreintes des fichiers nouveaux ou modifiés, documents déplacés rattachés
+            self._enter_phase('hashing')
+            self._detect_moves([item for item, subcat_info in subcat_files] + root_files)
+            self._enter_phase('files')
+            
+            # Enregistrer les fichiers des sous-catégories
+            for item, subcat_info in subcat_files:
+                logger.info(f"   Fichier: {item.relative_to(self.archives_path)}")
+                
+                # Extraire l'année du chemin si possible
+                year = self._extract_year_from_path(item)
+                
+                file_info = self._register_file(item, subcat_info, year)
+                self._count_file(file_info)
+                if file_info:
+                    files.append(file_info)
+            
+            # Enregistrer les fichiers directement à la racine
+            for item in root_files:
+                logger.info(f"   Fichier racine: {item.name}")
+                file_info = self._register_root_file(item)
+                self._count_file(file_info)
+                if file_info:
+                    files.append(file_info)
         except Exception as e:
             logger.error(f"Erreur lors du scan des fichiers: {e}")
         
         return files
     
-    def _scan_files_in_directory(self, directory_path, subcat_info):
-        """Scanner récursivement les fichiers dans un répertoire"""
-        files = []
-        
+    def _list_files_in_directory(self, directory_path):
+        """Lister récursivement les PDF d'un répertoire"""
         try:
-            for item in directory_path.rglob('*.pdf'):
-                if item.is_file():
-                    logger.info(f"   Fichier: {item.relative_to(self.archives_path)}")
-                    
-                    # Extraire l'année du chemin si possible
-                    year = self._extract_year_from_path(item)
-                    
-                    file_info = self._register_file(item, subcat_info, year)
-                    if file_info:
-                        files.append(file_info)
+            return [item for item in directory_path.rglob('*.pdf') if item.is_file()]
         except Exception as e:
             logger.error(f"Erreur lors du scan du répertoire {directory_path}: {e}")
+            return []
         
-        return files
+    def _detect_moves(self, paths):
+        """Scan complet: hacher les fichiers nouveaux ou modifiés et rattacher les fichiers déplacés
+        
+        Seuls les fichiers sans document, sans empreinte ou dont la taille/mtime a changé sont lus.
+        """
+        known = {}
+        try:
+            for row in db.stream_query("SELECT id, file_path, content_hash, file_size, file_mtime FROM documents"):
+                known[row['file_path']] = row
+        except Exception as e:
+            logger.error(f"Erreur lors du chargement des empreintes: {e}")
+            return
+        
+        on_disk = {ScanManifest.key(path): path for path in paths}
+        to_hash = []
+        for key, path in on_disk.items():
+            row = known.get(key)
+            if row is None or row['content_hash'] is None:
+                to_hash.append(path)
+                continue
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            if (st.st_size, st.st_mtime_ns) != (row['file_size'], row['file_mtime']):
+                to_hash.append(path)
+        
+        hashes = {ScanManifest.key(path): result for path, result in self.hasher.hash_files(to_hash).items()}
+        self.progress['files_hashed'] += len(hashes)
+        
+        # Documents existants: mettre à jour l'empreinte des fichiers modifiés ou jamais hachés
+        updates = [(*hashes[key], known[key]['id']) for key in hashes if key in known]
+        if updates:
+            db.execute_many(
+                "UPDATE documents SET content_hash = %s, file_size = %s, file_mtime = %s WHERE id = %s",
+                updates
+            )
+        
+        # Documents dont le fichier a disparu, indexés par empreinte
+        missing = {}
+        for key, row in known.items():
+            if key not in on_disk and row['content_hash']:
+                missing.setdefault(row['content_hash'], []).append(key)
+        
+        new_hashes = {key: result for key, result in hashes.items() if key not in known}
+        self._file_hashes.update(new_hashes)
+        self._apply_moves(new_hashes, missing, on_disk)
+    
+    def _match_moves(self, new_files, deleted_files):
+        """Scan incrémental / surveillance: rattacher les nouveaux fichiers aux documents disparus de même contenu
+        
+        Retourne les nouveaux chemins rattachés et les anciens chemins consommés.
+        """
+        if not new_files:
+            return set(), set()
+        
+        on_disk = {ScanManifest.key(path): path for path in new_files}
+        hashes = {ScanManifest.key(path): result for path, result in self.hasher.hash_files(new_files).items()}
+        self.progress['files_hashed'] += len(hashes)
+        self._file_hashes.update(hashes)
+        
+        missing = {}
+        deleted_files = list(deleted_files)
+        for start in range(0, len(deleted_files), 500):
+            chunk = deleted_files[start:start + 500]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            rows = db.execute_query_safe(
+                queries.DOCUMENT_HASHES_BY_PATHS.format(placeholders=placeholders),
+                tuple(chunk)
+            ) or []
+            for row in rows:
+                missing.setdefault(row['content_hash'], []).append(row['file_path'])
+        
+        return self._apply_moves(hashes, missing, on_disk)
+    
+    def _rehash_files(self, paths):
+        """Mettre à jour l'empreinte des documents dont le fichier a été modifié sur place
+        
+        Retourne les fichiers qui n'ont pas pu être hachés (retentés au prochain scan).
+        """
+        if not paths:
+            return []
+        
+        hashes = self.hasher.hash_files(paths)
+        self.progress['files_hashed'] += len(hashes)
+        updates = [(*result, ScanManifest.key(path)) for path, result in hashes.items()]
+        if updates:
+            db.execute_many(
+                "UPDATE documents SET content_hash = %s, file_size = %s, file_mtime = %s WHERE file_path = %s",
+                updates
+            )
+        return [path for path in paths if path not in hashes]
+    
+    def _apply_moves(self, hashes, missing, on_disk):
+        """Rattacher chaque nouveau fichier au document disparu de même empreinte"""
+        moved_files, moved_from = set(), set()
+        for key, result in hashes.items():
+            candidates = missing.get(result[0])
+            while candidates:
+                old_path = candidates.pop()
+                # Une copie n'est pas un déplacement: l'ancien fichier doit avoir disparu
+                if Path(old_path).exists():
+                    continue
+                if self._move_document(old_path, on_disk[key], result):
+                    moved_files.add(key)
+                    moved_from.add(old_path)
+                break
+        return moved_files, moved_from
+    
+    def _locate_file(self, file_path):
+        """Sous-catégorie et année d'un fichier selon sa position (None s'il n'est pas enregistrable)"""
+        parts = file_path.relative_to(self.archives_path).parts
+        if len(parts) == 1:
+            return self._get_subcategory_info("GENERAL", "DIVERS"), 2025
+        if len(parts) == 2:
+            return None
+        return self._get_subcategory_info(parts[0], parts[1]), self._extract_year_from_path(file_path)
+    
+    def _move_document(self, old_path, file_path, content):
+        """Mettre à jour le chemin d'un document déplacé ou renommé (code et QR conservés)"""
+        try:
+            location = self._locate_file(file_path)
+            if location is None:
+                return False
+            subcat_info, year = location
+            
+            existing_doc = db.execute_query_safe("""
+            SELECT d.id, d.document_code, d.filename, d.subcategory_id, c.name as category_name, sc.name as subcategory_name
+            FROM documents d
+            JOIN subcategories sc ON d.subcategory_id = sc.id
+            JOIN categories c ON sc.category_id = c.id
+            WHERE d.file_path = %s
+            """, (old_path,))
+            if not existing_doc:
+                return False
+            doc = existing_doc[0]
+            
+            filename = file_path.name
+            new_path = ScanManifest.key(file_path)
+            content_hash, file_size, file_mtime = content
+            
+            with db.transaction():
+                # Le titre n'est renommé que s'il est encore celui dérivé de l'ancien nom de fichier
+                db.execute_query("""
+                UPDATE documents
+                SET filename = %s, file_path = %s, subcategory_id = %s, year = %s,
+                    title = CASE WHEN title = %s THEN %s ELSE title END,
+                    content_hash = %s, file_size = %s, file_mtime = %s
+                WHERE id = %s
+                """, (
+                    filename, new_path, subcat_info['id'], year,
+                    doc['filename'].replace('.pdf', ''), filename.replace('.pdf', ''),
+                    content_hash, file_size, file_mtime, doc['id']
+                ))
+                if doc['subcategory_id'] != subcat_info['id']:
+                    increment_documents(doc['subcategory_id'], -1)
+                    increment_documents(subcat_info['id'])
+            
+            resolve_cache.invalidate_document(doc['document_code'], doc['category_name'], doc['subcategory_name'])
+            resolve_cache.invalidate_document(doc['document_code'], subcat_info['category_name'], subcat_info['subcategory_name'])
+            self._known_files.discard((doc['filename'], old_path))
+            self._known_files.add((filename, new_path))
+            self.progress['files_moved'] += 1
+            
+            logger.info(f"   Document déplacé: {doc['document_code']} ({old_path} -> {new_path})")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Erreur lors du déplacement du document {old_path}: {e}")
+            return False
     
     def _register_file(self, file_path, subcat_info, year):
         """Enregistrer un fichier en base avec son QR code"""
+        if self.bulk:
+            return self._queue_file(file_path, subcat_info, year, f"Document {file_path.name}")
+        
         try:
             filename = file_path.name
             relative_path = str(file_path).replace('\\', '/')
             
             # Vérifier si le document existe déjà (même nom et même chemin)
             existing_doc = db.execute_query_safe(
-                "SELECT id, document_code FROM documents WHERE filename = %s AND file_path = %s", 
+                queries.DOCUMENT_BY_PATH,
                 (filename, str(relative_path))
             )
             
@@ -187,8 +715,9 @@ class ArchiveScanner:
             
             # Insérer le document
             insert_query = """
-            INSERT INTO documents (subcategory_id, document_code, filename, file_path, year, title, description)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            INSERT INTO documents (subcategory_id, document_code, filename, file_path, year, title, description,
+                                   content_hash, file_size, file_mtime)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             """
             db.execute_query(insert_query, (
                 subcat_info['id'], 
@@ -197,14 +726,17 @@ class ArchiveScanner:
                 str(relative_path), 
                 year, 
                 filename.replace('.pdf', ''), 
-                f"Document {filename}"
+                f"Document {filename}",
+                *self._file_hashes.get(relative_path, (None, None, None))
             ))
             
             # Récupérer l'ID du document
             document_id = db.execute_query("SELECT LAST_INSERT_ID() as id")[0]['id']
+            increment_documents(subcat_info['id'])
             
             # Créer le QR code
             self._create_document_qr(document_id, document_code)
+            resolve_cache.invalidate_document(document_code, subcat_info['category_name'], subcat_info['subcategory_name'])
             
             logger.info(f"   Nouveau document ajouté: {document_code}")
             
@@ -221,6 +753,9 @@ class ArchiveScanner:
     
     def _register_root_file(self, file_path):
         """Enregistrer un fichier à la racine d'Archives/"""
+        if self.bulk:
+            return self._queue_root_file(file_path)
+        
         try:
             filename = file_path.name
             relative_path = str(file_path).replace('\\', '/')
@@ -228,7 +763,7 @@ class ArchiveScanner:
             
             # Vérifier si le document existe déjà (même nom et même chemin)
             existing_doc = db.execute_query_safe(
-                "SELECT id, document_code FROM documents WHERE filename = %s AND file_path = %s", 
+                queries.DOCUMENT_BY_PATH,
                 (filename, str(relative_path))
             )
             
@@ -251,8 +786,9 @@ class ArchiveScanner:
             
             # Insérer le document
             insert_query = """
-            INSERT INTO documents (subcategory_id, document_code, filename, file_path, year, title, description)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            INSERT INTO documents (subcategory_id, document_code, filename, file_path, year, title, description,
+                                   content_hash, file_size, file_mtime)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             """
             db.execute_query(insert_query, (
                 general_subcat_id,
@@ -261,14 +797,17 @@ class ArchiveScanner:
                 str(relative_path),
                 year,
                 filename.replace('.pdf', ''),
-                f"Document racine {filename}"
+                f"Document racine {filename}",
+                *self._file_hashes.get(relative_path, (None, None, None))
             ))
             
             # Récupérer l'ID du document
             document_id = db.execute_query("SELECT LAST_INSERT_ID() as id")[0]['id']
+            increment_documents(general_subcat_id)
             
             # Créer le QR code
             self._create_document_qr(document_id, document_code)
+            resolve_cache.invalidate_document(document_code, "GENERAL", "DIVERS")
             
             logger.info(f"   Nouveau document racine ajouté: {document_code}")
             
@@ -288,11 +827,11 @@ class ArchiveScanner:
         try:
             qr_identifier = f"CAT-{category_name}"
             qr_payload = f"{self.base_url}/qr/{qr_identifier}"
-            qr_image_path = f"qr_images/{qr_identifier}.png"
+            qr_image_path = qr_generator.image_column(qr_payload)
             folder_path = f"Archives/{category_name}"
             
             # Vérifier si le QR existe déjà
-            existing = db.execute_query_safe("SELECT id FROM qrcodes WHERE qr_identifier = %s", (qr_identifier,))
+            existing = self._qr_exists(qr_identifier)
             if existing:
                 logger.info(f"   QR catégorie {category_name} existe déjà")
                 return
@@ -303,9 +842,11 @@ class ArchiveScanner:
             VALUES (%s, %s, %s, %s, %s, %s)
             """
             db.execute_query(qr_query, ('CATEGORY', qr_identifier, qr_payload, category_id, folder_path, qr_image_path))
+            self._known_qr.add(qr_identifier)
+            resolve_cache.invalidate_category(category_name)
             
             # Générer l'image QR
-            qr_generator.generate_qr_code(qr_identifier, qr_payload)
+            self._render_qr(qr_identifier, qr_payload)
             logger.info(f"QR créé pour catégorie: {category_name}")
             
         except Exception as e:
@@ -316,11 +857,11 @@ class ArchiveScanner:
         try:
             qr_identifier = f"SUBCAT-{category_name}-{subcategory_name}"
             qr_payload = f"{self.base_url}/qr/{qr_identifier}"
-            qr_image_path = f"qr_images/{qr_identifier}.png"
+            qr_image_path = qr_generator.image_column(qr_payload)
             folder_path = f"Archives/{category_name}/{subcategory_name}"
             
             # Vérifier si le QR existe déjà
-            existing = db.execute_query_safe("SELECT id FROM qrcodes WHERE qr_identifier = %s", (qr_identifier,))
+            existing = self._qr_exists(qr_identifier)
             if existing:
                 logger.info(f"   QR sous-catégorie {category_name}/{subcategory_name} existe déjà")
                 return
@@ -331,9 +872,11 @@ class ArchiveScanner:
             VALUES (%s, %s, %s, %s, %s, %s)
             """
             db.execute_query(qr_query, ('SUBCATEGORY', qr_identifier, qr_payload, subcategory_id, folder_path, qr_image_path))
+            self._known_qr.add(qr_identifier)
+            resolve_cache.invalidate_subcategory(category_name, subcategory_name)
             
             # Générer l'image QR
-            qr_generator.generate_qr_code(qr_identifier, qr_payload)
+            self._render_qr(qr_identifier, qr_payload)
             logger.info(f"QR créé pour sous-catégorie: {category_name}/{subcategory_name}")
             
         except Exception as e:
@@ -344,10 +887,10 @@ class ArchiveScanner:
         try:
             qr_identifier = document_code
             qr_payload = f"{self.base_url}/qr/{qr_identifier}"
-            qr_image_path = f"qr_images/{qr_identifier}.png"
+            qr_image_path = qr_generator.image_column(qr_payload)
             
             # Vérifier si le QR existe déjà
-            existing = db.execute_query_safe("SELECT id FROM qrcodes WHERE qr_identifier = %s", (qr_identifier,))
+            existing = self._qr_exists(qr_identifier)
             if existing:
                 logger.info(f"   QR document {document_code} existe déjà")
                 return
@@ -360,12 +903,161 @@ class ArchiveScanner:
             db.execute_query(qr_query, ('DOCUMENT', qr_identifier, qr_payload, document_id, qr_image_path))
             
             # Générer l'image QR
-            qr_generator.generate_qr_code(qr_identifier, qr_payload)
+            self._render_qr(qr_identifier, qr_payload)
             logger.info(f"QR créé pour document: {document_code}")
             
         except Exception as e:
             logger.error(f"Erreur création QR document {document_code}: {e}")
     
+    def _qr_exists(self, qr_identifier):
+        """Vérifier l'existence d'un QR code (en mémoire en mode bulk)"""
+        if self.bulk:
+            return qr_identifier in self._known_qr
+        return bool(db.execute_query_safe(queries.QR_BY_IDENTIFIER, (qr_identifier,)))
+    
+    def _preload_existing(self):
+        """Mode bulk: charger en mémoire les fichiers et QR codes déjà enregistrés"""
+        logger.info("Préchargement des documents et QR codes existants...")
+        rows = db.execute_query("SELECT filename, file_path FROM documents")
+        self._known_files = {(row['filename'], row['file_path']) for row in rows}
+        rows = db.execute_query("SELECT qr_identifier FROM qrcodes")
+        self._known_qr = {row['qr_identifier'] for row in rows}
+        self._pending = []
+        logger.info(f"{len(self._known_files)} documents et {len(self._known_qr)} QR codes préchargés")
+    
+    def _queue_file(self, file_path, subcat_info, year, description):
+        """Mode bulk: mettre un fichier en attente d'insertion groupée"""
+        filename = file_path.name
+        relative_path = str(file_path).replace('\\', '/')
+        
+        if (filename, relative_path) in self._known_files:
+            return {
+                'document_id': None,
+                'document_code': None,
+                'filename': filename,
+                'status': 'existing'
+            }
+        
+        self._known_files.add((filename, relative_path))
+        file_info = {
+            'document_id': None,
+            'document_code': None,
+            'filename': filename,
+            'file_path': relative_path,
+            'year': year,
+            'description': description,
+            'content': self._file_hashes.get(relative_path, (None, None, None)),
+            'subcategory_id': subcat_info['id'],
+            'category_name': subcat_info['category_name'],
+            'subcategory_name': subcat_info['subcategory_name'],
+            'status': 'new'
+        }
+        self._pending.append(file_info)
+        
+        if len(self._pending) >= self.chunk_size:
+            self._flush_pending()
+        
+        return file_info
+    
+    def _queue_root_file(self, file_path):
+        """Mode bulk: mettre un fichier racine en attente dans GENERAL/DIVERS"""
+        try:
+            general_cat_id = self._get_or_create_category("GENERAL")
+            general_subcat_id = self._get_or_create_subcategory(general_cat_id, "DIVERS")
+        except Exception as e:
+            logger.error(f"Erreur lors de l'enregistrement du fichier racine {file_path}: {e}")
+            return None
+        
+        subcat_info = {
+            'id': general_subcat_id,
+            'category_name': 'GENERAL',
+            'subcategory_name': 'DIVERS'
+        }
+        return self._queue_file(file_path, subcat_info, 2025, f"Document racine {file_path.name}")
+    
+    def _flush_pending(self):
+        """Mode bulk: insérer les documents en attente et leurs QR codes dans une seule transaction"""
+        if not self._pending:
+            return
+        
+        pending, self._pending = self._pending, []
+        new_codes = []
+        
+        try:
+            with db.transaction():
+                # Réserver une plage de séquences par (sous-catégorie, année)
+                counts = Counter((f['subcategory_id'], f['year']) for f in pending)
+                next_sequence = {
+                    key: self._reserve_sequence_range(key[0], key[1], count)
+                    for key, count in counts.items()
+                }
+                
+                document_rows = []
+                for f in pending:
+                    key = (f['subcategory_id'], f['year'])
+                    sequence_num = next_sequence[key]
+                    next_sequence[key] += 1
+                    f['document_code'] = f"{f['category_name']}-{f['subcategory_name']}-{f['year']}-{sequence_num:04d}"
+                    document_rows.append((
+                        f['subcategory_id'],
+                        f['document_code'],
+                        f['filename'],
+                        f['file_path'],
+                        f['year'],
+                        f['filename'].replace('.pdf', ''),
+                        f['description'],
+                        *f['content']
+                    ))
+                
+                # INSERT multi-lignes des documents
+                db.execute_many("""
+                INSERT INTO documents (subcategory_id, document_code, filename, file_path, year, title, description,
+                                       content_hash, file_size, file_mtime)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """, document_rows)
+                
+                # Compteurs matérialisés: un UPDATE par sous-catégorie touchée
+                for subcategory_id, count in Counter(f['subcategory_id'] for f in pending).items():
+                    increment_documents(subcategory_id, count)
+                
+                # QR codes créés en une requête à partir des documents insérés
+                new_codes = [f['document_code'] for f in pending if f['document_code'] not in self._known_qr]
+                if new_codes:
+                    placeholders = ', '.join(['%s'] * len(new_codes))
+                    # Chemin réparti calculé en SQL: SHA2 du payload, comme QRImageStore
+                    db.execute_query(f"""
+                    INSERT INTO qrcodes (qr_type, qr_identifier, qr_payload, document_id, qr_image_path)
+                    SELECT 'DOCUMENT', x.document_code, x.qr_payload, x.id,
+                           CONCAT('qr_images/', LEFT(x.qr_hash, 2), '/', SUBSTRING(x.qr_hash, 3, 2), '/', x.qr_hash, '.', %s)
+                    FROM (
+                        SELECT d.id, d.document_code, CONCAT(%s, '/qr/', d.document_code) as qr_payload,
+                               SHA2(CONCAT(%s, '/qr/', d.document_code), 256) as qr_hash
+                        FROM documents d
+                        WHERE d.document_code IN ({placeholders})
+                    ) x
+                    """, (qr_generator.image_format, self.base_url, self.base_url, *new_codes))
+        except Exception as e:
+            logger.error(f"Erreur lors de l'insertion groupée de {len(pending)} documents: {e}")
+            for f in pending:
+                f['status'] = 'error'
+                self._known_files.discard((f['filename'], f['file_path']))
+            self.progress['errors'] += len(pending)
+            return
+        
+        self._known_qr.update(new_codes)
+        self.progress['files_new'] += len(pending)
+        for f in pending:
+            resolve_cache.invalidate_document(f['document_code'], f['category_name'], f['subcategory_name'])
+        logger.info(f"   {len(pending)} nouveaux documents ajoutés (lot)")
+        
+        # Générer les images QR après validation de la transaction
+        for code in new_codes:
+            self._render_qr(code, f"{self.base_url}/qr/{code}")
+    
+    def _reserve_sequence_range(self, subcategory_id, year, count):
+        """Réserver `count` numéros de séquence consécutifs et retourner le premier"""
+        return sequence_allocator.reserve(subcategory_id, year, count)
+    
     def _get_or_create_category(self, name):
         """Récupérer ou créer une catégorie"""
         try:
@@ -388,7 +1080,9 @@ class ArchiveScanner:
             
             db.execute_query("INSERT INTO subcategories (category_id, name, description) VALUES (%s, %s, %s)", 
                             (category_id, name, f"Sous-catégorie {name}"))
-            return db.execute_query("SELECT LAST_INSERT_ID() as id")[0]['id']
+            subcategory_id = db.execute_query("SELECT LAST_INSERT_ID() as id")[0]['id']
+            increment_subcategories(category_id)
+            return subcategory_id
         except Exception as e:
             logger.error(f"Erreur lors de la création/récupération de la sous-catégorie {name}: {e}")
             raise
@@ -396,18 +1090,7 @@ class ArchiveScanner:
     def _get_next_sequence(self, subcategory_id, year):
         """Obtenir le prochain numéro de séquence"""
         try:
-            result = db.execute_query_safe("SELECT current_sequence FROM sequences WHERE subcategory_id = %s AND year = %s", 
-                                         (subcategory_id, year))
-            
-            if result:
-                new_sequence = result[0]['current_sequence'] + 1
-                db.execute_query("UPDATE sequences SET current_sequence = %s WHERE subcategory_id = %s AND year = %s", 
-                               (new_sequence, subcategory_id, year))
-                return new_sequence
-            else:
-                db.execute_query("INSERT INTO sequences (subcategory_id, year, current_sequence) VALUES (%s, %s, 1)", 
-                               (subcategory_id, year))
-                return 1
+            return sequence_allocator.next(subcategory_id, year)
         except Exception as e:
             logger.error(f"Erreur lors de la gestion de la séquence pour subcategory_id={subcategory_id}, year={year}: {e}")
             raise
@@ -430,11 +1113,37 @@ class ArchiveScanner:
 
 def main():
     """Fonction principale pour scanner et enregistrer toute la structure"""
-    scanner = ArchiveScanner()
+    parser = argparse.ArgumentParser(description="Scanner la structure Archives/ et enregistrer les documents")
+    parser.add_argument('--bulk', action='store_true',
+                        help="Mode bulk: préchargement en mémoire et insertions groupées par transaction")
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help="Nombre de documents par transaction en mode bulk")
+    parser.add_argument('--render-workers', type=int, default=None,
+                        help="Processus de rendu des images QR (0 = rendu synchrone, défaut: QR_RENDER_WORKERS ou nb de coeurs)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Ne parcourir que les dossiers modifiés depuis le dernier scan")
+    parser.add_argument('--manifest', default=None,
+                        help="Fichier manifeste du scan incrémental (défaut: SCAN_MANIFEST_FILE)")
+    args = parser.parse_args()
+    
+    from scan_jobs import ScanLock, ScanAlreadyRunningError
     
-    logger.info("Démarrage du scan complet de la structure Archives/")
+    scanner = ArchiveScanner(bulk=args.bulk, chunk_size=args.chunk_size, render_workers=args.render_workers)
+    
+    try:
+        # Refuser le scan si un autre (application web ou ligne de commande) est en cours
+        with ScanLock(scanner.archives_path):
+            if args.incremental:
+                logger.info("Démarrage du scan incrémental de la structure Archives/")
+                success = scanner.scan_incremental(args.manifest)
+            else:
+                logger.info("Démarrage du scan complet de la structure Archives/")
+                success = scanner.scan_and_register_all()
+    except ScanAlreadyRunningError as e:
+        logger.error(str(e))
+        return
     
-    if scanner.scan_and_register_all():
+    if success:
         logger.info("Scan terminé avec succès!")
         logger.info("Tous les QR codes ont été générés")
         logger.info("Vous pouvez maintenant scanner n'importe quel QR code")
@@ -0,0 +1,346 @@
+"""
+Surveillance de la structure Archives/: enregistre et retire les documents au fil de l'eau
+(inotify sous Linux, repli par scrutation des dossiers sinon)
+"""
+
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+import argparse
+import threading
+from pathlib import Path
+from database import db
+from scan_manifest import ScanManifest
+from scan_jobs import ScanLock, ScanAlreadyRunningError
+from dotenv import load_dotenv
+
+# Charger les variables d'environnement
+load_dotenv()
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Constantes inotify (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR
+EVENT_HEADER = struct.Struct('iIII')
+
+class InotifyBackend:
+    """Événements du noyau Linux: une surveillance par dossier de l'arborescence"""
+    
+    def __init__(self, root):
+        """Initialiser la surveillance inotify de l'arborescence `root`"""
+        self.root = Path(root)
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = None
+        self._paths = {}
+    
+    @staticmethod
+    def available():
+        """inotify est disponible sur cette plateforme"""
+        if not sys.platform.startswith('linux'):
+            return False
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6')
+            return hasattr(libc, 'inotify_init1')
+        except OSError:
+            return False
+    
+    def start(self):
+        """Ouvrir le descripteur inotify et surveiller tous les dossiers existants"""
+        fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self._fd = fd
+        self._watch_tree(self.root, list_files=False)
+        logger.info(f"Surveillance inotify de {self.root} ({len(self._paths)} dossiers)")
+        return self
+    
+    def close(self):
+        """Fermer le descripteur inotify"""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            self._paths = {}
+    
+    def read(self, timeout):
+        """Attendre jusqu'à `timeout` secondes et retourner les événements (action, chemin)"""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            events.extend(self._translate(wd, mask, name))
+        return events
+    
+    def _translate(self, wd, mask, name):
+        """Convertir un événement inotify en événements du surveillant"""
+        if mask & IN_Q_OVERFLOW:
+            logger.warning("File d'événements inotify saturée - resynchronisation")
+            return [('resync', None)]
+        if mask & IN_IGNORED:
+            self._paths.pop(wd, None)
+            return []
+        
+        directory = self._paths.get(wd)
+        if directory is None or not name:
+            return []
+        path = directory / name
+        
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                # Des fichiers ont pu arriver avant la pose de la surveillance: lister le dossier
+                return [('dir_created', path)] + self._watch_tree(path, list_files=True)
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                self._unwatch_tree(path)
+                return [('dir_deleted', path)]
+            return []
+        
+        if not name.lower().endswith('.pdf'):
+            return []
+        # IN_CLOSE_WRITE et non IN_CREATE: attendre la fin de l'écriture du fichier. Nouveau fichier
+        # ou fichier réécrit sur place: tranché au traitement du lot selon qu'il est déjà enregistré
+        if mask & IN_CLOSE_WRITE:
+            return [('modified', path)]
+        if mask & IN_MOVED_TO:
+            return [('created', path)]
+        if mask & (IN_DELETE | IN_MOVED_FROM):
+            return [('deleted', path)]
+        return []
+    
+    def _watch_tree(self, directory, list_files):
+        """Surveiller un dossier et ses sous-dossiers (et signaler leurs PDF si `list_files`)"""
+        events = []
+        for current, subdirs, files in os.walk(directory):
+            current = Path(current)
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(current), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOSPC:
+                    raise OSError(error, "Limite fs.inotify.max_user_watches atteinte")
+                logger.warning(f"Impossible de surveiller {current}: {os.strerror(error)}")
+                continue
+            self._paths[wd] = current
+            
+            if list_files:
+                if current != directory:
+                    events.append(('dir_created', current))
+                events.extend(('created', current / name) for name in files if name.lower().endswith('.pdf'))
+        return events
+    
+    def _unwatch_tree(self, directory):
+        """Cesser de surveiller un dossier déplacé ou supprimé et ses sous-dossiers"""
+        for wd, path in list(self._paths.items()):
+            if path == directory or directory in path.parents:
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._paths[wd]
+
+class PollingBackend:
+    """Repli sans inotify: comparaison périodique au manifeste (seuls les dossiers modifiés sont listés)"""
+    
+    def __init__(self, root, interval=None):
+        """Initialiser la scrutation de l'arborescence `root` toutes les `interval` secondes"""
+        self.root = Path(root)
+        self.interval = interval or float(os.environ.get('WATCH_POLL_INTERVAL', 5))
+        self._manifest = ScanManifest()
+        self._next_poll = 0.0
+    
+    def start(self):
+        """Établir l'état de référence de l'arborescence sans produire d'événements"""
+        self._manifest.directories, changes = ScanManifest().diff(self.root)
+        self._next_poll = time.monotonic() + self.interval
+        logger.info(f"Surveillance par scrutation de {self.root} toutes les {self.interval}s ({changes['listed_dirs']} dossiers)")
+        return self
+    
+    def close(self):
+        """Rien à libérer"""
+    
+    def read(self, timeout):
+        """Attendre la prochaine scrutation (au plus `timeout` secondes) et retourner les événements"""
+        remaining = self._next_poll - time.monotonic()
+        if remaining > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(remaining, 0))
+        self._next_poll = time.monotonic() + self.interval
+        
+        self._manifest.directories, changes = self._manifest.diff(self.root)
+        root_key = ScanManifest.key(self.root)
+        events = [('dir_created', path) for path in changes['new_dirs'] if ScanManifest.key(path) != root_key]
+        events.extend(('created', path) for path in changes['new_files'])
+        events.extend(('modified', path) for path in changes['modified_files'])
+        events.extend(('deleted', Path(path)) for path in changes['deleted_files'])
+        return events
+
+class ArchiveWatcher:
+    def __init__(self, debounce=None, max_delay=None, poll_interval=None, force_polling=False):
+        """Initialiser le surveillant (regroupement des événements, délai maximal d'un lot)"""
+        self.root = Path(os.environ.get('ARCHIVES_FOLDER', 'Archives'))
+        self.debounce = debounce or float(os.environ.get('WATCH_DEBOUNCE', 2))
+        self.max_delay = max_delay or float(os.environ.get('WATCH_MAX_DELAY', 10))
+        self.poll_interval = poll_interval
+        self.force_polling = force_polling
+        self.stats = {
+            'batches': 0,
+            'registered': 0,
+            'rehashed': 0,
+            'retired': 0,
+            'moved': 0,
+            'errors': 0
+        }
+    
+    def _make_backend(self):
+        """inotify si disponible, scrutation sinon"""
+        if not self.force_polling and InotifyBackend.available():
+            backend = InotifyBackend(self.root)
+            try:
+                return backend.start()
+            except OSError as e:
+                backend.close()
+                logger.warning(f"inotify indisponible ({e}) - repli sur la scrutation")
+        return PollingBackend(self.root, self.poll_interval).start()
+    
+    def run(self, stop_event=None):
+        """Surveiller l'arborescence jusqu'à `stop_event` (ou interruption)"""
+        stop_event = stop_event or threading.Event()
+        self.root.mkdir(parents=True, exist_ok=True)
+        backend = self._make_backend()
+        
+        # Dernière action connue par chemin: les rafales d'événements sont fusionnées
+        pending = {}
+        first_event = last_event = None
+        
+        try:
+            while not stop_event.is_set():
+                events = backend.read(min(self.debounce, 1.0))
+                now = time.monotonic()
+                
+                for action, path in events:
+                    key = ScanManifest.key(path) if path is not None else None
+                    pending[key] = (action, path)
+                if events:
+                    last_event = now
+                    first_event = first_event or now
+                
+                # Traiter le lot après une accalmie, ou au plus tard après max_delay
+                if pending and (now - last_event >= self.debounce or now - first_event >= self.max_delay):
+                    if self._process(list(pending.values())):
+                        pending = {}
+                        first_event = last_event = None
+                    else:
+                        last_event = now
+        except KeyboardInterrupt:
+            logger.info("Arrêt de la surveillance")
+        finally:
+            backend.close()
+        return self.stats
+    
+    def _process(self, batch):
+        """Enregistrer/retirer les documents d'un lot (False si un scan est en cours)"""
+        from archive_scanner import ArchiveScanner
+        
+        try:
+            lock = ScanLock(self.root).acquire()
+        except ScanAlreadyRunningError:
+            logger.info(f"Scan en cours - lot de {len(batch)} événements reporté")
+            return False
+        
+        started = time.monotonic()
+        registered = rehashed = retired = moved = errors = 0
+        try:
+            scanner = ArchiveScanner()
+            
+            if any(action == 'resync' for action, path in batch):
+                # Événements perdus: rattrapage par le scan incrémental (dossiers modifiés seulement)
+                scanner.scan_incremental()
+                registered = scanner.progress['files_new']
+                moved = scanner.progress['files_moved']
+                errors = scanner.progress['errors']
+            else:
+                # Fichiers disparus, y compris ceux des dossiers supprimés ou déplacés
+                deleted = [ScanManifest.key(path) for action, path in batch if action == 'deleted' and not path.exists()]
+                deleted_dirs = [path for action, path in batch if action == 'dir_deleted' and not path.exists()]
+                new_dirs = [path for action, path in batch if action == 'dir_created' and path.is_dir()]
+                
+                # Fichier écrit sur un chemin déjà enregistré (réécrit sur place ou remplacé):
+                # empreinte, taille et mtime à recalculer; sinon nouveau fichier
+                written = [path for action, path in batch if action in ('created', 'modified') and path.is_file()]
+                registered_paths = scanner.registered_paths(written)
+                modified = [path for path in written if ScanManifest.key(path) in registered_paths]
+                created = [path for path in written if ScanManifest.key(path) not in registered_paths]
+                
+                result = scanner.apply_changes(new_dirs, created, modified, deleted, deleted_dirs)
+                registered = len(result['registered'])
+                rehashed = len(modified) - len(result['unhashed'])
+                moved = len(result['moved'])
+                retired = result['retired']
+                errors = scanner.progress['errors']
+        finally:
+            db.release_connection()
+            lock.release()
+        
+        self.stats['batches'] += 1
+        self.stats['registered'] += registered
+        self.stats['rehashed'] += rehashed
+        self.stats['retired'] += retired
+        self.stats['moved'] += moved
+        self.stats['errors'] += errors
+        logger.info(
+            f"Lot de {len(batch)} événements traité en {time.monotonic() - started:.2f}s: "
+            f"{registered} documents ajoutés, {rehashed} ré-hachés, {moved} déplacés, {retired} retirés, {errors} erreurs"
+        )
+        return True
+
+def main():
+    """Surveiller la structure Archives/ et enregistrer les nouveaux documents au fil de l'eau"""
+    parser = argparse.ArgumentParser(description="Surveiller Archives/ et enregistrer les documents au fil de l'eau")
+    parser.add_argument('--debounce', type=float, default=None,
+                        help="Secondes sans événement avant de traiter un lot (défaut: WATCH_DEBOUNCE ou 2)")
+    parser.add_argument('--max-delay', type=float, default=None,
+                        help="Délai maximal avant de traiter un lot en rafale continue (défaut: WATCH_MAX_DELAY ou 10)")
+    parser.add_argument('--poll-interval', type=float, default=None,
+                        help="Intervalle de scrutation sans inotify (défaut: WATCH_POLL_INTERVAL ou 5)")
+    parser.add_argument('--polling', action='store_true',
+                        help="Forcer la scrutation même si inotify est disponible")
+    args = parser.parse_args()
+    
+    watcher = ArchiveWatcher(
+        debounce=args.debounce,
+        max_delay=args.max_delay,
+        poll_interval=args.poll_interval,
+        force_polling=args.polling
+    )
+    stats = watcher.run()
+    logger.info(
+        f"Surveillance terminée: {stats['batches']} lots, {stats['registered']} documents ajoutés, "
+        f"{stats['rehashed']} ré-hachés, {stats['moved']} déplacés, {stats['retired']} retirés, {stats['errors']} erreurs"
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+"""
+Bancs d'essai de performance de l'application QR Archives
+"""
@@ -0,0 +1,291 @@
+"""
+Générateur de charge pour la résolution des QR contre une application lancée
+(python -m benchmarks.load --url http://localhost:5000 --concurrency 200 --duration 60)
+
+Chaque thread simule un téléphone: il tire un identifiant (loi de Zipf réglable),
+choisit un type de requête selon le mélange demandé, puis attend --think secondes.
+"""
+
+import sys
+import json
+import time
+import random
+import bisect
+import argparse
+import threading
+import http.client
+from collections import Counter
+from urllib.parse import urlsplit, quote
+from benchmarks.run import percentile
+
+# Types de requêtes: (chemin, en-têtes, réservé aux documents)
+REQUEST_KINDS = {
+    'qr_json': ("/qr/{identifier}", {'Accept': 'application/json'}, False),
+    'qr_html': ("/qr/{identifier}", {'Accept': 'text/html'}, False),
+    'download': ("/download/{identifier}", {}, True),
+    'qr_image': ("/qr_images/{identifier}.png", {'Accept': 'image/png'}, False)
+}
+
+DEFAULT_MIX = 'qr_json=50,qr_html=20,qr_image=20,download=10'
+
+# Bornes supérieures des classes de l'histogramme (ms)
+HISTOGRAM_BOUNDS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+
+def parse_mix(text):
+    """'qr_json=50,download=10' -> {'qr_json': 50.0, 'download': 10.0}"""
+    mix = {}
+    for part in text.split(','):
+        kind, _, weight = part.partition('=')
+        kind = kind.strip()
+        if kind not in REQUEST_KINDS:
+            raise ValueError(f"Type de requête inconnu: {kind} (disponibles: {', '.join(REQUEST_KINDS)})")
+        mix[kind] = float(weight or 1)
+    return mix
+
+def load_identifiers(limit, seed):
+    """Identifiants (et types) de la table qrcodes, mélangés: le rang de popularité est aléatoire"""
+    from database import db
+    
+    rows = list(db.stream_query("SELECT qr_identifier, qr_type FROM qrcodes LIMIT %s", (limit,)))
+    random.Random(seed).shuffle(rows)
+    return [(row['qr_identifier'], row['qr_type']) for row in rows]
+
+def read_identifiers_file(path, seed):
+    """Identifiants lus dans un fichier (une ligne 'identifiant [TYPE]'), sans accès à la base"""
+    rows = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            parts = line.split()
+            if parts:
+                rows.append((parts[0], parts[1].upper() if len(parts) > 1 else 'DOCUMENT'))
+    random.Random(seed).shuffle(rows)
+    return rows
+
+class SkewedSampler:
+    def __init__(self, items, skew):
+        """Tirage selon une loi de Zipf d'exposant `skew` (0 = uniforme, ~1 = quelques QR très scannés)"""
+        self.items = items
+        total = 0.0
+        self.cumulative = []
+        for rank in range(1, len(items) + 1):
+            total += 1.0 / rank ** skew
+            self.cumulative.append(total)
+    
+    def sample(self, rng):
+        """Un élément tiré au hasard"""
+        return self.items[bisect.bisect_left(self.cumulative, rng.random() * self.cumulative[-1])]
+
+class LoadStats:
+    def __init__(self):
+        """Latences et erreurs d'un thread (fusionnées à la fin: aucun verrou pendant la charge)"""
+        self.latencies = {kind: [] for kind in REQUEST_KINDS}
+        self.statuses = {kind: Counter() for kind in REQUEST_KINDS}
+        self.errors = {kind: Counter() for kind in REQUEST_KINDS}
+        self.bytes = 0
+    
+    def merge(self, other):
+        """Ajouter les mesures d'un autre thread"""
+        for kind in REQUEST_KINDS:
+            self.latencies[kind].extend(other.latencies[kind])
+            self.statuses[kind].update(other.statuses[kind])
+            self.errors[kind].update(other.errors[kind])
+        self.bytes += other.bytes
+
+def histogram(latencies_ms):
+    """Effectifs par classe de latence (la dernière classe est ouverte)"""
+    counts = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+    for latency in latencies_ms:
+        counts[bisect.bisect_left(HISTOGRAM_BOUNDS_MS, latency)] += 1
+    labels = [f"<={bound}" for bound in HISTOGRAM_BOUNDS_MS] + [f">{HISTOGRAM_BOUNDS_MS[-1]}"]
+    return dict(zip(labels, counts))
+
+class LoadGenerator:
+    def __init__(self, base_url, identifiers, mix, skew=1.0, concurrency=50, duration=30.0,
+                 think=0.0, keep_alive=False, timeout=10.0, seed=None):
+        """Initialiser la charge (identifiants [(identifiant, type)], mélange {type de requête: poids})"""
+        url = urlsplit(base_url)
+        self.connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self.host = url.hostname
+        self.port = url.port
+        self.prefix = url.path.rstrip('/')
+        
+        self.all_identifiers = SkewedSampler([identifier for identifier, _ in identifiers], skew)
+        documents = [identifier for identifier, qr_type in identifiers if qr_type == 'DOCUMENT']
+        self.document_identifiers = SkewedSampler(documents, skew) if documents else None
+        if 'download' in mix and self.document_identifiers is None:
+            raise ValueError("Aucun identifiant de document: impossible de générer des /download/")
+        
+        self.kinds = list(mix)
+        self.kind_weights = [mix[kind] for kind in self.kinds]
+        self.skew = skew
+        self.concurrency = concurrency
+        self.duration = duration
+        self.think = think
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.seed = seed
+    
+    def _worker(self, index, deadline, stats):
+        """Boucle d'un téléphone simulé jusqu'à l'échéance"""
+        rng = random.Random(None if self.seed is None else self.seed + index)
+        connection = None
+        while time.monotonic() < deadline:
+            kind = rng.choices(self.kinds, self.kind_weights)[0]
+            template, headers, documents_only = REQUEST_KINDS[kind]
+            sampler = self.document_identifiers if documents_only else self.all_identifiers
+            path = self.prefix + template.format(identifier=quote(sampler.sample(rng), safe=''))
+            
+            start = time.perf_counter()
+            try:
+                if connection is None:
+                    connection = self.connection_class(self.host, self.port, timeout=self.timeout)
+                connection.request('GET', path, headers=dict(headers, Connection='keep-alive' if self.keep_alive else 'close'))
+                response = connection.getresponse()
+                stats.bytes += len(response.read())
+                stats.latencies[kind].append(time.perf_counter() - start)
+                stats.statuses[kind][response.status] += 1
+                if not self.keep_alive or response.will_close:
+                    connection.close()
+                    connection = None
+            except (OSError, http.client.HTTPException) as e:
+                stats.latencies[kind].append(time.perf_counter() - start)
+                stats.errors[kind][type(e).__name__] += 1
+                if connection is not None:
+                    connection.close()
+                    connection = None
+            
+            if self.think:
+                time.sleep(rng.uniform(0, 2 * self.think))
+        
+        if connection is not None:
+            connection.close()
+    
+    def run(self):
+        """Lancer les threads, attendre l'échéance et retourner le rapport"""
+        deadline = time.monotonic() + self.duration
+        per_thread = [LoadStats() for _ in range(self.concurrency)]
+        threads = [
+            threading.Thread(target=self._worker, args=(i, deadline, per_thread[i]), name=f"load-{i}", daemon=True)
+            for i in range(self.concurrency)
+        ]
+        
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        
+        stats = LoadStats()
+        for thread_stats in per_thread:
+            stats.merge(thread_stats)
+        return self._report(stats, elapsed)
+    
+    def _report(self, stats, elapsed):
+        """Débit, latences, histogrammes et taux d'erreur par type de requête"""
+        report = {
+            'benchmark': 'load',
+            'concurrency': self.concurrency,
+            'duration': round(elapsed, 3),
+            'skew': self.skew,
+            'think': self.think,
+            'keep_alive': self.keep_alive,
+            'identifiers': len(self.all_identifiers.items),
+            'kinds': {}
+        }
+        
+        total = failed = 0
+        for kind in self.kinds:
+            samples = sorted(latency * 1000 for latency in stats.latencies[kind])
+            errors = sum(stats.errors[kind].values())
+            http_errors = sum(count for status, count in stats.statuses[kind].items() if status >= 400)
+            total += len(samples)
+            failed += errors + http_errors
+            
+            report['kinds'][kind] = {
+                'requests': len(samples),
+                'requests_per_second': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+                'error_rate': round((errors + http_errors) / len(samples), 4) if samples else 0.0,
+                'statuses': {str(status): count for status, count in sorted(stats.statuses[kind].items())},
+                'exceptions': dict(stats.errors[kind]),
+                'latency_ms': {
+                    'p50': round(percentile(samples, 0.50), 3) if samples else None,
+                    'p90': round(percentile(samples, 0.90), 3) if samples else None,
+                    'p99': round(percentile(samples, 0.99), 3) if samples else None,
+                    'max': round(samples[-1], 3) if samples else None
+                },
+                'histogram_ms': histogram(samples)
+            }
+        
+        report['requests'] = total
+        report['requests_per_second'] = round(total / elapsed, 1) if elapsed else 0.0
+        report['error_rate'] = round(failed / total, 4) if total else 0.0
+        report['bytes_received'] = stats.bytes
+        return report
+
+def print_report(report, out=sys.stdout):
+    """Résumé lisible: débit, percentiles, erreurs et histogramme de chaque type de requête"""
+    out.write(
+        f"{report['requests']} requêtes en {report['duration']}s ({report['requests_per_second']} req/s), "
+        f"{report['concurrency']} clients, erreurs {report['error_rate']:.2%}\n"
+    )
+    for kind, result in report['kinds'].items():
+        latency = result['latency_ms']
+        if not result['requests']:
+            continue
+        out.write(
+            f"\n{kind}: {result['requests']} req ({result['requests_per_second']} req/s), "
+            f"erreurs {result['error_rate']:.2%}, statuts {result['statuses']}"
+            f"{', exceptions ' + str(result['exceptions']) if result['exceptions'] else ''}\n"
+            f"  p50 {latency['p50']:.1f} ms  p90 {latency['p90']:.1f} ms  "
+            f"p99 {latency['p99']:.1f} ms  max {latency['max']:.1f} ms\n"
+        )
+        peak = max(result['histogram_ms'].values()) or 1
+        for label, count in result['histogram_ms'].items():
+            if count:
+                out.write(f"  {label:>8} ms {count:>8} {'#' * max(1, round(40 * count / peak))}\n")
+
+def main():
+    """Lancer une charge depuis la ligne de commande"""
+    parser = argparse.ArgumentParser(description="Générer une charge de résolution de QR codes contre une application lancée")
+    parser.add_argument('--url', default='http://localhost:5000', help="URL de base de l'application")
+    parser.add_argument('--concurrency', type=int, default=50, help="Clients simultanés (threads)")
+    parser.add_argument('--duration', type=float, default=30.0, help="Durée de la charge (secondes)")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"Mélange des requêtes (défaut: {DEFAULT_MIX})")
+    parser.add_argument('--skew', type=float, default=1.0, help="Exposant de Zipf du choix des identifiants (0 = uniforme)")
+    parser.add_argument('--think', type=float, default=0.0, help="Pause moyenne entre deux requêtes d'un client (secondes)")
+    parser.add_argument('--keep-alive', action='store_true', help="Réutiliser les connexions (par défaut: une par requête)")
+    parser.add_argument('--timeout', type=float, default=10.0, help="Délai d'attente d'une requête (secondes)")
+    parser.add_argument('--max-identifiers', type=int, default=100000, help="Identifiants lus dans la table qrcodes")
+    parser.add_argument('--identifiers-file', default=None, help="Identifiants lus dans un fichier plutôt qu'en base")
+    parser.add_argument('--seed', type=int, default=None, help="Graine aléatoire (charge reproductible)")
+    parser.add_argument('--json', action='store_true', help="Sortie JSON")
+    args = parser.parse_args()
+    
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    if args.identifiers_file:
+        identifiers = read_identifiers_file(args.identifiers_file, args.seed)
+    else:
+        identifiers = load_identifiers(args.max_identifiers, args.seed)
+    if not identifiers:
+        parser.error("Aucun identifiant QR disponible")
+    
+    try:
+        generator = LoadGenerator(
+            args.url, identifiers, mix, args.skew, args.concurrency, args.duration,
+            args.think, args.keep_alive, args.timeout, args.seed
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    report = generator.run()
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Micro-benchmark des moteurs de rendu QR (python -m benchmarks.qr_rasterizers)
+"""
+
+import io
+import json
+import time
+import argparse
+from qr_generator import RASTERIZERS, render_qr_matrix, QR_BOX_SIZE
+
+def make_payloads(count, base_url='http://localhost:5000'):
+    """Payloads réalistes (mêmes longueurs d'URL que les documents)"""
+    return [f"{base_url}/qr/FINANCE-FACTURES-2024-{i:06d}" for i in range(count)]
+
+def check_identical(matrices, reference='qrcode'):
+    """Vérifier que chaque moteur produit exactement les pixels du rendu de référence"""
+    mismatches = {}
+    for name, rasterize in RASTERIZERS.items():
+        mismatches[name] = sum(
+            1 for matrix in matrices
+            if rasterize(matrix).tobytes() != RASTERIZERS[reference](matrix).tobytes()
+        )
+    return mismatches
+
+def time_backend(rasterize, matrices, repeat, encode_png=False):
+    """Meilleur temps (sur repeat passes) pour rendre toutes les matrices"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for matrix in matrices:
+            image = rasterize(matrix)
+            if encode_png:
+                image.save(io.BytesIO(), 'PNG')
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def run(count=500, repeat=3, encode_png=False):
+    """Comparer tous les moteurs enregistrés sur les mêmes matrices"""
+    # L'encodage (calcul de la matrice) est commun à tous les moteurs: hors mesure
+    matrices = [render_qr_matrix(payload) for payload in make_payloads(count)]
+    mismatches = check_identical(matrices[:50])
+    
+    results = {}
+    for name, rasterize in RASTERIZERS.items():
+        elapsed = time_backend(rasterize, matrices, repeat, encode_png)
+        results[name] = {
+            'seconds': round(elapsed, 4),
+            'per_image_us': round(elapsed / count * 1e6, 1),
+            'images_per_second': round(count / elapsed, 1),
+            'identical': mismatches[name] == 0
+        }
+    
+    reference = results['qrcode']['seconds']
+    for result in results.values():
+        result['speedup'] = round(reference / result['seconds'], 2)
+    
+    return {
+        'benchmark': 'qr_rasterizers',
+        'count': count,
+        'repeat': repeat,
+        'box_size': QR_BOX_SIZE,
+        'modules': len(matrices[0]) if matrices else 0,
+        'encode_png': encode_png,
+        'backends': results
+    }
+
+def main():
+    """Lancer le micro-benchmark depuis la ligne de commande"""
+    parser = argparse.ArgumentParser(description="Comparer les moteurs de rendu des QR codes")
+    parser.add_argument('-n', '--count', type=int, default=500, help="Nombre de QR codes rendus par passe")
+    parser.add_argument('--repeat', type=int, default=3, help="Nombre de passes (le meilleur temps est retenu)")
+    parser.add_argument('--png', action='store_true', help="Inclure l'encodage PNG dans la mesure")
+    parser.add_argument('--json', action='store_true', help="Sortie JSON")
+    args = parser.parse_args()
+    
+    report = run(args.count, args.repeat, args.png)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    
+    print(f"{report['count']} QR codes de {report['modules']} modules, box_size={report['box_size']}")
+    for name, result in sorted(report['backends'].items(), key=lambda item: item[1]['seconds']):
+        status = 'identique' if result['identical'] else 'DIFFÉRENT'
+        print(f"  {name:<8} {result['per_image_us']:>9.1f} µs/image  x{result['speedup']:<6} {status}")
+
+if __name__ == "__main__":
+    main()
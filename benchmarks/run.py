@@ -0,0 +1,271 @@
+"""
+Suite de benchmarks: scan, résolution des QR, /api/documents et génération des QR, en JSON
+(python -m benchmarks.run --files 10000 --reset -o resultats.json)
+
+La suite tourne contre un MySQL local, dans une base dédiée (qr_archives_bench par
+défaut): le schéma s'appuie sur GET_LOCK, FULLTEXT et SHA2, sans équivalent embarqué.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+from benchmarks.synthetic_tree import generate_tree
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+PHASES = ['scan', 'resolve_qr', 'api_documents', 'qr_generator']
+
+def percentile(sorted_samples, fraction):
+    """Percentile d'une liste triée (rang le plus proche)"""
+    if not sorted_samples:
+        return None
+    index = min(int(round(fraction * (len(sorted_samples) - 1))), len(sorted_samples) - 1)
+    return sorted_samples[index]
+
+def summarize(latencies, elapsed, errors=0):
+    """Débit et latences (ms) d'une série d'opérations"""
+    samples = sorted(latency * 1000 for latency in latencies)
+    return {
+        'operations': len(samples),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'throughput_per_second': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(samples, 0.50), 3) if samples else None,
+            'p99': round(percentile(samples, 0.99), 3) if samples else None,
+            'mean': round(sum(samples) / len(samples), 3) if samples else None,
+            'max': round(samples[-1], 3) if samples else None
+        }
+    }
+
+def peak_rss_mb():
+    """Pic de mémoire résidente du processus depuis son démarrage (Mo), None si indisponible (Windows)
+    
+    ru_maxrss ne redescend jamais: la valeur couvre toutes les phases exécutées et n'est
+    rapportée qu'une fois, pour l'ensemble de la suite.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en Ko sous Linux, en octets sous macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def git_revision():
+    """Commit courant et présence de modifications locales (comparaison entre commits)"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain'], capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+def reset_database():
+    """Recréer la base de benchmark vide (schéma et migrations à jour)"""
+    import mysql.connector
+    import init_db
+    
+    name = os.environ['DB_NAME']
+    connection = mysql.connector.connect(
+        host=os.environ.get('DB_HOST', 'localhost'),
+        user=os.environ.get('DB_USER', 'root'),
+        password=os.environ.get('DB_PASSWORD', ''),
+        port=int(os.environ.get('DB_PORT', 3306))
+    )
+    cursor = connection.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS {name}")
+    cursor.close()
+    connection.close()
+    
+    init_db.create_database()
+    init_db.create_tables()
+    init_db.migrate()
+
+def sample_identifiers(count, qr_type=None):
+    """Identifiants QR tirés au hasard dans la base"""
+    from database import db
+    
+    if qr_type:
+        rows = db.execute_query_safe(
+            "SELECT qr_identifier FROM qrcodes WHERE qr_type = %s ORDER BY RAND() LIMIT %s", (qr_type, count)
+        )
+    else:
+        rows = db.execute_query_safe("SELECT qr_identifier FROM qrcodes ORDER BY RAND() LIMIT %s", (count,))
+    return [row['qr_identifier'] for row in rows or []]
+
+def bench_scan(files, bulk=False):
+    """Scan complet de l'arborescence (débit en fichiers par seconde)"""
+    from archive_scanner import ArchiveScanner
+    
+    scanner = ArchiveScanner(bulk=bulk)
+    start = time.perf_counter()
+    success = scanner.scan_and_register_all()
+    elapsed = time.perf_counter() - start
+    
+    return {
+        'success': bool(success),
+        'bulk': bulk,
+        'files': files,
+        'seconds': round(elapsed, 3),
+        'files_per_second': round(files / elapsed, 1) if elapsed else 0.0,
+        'progress': scanner.progress_snapshot()
+    }
+
+def bench_requests(client, paths, headers=None):
+    """Rejouer des requêtes GET dans le client de test Flask (latence par requête)"""
+    latencies = []
+    errors = 0
+    start = time.perf_counter()
+    for path in paths:
+        request_start = time.perf_counter()
+        response = client.get(path, headers=headers or {})
+        latencies.append(time.perf_counter() - request_start)
+        if response.status_code >= 400:
+            errors += 1
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+def bench_resolve_qr(client, requests):
+    """/qr/<identifiant> en JSON: premier passage (cache froid) puis second passage (cache chaud)"""
+    identifiers = sample_identifiers(requests)
+    paths = [f"/qr/{identifier}" for identifier in identifiers]
+    headers = {'Accept': 'application/json'}
+    return {
+        'cold': bench_requests(client, paths, headers),
+        'warm': bench_requests(client, paths, headers)
+    }
+
+def bench_api_documents(client, pages, limit=50):
+    """Parcours de /api/documents page par page (pagination par curseur)"""
+    latencies = []
+    errors = 0
+    cursor = None
+    start = time.perf_counter()
+    for _ in range(pages):
+        path = f"/api/documents?limit={limit}" + (f"&cursor={cursor}" if cursor else '')
+        request_start = time.perf_counter()
+        response = client.get(path)
+        latencies.append(time.perf_counter() - request_start)
+        if response.status_code >= 400:
+            errors += 1
+            break
+        cursor = response.get_json().get('next_cursor')
+        if not cursor:
+            break
+    return dict(summarize(latencies, time.perf_counter() - start, errors), page_size=limit)
+
+def bench_qr_generator(count):
+    """Génération d'images QR (encodage, rendu et écriture dans le stockage)"""
+    from qr_generator import qr_generator
+    
+    latencies = []
+    errors = 0
+    prefix = f"BENCH-{random.randrange(1 << 32):08x}"
+    start = time.perf_counter()
+    for i in range(count):
+        identifier = f"{prefix}-{i:07d}"
+        call_start = time.perf_counter()
+        if qr_generator.generate_qr_code(identifier, f"{qr_generator.base_url}/qr/{identifier}") is None:
+            errors += 1
+        latencies.append(time.perf_counter() - call_start)
+    return dict(summarize(latencies, time.perf_counter() - start, errors), image_format=qr_generator.image_format)
+
+def run(args):
+    """Exécuter les phases demandées et retourner le rapport"""
+    commit, dirty = git_revision()
+    report = {
+        'benchmark': 'suite',
+        'commit': commit,
+        'dirty': dirty,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'database': os.environ['DB_NAME'],
+        'phases': {}
+    }
+    
+    if args.tree:
+        files = sum(
+            1 for _, _, names in os.walk(args.tree) for name in names if name.lower().endswith('.pdf')
+        )
+        report['tree'] = {'root': os.path.abspath(args.tree), 'files_written': files, 'generated': False}
+    else:
+        report['tree'] = generate_tree(
+            os.environ['ARCHIVES_FOLDER'], args.files, args.categories, args.subcategories, args.years,
+            padding=args.padding
+        )
+    
+    if args.reset:
+        reset_database()
+    
+    # Imports après la configuration de l'environnement (lu à l'import des modules)
+    from app import create_app
+    app = create_app()
+    client = app.test_client()
+    
+    files = report['tree']['files_written']
+    if 'scan' in args.phases:
+        report['phases']['scan'] = bench_scan(files, args.bulk)
+    if 'resolve_qr' in args.phases:
+        report['phases']['resolve_qr'] = bench_resolve_qr(client, args.requests)
+    if 'api_documents' in args.phases:
+        report['phases']['api_documents'] = bench_api_documents(client, args.pages)
+    if 'qr_generator' in args.phases:
+        report['phases']['qr_generator'] = bench_qr_generator(args.qr_count)
+    
+    report['peak_rss_mb'] = peak_rss_mb()
+    return report
+
+def main():
+    """Lancer la suite de benchmarks depuis la ligne de commande"""
+    parser = argparse.ArgumentParser(description="Benchmarks du scanner, de la résolution et de la génération des QR")
+    parser.add_argument('--tree', default=None, help="Arborescence existante à scanner (sinon générée)")
+    parser.add_argument('--files', type=int, default=10000, help="Nombre de PDF de l'arborescence générée")
+    parser.add_argument('--categories', type=int, default=8, help="Nombre de catégories générées")
+    parser.add_argument('--subcategories', type=int, default=8, help="Sous-catégories par catégorie")
+    parser.add_argument('--years', type=int, default=5, help="Années par sous-catégorie")
+    parser.add_argument('--padding', type=int, default=0, help="Octets ajoutés à chaque PDF généré (taille des fichiers)")
+    parser.add_argument('--bulk', action='store_true', help="Scanner en mode bulk")
+    parser.add_argument('--requests', type=int, default=2000, help="Requêtes /qr/<identifiant> par passage")
+    parser.add_argument('--pages', type=int, default=200, help="Pages de /api/documents parcourues")
+    parser.add_argument('--qr-count', type=int, default=500, help="Images QR générées")
+    parser.add_argument('--phases', nargs='+', choices=PHASES, default=PHASES, help="Phases à exécuter")
+    parser.add_argument('--db-name', default=os.environ.get('BENCH_DB_NAME', 'qr_archives_bench'),
+                        help="Base MySQL dédiée au benchmark")
+    parser.add_argument('--reset', action='store_true', help="Recréer la base de benchmark avant le scan")
+    parser.add_argument('--workdir', default=None, help="Dossier de travail (défaut: dossier temporaire)")
+    parser.add_argument('-o', '--output', default=None, help="Fichier JSON de sortie (défaut: sortie standard)")
+    parser.add_argument('--log-level', default='WARNING', help="Niveau de journalisation pendant les mesures")
+    args = parser.parse_args()
+    
+    # Avant l'import des modules de l'application (leur basicConfig devient sans effet)
+    logging.basicConfig(level=args.log_level.upper())
+    
+    if args.reset and 'bench' not in args.db_name:
+        parser.error("--reset ne s'applique qu'à une base dont le nom contient 'bench'")
+    
+    workdir = args.workdir or tempfile.mkdtemp(prefix='qr-archives-bench-')
+    os.environ['DB_NAME'] = args.db_name
+    os.environ['ARCHIVES_FOLDER'] = args.tree or os.path.join(workdir, 'Archives')
+    os.environ['QR_IMAGES_FOLDER'] = os.path.join(workdir, 'qr_images')
+    
+    report = run(args)
+    report['workdir'] = workdir
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
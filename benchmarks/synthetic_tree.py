@@ -0,0 +1,102 @@
+"""
+Générateur d'arborescences Archives/ synthétiques (<CAT>/<SUBCAT>/<année>/*.pdf)
+(python -m benchmarks.synthetic_tree Archives-bench --files 100000)
+"""
+
+import os
+import json
+import time
+import argparse
+
+# Noms réalistes, complétés par des noms numérotés au-delà de la liste
+CATEGORY_NAMES = ['FINANCE', 'RH', 'JURIDIQUE', 'ACHATS', 'COMMERCIAL', 'TECHNIQUE', 'QUALITE', 'LOGISTIQUE']
+SUBCATEGORY_NAMES = ['FACTURES', 'CONTRATS', 'DEVIS', 'RAPPORTS', 'COURRIERS', 'BUDGETS', 'AUDITS', 'NOTES']
+
+def _names(base, count, prefix):
+    """Les `count` premiers noms de la liste, puis PREFIXNNN (CAT008, SUB010...)"""
+    return [base[i] if i < len(base) else f"{prefix}{i:03d}" for i in range(count)]
+
+def minimal_pdf(text):
+    """PDF valide d'une page, de contenu unique (empreintes toutes différentes)"""
+    content = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length " + str(len(content)).encode() + b" >>\nstream\n" + content + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    ]
+    
+    data = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    
+    xref = len(data)
+    data += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    data += b''.join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    data += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return data
+
+def tree_shape(files=10000, categories=8, subcategories=8, years=5, first_year=2020):
+    """Forme de l'arborescence: fichiers répartis uniformément sur les dossiers d'années"""
+    leaves = categories * subcategories * years
+    return {
+        'files': files,
+        'categories': categories,
+        'subcategories_per_category': subcategories,
+        'years': list(range(first_year, first_year + years)),
+        'leaf_directories': leaves,
+        'files_per_leaf': -(-files // leaves) if leaves else 0
+    }
+
+def generate_tree(root, files=10000, categories=8, subcategories=8, years=5, first_year=2020, padding=0):
+    """Écrire l'arborescence sous `root` (padding: octets ajoutés à chaque PDF)"""
+    shape = tree_shape(files, categories, subcategories, years, first_year)
+    start = time.perf_counter()
+    written = 0
+    total_bytes = 0
+    filler = b"%" + b"0" * max(padding - 2, 0) + b"\n" if padding else b""
+    
+    for category in _names(CATEGORY_NAMES, categories, 'CAT'):
+        for subcategory in _names(SUBCATEGORY_NAMES, subcategories, 'SUB'):
+            for year in shape['years']:
+                directory = os.path.join(root, category, subcategory, str(year))
+                os.makedirs(directory, exist_ok=True)
+                
+                for _ in range(min(shape['files_per_leaf'], files - written)):
+                    written += 1
+                    data = minimal_pdf(f"{category} {subcategory} {year} {written}") + filler
+                    with open(os.path.join(directory, f"doc-{written:07d}.pdf"), 'wb') as f:
+                        f.write(data)
+                    total_bytes += len(data)
+    
+    elapsed = time.perf_counter() - start
+    return dict(shape, **{
+        'root': os.path.abspath(root),
+        'files_written': written,
+        'bytes': total_bytes,
+        'seconds': round(elapsed, 3),
+        'files_per_second': round(written / elapsed, 1) if elapsed else 0.0
+    })
+
+def main():
+    """Générer une arborescence synthétique depuis la ligne de commande"""
+    parser = argparse.ArgumentParser(description="Générer une arborescence Archives/ synthétique")
+    parser.add_argument('root', help="Dossier racine à créer (ex: Archives-bench)")
+    parser.add_argument('--files', type=int, default=10000, help="Nombre total de PDF")
+    parser.add_argument('--categories', type=int, default=8, help="Nombre de catégories")
+    parser.add_argument('--subcategories', type=int, default=8, help="Sous-catégories par catégorie")
+    parser.add_argument('--years', type=int, default=5, help="Nombre d'années par sous-catégorie")
+    parser.add_argument('--first-year', type=int, default=2020, help="Première année")
+    parser.add_argument('--padding', type=int, default=0, help="Octets ajoutés à chaque PDF (taille des fichiers)")
+    args = parser.parse_args()
+    
+    report = generate_tree(args.root, args.files, args.categories, args.subcategories,
+                           args.years, args.first_year, args.padding)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Export en flux du catalogue des documents au format NDJSON (optionnellement gzip)
+"""
+
+import sys
+import json
+import zlib
+import logging
+import argparse
+from database import db
+from dotenv import load_dotenv
+
+# Charger les variables d'environnement
+load_dotenv()
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CATALOG_QUERY = """
+SELECT
+    d.id,
+    d.document_code,
+    d.filename,
+    d.file_path,
+    d.year,
+    d.title,
+    d.description,
+    d.created_at,
+    c.name as category_name,
+    sc.name as subcategory_name,
+    q.qr_identifier
+FROM documents d
+JOIN subcategories sc ON d.subcategory_id = sc.id
+JOIN categories c ON sc.category_id = c.id
+LEFT JOIN qrcodes q ON d.id = q.document_id
+ORDER BY d.id
+"""
+
+def iter_catalog_ndjson(chunk_size=1000):
+    """Produire le catalogue ligne par ligne (une ligne JSON par document)"""
+    for row in db.stream_query(CATALOG_QUERY, chunk_size=chunk_size):
+        yield (json.dumps(row, default=str, ensure_ascii=False) + '\n').encode('utf-8')
+
+def iter_gzip(chunks, flush_bytes=64 * 1024):
+    """Compresser un flux d'octets en gzip au fil de l'eau"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    pending = 0
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        pending += len(chunk)
+        # Libérer régulièrement les données compressées pour garder la mémoire constante
+        if pending >= flush_bytes:
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_catalog(output, use_gzip=False, chunk_size=1000):
+    """Écrire le catalogue complet dans un fichier binaire ouvert"""
+    stream = iter_catalog_ndjson(chunk_size)
+    if use_gzip:
+        stream = iter_gzip(stream)
+    
+    written = 0
+    for chunk in stream:
+        output.write(chunk)
+        written += len(chunk)
+    return written
+
+def main():
+    """Exporter le catalogue en NDJSON depuis la ligne de commande"""
+    parser = argparse.ArgumentParser(description="Exporter le catalogue des documents en NDJSON")
+    parser.add_argument('-o', '--output', default='-', help="Fichier de sortie (défaut: sortie standard)")
+    parser.add_argument('--gzip', action='store_true', help="Compresser la sortie en gzip")
+    parser.add_argument('--chunk-size', type=int, default=1000, help="Lignes lues par aller-retour MySQL")
+    args = parser.parse_args()
+    
+    if args.output == '-':
+        written = export_catalog(sys.stdout.buffer, args.gzip, args.chunk_size)
+    else:
+        with open(args.output, 'wb') as output:
+            written = export_catalog(output, args.gzip, args.chunk_size)
+    
+    logger.info(f"Catalogue exporté: {written} octets")
+
+if __name__ == "__main__":
+    main()
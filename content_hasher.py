@@ -0,0 +1,73 @@
+"""
+Empreintes SHA-256 du contenu des PDF, calculées en flux par un pool borné de threads
+"""
+
+import os
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dotenv import load_dotenv
+
+# Charger les variables d'environnement
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Taille des blocs lus (mémoire constante quel que soit le fichier)
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def hash_file(path, chunk_size=HASH_CHUNK_SIZE):
+    """Empreinte SHA-256 d'un fichier lu par blocs, avec la taille et le mtime du fichier haché"""
+    digest = hashlib.sha256()
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    
+    with open(path, 'rb', buffering=0) as f:
+        st = os.fstat(f.fileno())
+        while True:
+            read = f.readinto(buffer)
+            if not read:
+                break
+            digest.update(view[:read])
+    
+    return digest.hexdigest(), st.st_size, st.st_mtime_ns
+
+class ContentHasher:
+    def __init__(self, workers=None):
+        """Initialiser le pool de hachage (lecture et SHA-256 libèrent le GIL)"""
+        self.workers = workers or int(os.environ.get('SCAN_HASH_WORKERS', min(8, (os.cpu_count() or 1) * 2)))
+    
+    def hash_files(self, paths):
+        """Hacher des fichiers en parallèle -> {chemin: (empreinte, taille, mtime_ns)}
+        
+        Les fichiers illisibles sont journalisés et absents du résultat.
+        """
+        results = {}
+        paths = list(paths)
+        if not paths:
+            return results
+        
+        # Au plus deux lectures en attente par thread: mémoire bornée sur les grandes arborescences
+        max_in_flight = self.workers * 2
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='content-hash') as executor:
+            in_flight = {}
+            for path in paths:
+                if len(in_flight) >= max_in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._collect(future, in_flight.pop(future), results)
+                in_flight[executor.submit(hash_file, path)] = path
+            
+            for future in list(in_flight):
+                self._collect(future, in_flight.pop(future), results)
+        
+        logger.info(f"{len(results)}/{len(paths)} fichiers hachés ({self.workers} threads)")
+        return results
+    
+    @staticmethod
+    def _collect(future, path, results):
+        """Enregistrer le résultat d'un hachage terminé"""
+        try:
+            results[path] = future.result()
+        except OSError as e:
+            logger.warning(f"Impossible de hacher {path}: {e}")
@@ -0,0 +1,64 @@
+"""
+Compteurs matérialisés des catégories et sous-catégories (documents, sous-catégories)
+"""
+
+import logging
+from database import db
+from dotenv import load_dotenv
+
+# Charger les variables d'environnement
+load_dotenv()
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def increment_documents(subcategory_id, delta=1):
+    """Ajuster le nombre de documents d'une sous-catégorie et de sa catégorie"""
+    query = """
+    UPDATE subcategories sc
+    JOIN categories c ON c.id = sc.category_id
+    SET sc.document_count = sc.document_count + %s,
+        c.document_count = c.document_count + %s
+    WHERE sc.id = %s
+    """
+    db.execute_query(query, (delta, delta, subcategory_id))
+
+def increment_subcategories(category_id, delta=1):
+    """Ajuster le nombre de sous-catégories d'une catégorie"""
+    db.execute_query(
+        "UPDATE categories SET subcategory_count = subcategory_count + %s WHERE id = %s",
+        (delta, category_id)
+    )
+
+def rebuild():
+    """Recalculer tous les compteurs depuis les tables (requêtes ensemblistes)"""
+    with db.transaction():
+        db.execute_query("""
+        UPDATE subcategories sc
+        LEFT JOIN (
+            SELECT subcategory_id, COUNT(*) as total
+            FROM documents
+            GROUP BY subcategory_id
+        ) d ON d.subcategory_id = sc.id
+        SET sc.document_count = COALESCE(d.total, 0)
+        """)
+        
+        db.execute_query("""
+        UPDATE categories c
+        LEFT JOIN (
+            SELECT category_id, COUNT(*) as subcategories, SUM(document_count) as documents
+            FROM subcategories
+            GROUP BY category_id
+        ) sc ON sc.category_id = c.id
+        SET c.subcategory_count = COALESCE(sc.subcategories, 0),
+            c.document_count = COALESCE(sc.documents, 0)
+        """)
+    logger.info("Compteurs des catégories et sous-catégories recalculés")
+
+def main():
+    """Recalculer les compteurs matérialisés"""
+    rebuild()
+
+if __name__ == "__main__":
+    main()
@@ -5,22 +5,176 @@ import mysql.connector
 from mysql.connector import Error
 import logging
 import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from metrics import db_query_seconds, db_query_errors, normalize_statement
 from dotenv import load_dotenv
 
 # Charger les variables d'environnement
 load_dotenv()
 
+class PoolTimeoutError(Error):
+    """Aucune connexion disponible dans le pool avant l'expiration du délai"""
+
+class ConnectionPool:
+    def __init__(self, size, timeout, **connect_args):
+        """Initialiser un pool borné de connexions MySQL"""
+        self.size = size
+        self.timeout = timeout
+        self.connect_args = connect_args
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._checkouts = 0
+        self._reconnects = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+    
+    def _new_connection(self):
+        """Ouvrir une nouvelle connexion physique"""
+        return mysql.connector.connect(**self.connect_args)
+    
+    def _ensure_alive(self, connection):
+        """Vérifier la connexion avant de la prêter et la rétablir si besoin"""
+        try:
+            if connection.is_connected():
+                return connection
+        except Exception:
+            pass
+        
+        logging.warning(" Connexion MySQL du pool perdue - reconnexion")
+        with self._lock:
+            self._reconnects += 1
+        try:
+            connection.reconnect(attempts=2, delay=0)
+            return connection
+        except Exception:
+            try:
+                connection.close()
+            except Exception:
+                pass
+            return self._new_connection()
+    
+    def acquire(self):
+        """Emprunter une connexion (bloque jusqu'à `timeout` si le pool est plein)"""
+        start = time.monotonic()
+        connection = None
+        create = False
+        
+        with self._lock:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                if self._created < self.size:
+                    self._created += 1
+                    create = True
+                else:
+                    self._waiting += 1
+        
+        if connection is None and create:
+            try:
+                connection = self._new_connection()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        elif connection is None:
+            try:
+                connection = self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                raise PoolTimeoutError(
+                    msg=f"Pool MySQL épuisé ({self.size} connexions) après {self.timeout}s d'attente"
+                )
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+        
+        try:
+            connection = self._ensure_alive(connection)
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+        
+        waited = time.monotonic() - start
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return connection
+    
+    def release(self, connection):
+        """Rendre une connexion au pool"""
+        try:
+            # Ne jamais rendre une transaction ouverte au pool
+            if connection.in_transaction:
+                connection.rollback()
+        except Exception:
+            pass
+        
+        with self._lock:
+            self._in_use -= 1
+        self._idle.put(connection)
+    
+    def discard(self, connection):
+        """Fermer une connexion empruntée inutilisable au lieu de la rendre au pool"""
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._in_use -= 1
+            self._created -= 1
+    
+    def stats(self):
+        """Statistiques du pool (connexions, attente)"""
+        with self._lock:
+            return {
+                'size': self.size,
+                'created': self._created,
+                'in_use': self._in_use,
+                'idle': self._idle.qsize(),
+                'waiting': self._waiting,
+                'checkouts': self._checkouts,
+                'reconnects': self._reconnects,
+                'wait_time_total': round(self._wait_total, 6),
+                'wait_time_avg': round(self._wait_total / self._checkouts, 6) if self._checkouts else 0.0,
+                'wait_time_max': round(self._wait_max, 6)
+            }
+    
+    def close_all(self):
+        """Fermer toutes les connexions inactives du pool"""
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                connection.close()
+            except Exception:
+                pass
+            with self._lock:
+                self._created -= 1
+
 class Database:
     def __init__(self):
-        """Initialiser la connexion à MySQL"""
-        self.connection = None
+        """Initialiser le pool de connexions MySQL"""
+        self.pool = None
+        self._local = threading.local()
         self.connect()
     
     def connect(self):
-        """Établir la connexion à la base de données MySQL locale"""
+        """Créer le pool de connexions vers la base de données MySQL locale"""
         try:
             # Paramètres de connexion depuis les variables d'environnement
-            self.connection = mysql.connector.connect(
+            self.pool = ConnectionPool(
+                size=int(os.environ.get('DB_POOL_SIZE', 10)),
+                timeout=float(os.environ.get('DB_POOL_TIMEOUT', 30)),
                 host=os.environ.get('DB_HOST', 'localhost'),
                 user=os.environ.get('DB_USER', 'root'),
                 password=os.environ.get('DB_PASSWORD', ''),
@@ -30,28 +184,61 @@ class Database:
                 charset='utf8mb4',
                 collation='utf8mb4_unicode_ci'
             )
-            if self.connection.is_connected():
-                logging.info(" Connexion à MySQL réussie")
+            
+            # Ouvrir une première connexion pour valider la configuration
+            connection = self.pool.acquire()
+            self.pool.release(connection)
+            logging.info(f" Connexion à MySQL réussie (pool de {self.pool.size} connexions)")
         except Error as e:
             logging.error(f" Erreur de connexion à MySQL: {e}")
             raise
     
+    def get_connection(self):
+        """Emprunter une connexion au pool pour le thread courant"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self.pool.acquire()
+            self._local.connection = connection
+        return connection
+    
+    def release_connection(self, exception=None):
+        """Rendre au pool la connexion du thread courant (fin de requête)"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            self._local.connection = None
+            self.pool.release(connection)
+    
+    def pool_stats(self):
+        """Statistiques du pool de connexions"""
+        return self.pool.stats()
+    
     def is_connected(self):
-        """Vérifier si la connexion est active"""
+        """Vérifier si la connexion du thread courant est active"""
         try:
-            return self.connection and self.connection.is_connected()
+            connection = getattr(self._local, 'connection', None)
+            return connection is not None and connection.is_connected()
         except:
             return False
     
     def get_cursor(self):
         """Obtenir un curseur MySQL avec résultats en dictionnaire"""
+        connection = self.get_connection()
         if not self.is_connected():
-            self.connect()
-        return self.connection.cursor(dictionary=True)
+            connection.reconnect(attempts=2, delay=0)
+        return connection.cursor(dictionary=True)
+    
+    def _observe(self, operation, statement, start, failed):
+        """Comptabiliser la durée (et l'échec éventuel) d'une requête"""
+        labels = (operation, statement)
+        db_query_seconds.observe(time.perf_counter() - start, labels)
+        if failed:
+            db_query_errors.inc(labels)
     
     def execute_procedure(self, procedure_name, params):
         """Exécuter une procédure stockée MySQL"""
         cursor = self.get_cursor()
+        start = time.perf_counter()
+        failed = True
         try:
             # Appeler la procédure stockée
             cursor.callproc(procedure_name, params)
@@ -60,24 +247,73 @@ class Database:
             results = []
             for result in cursor.stored_results():
                 results.extend(result.fetchall())
+            failed = False
             return results
         except Error as e:
             logging.error(f" Erreur procédure {procedure_name}: {e}")
             raise
         finally:
             cursor.close()
+            self._observe('procedure', procedure_name, start, failed)
     
     def execute_query(self, query, params=None):
         """Exécuter une requête SQL (SELECT, INSERT, UPDATE, DELETE)"""
         cursor = self.get_cursor()
+        start = time.perf_counter()
+        failed = True
         try:
             cursor.execute(query, params or ())
             
             # Retourner les résultats pour SELECT, nombre de lignes affectées sinon
             if query.strip().upper().startswith('SELECT'):
-                return cursor.fetchall()
+                result = cursor.fetchall()
+            else:
+                result = cursor.rowcount
+            failed = False
+            return result
+        except Error as e:
+            logging.error(f" Erreur requête SQL: {e}")
+            logging.error(f" Query: {query}")
+            logging.error(f" Params: {params}")
+            raise
+        finally:
+            cursor.close()
+            self._observe('query', normalize_statement(query), start, failed)
+    
+    def stream_query(self, query, params=None, chunk_size=1000):
+        """Itérer sur un SELECT par blocs avec un curseur non bufferisé (connexion dédiée du pool)"""
+        connection = self.pool.acquire()
+        cursor = connection.cursor(dictionary=True, buffered=False)
+        exhausted = False
+        try:
+            cursor.execute(query, params or ())
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield from rows
+            exhausted = True
+        except Error as e:
+            logging.error(f" Erreur requête SQL (flux): {e}")
+            logging.error(f" Query: {query}")
+            raise
+        finally:
+            if exhausted:
+                cursor.close()
+                self.pool.release(connection)
             else:
-                return cursor.rowcount
+                # Des lignes non lues restent sur la socket: la connexion est abandonnée
+                self.pool.discard(connection)
+    
+    def execute_with_last_id(self, query, params=None):
+        """Exécuter une écriture et retourner (lignes affectées, LAST_INSERT_ID) en un seul aller-retour"""
+        cursor = self.get_cursor()
+        start = time.perf_counter()
+        failed = True
+        try:
+            cursor.execute(query, params or ())
+            failed = False
+            return cursor.rowcount, cursor.lastrowid
         except Error as e:
             logging.error(f" Erreur requête SQL: {e}")
             logging.error(f" Query: {query}")
@@ -85,6 +321,39 @@ class Database:
             raise
         finally:
             cursor.close()
+            self._observe('last_id', normalize_statement(query), start, failed)
+    
+    def execute_many(self, query, params_list):
+        """Exécuter une requête pour plusieurs jeux de paramètres (INSERT multi-lignes)"""
+        if not params_list:
+            return 0
+        cursor = self.get_cursor()
+        start = time.perf_counter()
+        failed = True
+        try:
+            cursor.executemany(query, params_list)
+            failed = False
+            return cursor.rowcount
+        except Error as e:
+            logging.error(f" Erreur requête SQL multiple: {e}")
+            logging.error(f" Query: {query}")
+            logging.error(f" Lignes: {len(params_list)}")
+            raise
+        finally:
+            cursor.close()
+            self._observe('many', normalize_statement(query), start, failed)
+    
+    @contextmanager
+    def transaction(self):
+        """Exécuter un bloc de requêtes dans une transaction explicite"""
+        connection = self.get_connection()
+        connection.start_transaction()
+        try:
+            yield connection
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
     
     def execute_query_safe(self, query, params=None):
         """Exécuter une requête SQL avec gestion d'erreur silencieuse"""
@@ -95,10 +364,11 @@ class Database:
             return []
     
     def close(self):
-        """Fermer proprement la connexion MySQL"""
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
-            logging.info(" Connexion MySQL fermée")
+        """Fermer proprement les connexions MySQL du pool"""
+        self.release_connection()
+        if self.pool:
+            self.pool.close_all()
+            logging.info(" Connexions MySQL fermées")
 
 # Instance globale de la base de données
 db = Database()
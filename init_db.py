@@ -6,7 +6,10 @@ Crée la base de données et toutes les tables nécessaires
 import mysql.connector
 from mysql.connector import Error
 import logging
+import argparse
+import sys
 import os
+import queries
 from dotenv import load_dotenv
 
 # Charger les variables d'environnement
@@ -81,6 +84,8 @@ def create_tables():
                 id INT AUTO_INCREMENT PRIMARY KEY,
                 name VARCHAR(100) UNIQUE NOT NULL,
                 description TEXT,
+                subcategory_count INT NOT NULL DEFAULT 0,
+                document_count INT NOT NULL DEFAULT 0,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
@@ -95,6 +100,7 @@ def create_tables():
                 category_id INT NOT NULL,
                 name VARCHAR(100) NOT NULL,
                 description TEXT,
+                document_count INT NOT NULL DEFAULT 0,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
                 FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE CASCADE,
@@ -131,6 +137,9 @@ def create_tables():
                 year INT NOT NULL,
                 title VARCHAR(255),
                 description TEXT,
+                content_hash CHAR(64) NULL,
+                file_size BIGINT NULL,
+                file_mtime BIGINT NULL,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
                 FOREIGN KEY (subcategory_id) REFERENCES subcategories(id) ON DELETE CASCADE
@@ -173,8 +182,259 @@ def create_tables():
         logger.error(f" Erreur lors de la création des tables: {e}")
         raise
 
+def get_connection():
+    """Connexion à la base de données de l'application"""
+    return mysql.connector.connect(
+        host=os.environ.get('DB_HOST', 'localhost'),
+        user=os.environ.get('DB_USER', 'root'),
+        password=os.environ.get('DB_PASSWORD', ''),
+        database=os.environ.get('DB_NAME', 'qr_archives'),
+        port=int(os.environ.get('DB_PORT', 3306))
+    )
+
+def _column_exists(cursor, table, column):
+    """Vérifier l'existence d'une colonne"""
+    cursor.execute("""
+    SELECT COUNT(*) FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    """, (table, column))
+    return cursor.fetchone()[0] > 0
+
+def _index_exists(cursor, table, index):
+    """Vérifier l'existence d'un index"""
+    cursor.execute("""
+    SELECT COUNT(*) FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+    """, (table, index))
+    return cursor.fetchone()[0] > 0
+
+def _add_index(cursor, table, index, columns):
+    """Créer un index s'il n'existe pas encore"""
+    if _index_exists(cursor, table, index):
+        logger.info(f" Index '{table}.{index}' déjà présent")
+        return
+    cursor.execute(f"CREATE INDEX {index} ON {table} ({columns})")
+    logger.info(f" Index '{table}.{index}' créé")
+
+def migration_001_counters(cursor):
+    """Compteurs matérialisés des catégories et sous-catégories"""
+    counter_columns = [
+        ('categories', 'subcategory_count'),
+        ('categories', 'document_count'),
+        ('subcategories', 'document_count')
+    ]
+    added = False
+    for table, column in counter_columns:
+        if not _column_exists(cursor, table, column):
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} INT NOT NULL DEFAULT 0")
+            logger.info(f" Colonne '{table}.{column}' ajoutée")
+            added = True
+    
+    # Initialiser les compteurs ajoutés à partir des données existantes
+    if added:
+        from counters import rebuild
+        rebuild()
+
+def migration_002_hot_query_indexes(cursor):
+    """Index des requêtes fréquentes (scanner, pagination, jointures QR)"""
+    # Vérification d'existence du scanner: WHERE filename = %s AND file_path = %s
+    _add_index(cursor, 'documents', 'idx_documents_filename_path', 'filename, file_path(191)')
+    # Pagination par curseur de /api/documents: ORDER BY created_at DESC, id DESC
+    _add_index(cursor, 'documents', 'idx_documents_created_id', 'created_at, id')
+    # Filtre par année dans une sous-catégorie
+    _add_index(cursor, 'documents', 'idx_documents_subcategory_year', 'subcategory_id, year')
+    # Jointures qrcodes filtrées par qr_type
+    _add_index(cursor, 'qrcodes', 'idx_qrcodes_document_type', 'document_id, qr_type')
+    _add_index(cursor, 'qrcodes', 'idx_qrcodes_category_type', 'category_id, qr_type')
+    _add_index(cursor, 'qrcodes', 'idx_qrcodes_subcategory_type', 'subcategory_id, qr_type')
+    _add_index(cursor, 'qrcodes', 'idx_qrcodes_type', 'qr_type')
+
+def migration_003_document_fulltext(cursor):
+    """Index FULLTEXT de la recherche de documents (/api/search)"""
+    if _index_exists(cursor, 'documents', 'ft_documents_search'):
+        logger.info(" Index 'documents.ft_documents_search' déjà présent")
+        return
+    cursor.execute("""
+    ALTER TABLE documents
+    ADD FULLTEXT INDEX ft_documents_search (title, description, filename, document_code)
+    """)
+    logger.info(" Index 'documents.ft_documents_search' créé")
+
+def migration_004_content_hash(cursor):
+    """Empreinte de contenu des documents (détection des déplacements et renommages)"""
+    content_columns = [
+        ('content_hash', 'CHAR(64) NULL'),
+        ('file_size', 'BIGINT NULL'),
+        ('file_mtime', 'BIGINT NULL')
+    ]
+    for column, definition in content_columns:
+        if not _column_exists(cursor, 'documents', column):
+            cursor.execute(f"ALTER TABLE documents ADD COLUMN {column} {definition}")
+            logger.info(f" Colonne 'documents.{column}' ajoutée")
+    
+    # Recherche des documents disparus par empreinte et par chemin
+    _add_index(cursor, 'documents', 'idx_documents_content_hash', 'content_hash')
+    _add_index(cursor, 'documents', 'idx_documents_file_path', 'file_path(191)')
+
+def migration_005_qr_image_store(cursor):
+    """Index des chemins d'images QR (stockage réparti: références partagées et nettoyage par dossier)"""
+    _add_index(cursor, 'qrcodes', 'idx_qrcodes_image_path', 'qr_image_path(191)')
+
+def migration_006_scan_jobs(cursor):
+    """État des tâches de scan partagé entre les workers de l'application"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS scan_jobs (
+        id CHAR(32) PRIMARY KEY,
+        mode VARCHAR(16) NOT NULL,
+        bulk BOOLEAN NOT NULL DEFAULT FALSE,
+        status VARCHAR(16) NOT NULL,
+        error TEXT NULL,
+        created_at DOUBLE NOT NULL,
+        started_at DOUBLE NULL,
+        finished_at DOUBLE NULL,
+        updated_at DOUBLE NOT NULL,
+        progress TEXT NULL,
+        INDEX idx_scan_jobs_created (created_at)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+    logger.info(" Table 'scan_jobs' créée ou déjà existante")
+
+# Migrations versionnées, appliquées dans l'ordre et une seule fois
+MIGRATIONS = [
+    (1, 'counters', migration_001_counters),
+    (2, 'hot_query_indexes', migration_002_hot_query_indexes),
+    (3, 'document_fulltext', migration_003_document_fulltext),
+    (4, 'content_hash', migration_004_content_hash),
+    (5, 'qr_image_store', migration_005_qr_image_store),
+    (6, 'scan_jobs', migration_006_scan_jobs),
+]
+
+def migrate():
+    """Appliquer les migrations qui ne l'ont pas encore été"""
+    try:
+        connection = get_connection()
+        cursor = connection.cursor()
+        
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """)
+            
+        cursor.execute("SELECT version FROM schema_migrations")
+        applied = {row[0] for row in cursor.fetchall()}
+            
+        pending = [m for m in MIGRATIONS if m[0] not in applied]
+        if not pending:
+            logger.info(" Schéma à jour")
+        
+        for version, name, migration in pending:
+            logger.info(f" Migration {version:03d} ({name})...")
+            migration(cursor)
+            cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+            connection.commit()
+            logger.info(f" Migration {version:03d} appliquée")
+            
+        cursor.close()
+        connection.close()
+    
+    except Error as e:
+        logger.error(f" Erreur lors des migrations: {e}")
+        raise
+
+# Requêtes fréquentes (constantes de queries.py utilisées par leurs appels), avec des paramètres
+# d'exemple. Le quatrième élément liste les tables dont le parcours complet est attendu.
+HOT_QUERIES = [
+    ("scanner: document existant", queries.DOCUMENT_BY_PATH,
+     ('x.pdf', 'Archives/X/Y/2025/x.pdf'), ()),
+    ("scanner: QR existant", queries.QR_BY_IDENTIFIER,
+     ('X',), ()),
+    ("scanner: documents d'un dossier", queries.DOCUMENT_PATHS_UNDER,
+     ('Archives/X/Y/%',), ()),
+    ("scanner: empreintes des fichiers disparus", queries.DOCUMENT_HASHES_BY_PATHS.format(placeholders='%s, %s'),
+     ('Archives/X/Y/2025/x.pdf', 'Archives/X/Y/2025/y.pdf'), ()),
+    ("surveillance: fichiers déjà enregistrés", queries.DOCUMENT_PATHS_IN.format(placeholders='%s, %s'),
+     ('Archives/X/Y/2025/x.pdf', 'Archives/X/Y/2025/y.pdf'), ()),
+    ("séquences: réservation", queries.SEQUENCE_RESERVE,
+     (1, 1, 2025), ()),
+    ("images QR: chemins d'un fragment", queries.QR_IMAGE_PATHS_UNDER,
+     ('qr\\_images/00/%',), ()),
+    ("qr: résolution document", queries.RESOLVE_DOCUMENT,
+     ('X',), ()),
+    ("qr: résolution sous-catégorie", queries.RESOLVE_SUBCATEGORY,
+     ('SUBCAT-X-Y',), ()),
+    ("qr: documents d'une sous-catégorie", queries.SUBCATEGORY_DOCUMENTS,
+     ('Y', 'SUBCAT-X-Y'), ()),
+    ("qr: résolution catégorie", queries.RESOLVE_CATEGORY,
+     ('CAT-X',), ()),
+    ("qr: sous-catégories d'une catégorie", queries.CATEGORY_SUBCATEGORIES_BY_QR,
+     ('CAT-X',), ()),
+    ("qr: téléchargement", queries.DOWNLOAD_DOCUMENT,
+     ('X',), ()),
+    ("fichiers: empreinte d'un document", queries.DOCUMENT_CONTENT_BY_PATH,
+     ('Archives/X/Y/2025/x.pdf',), ()),
+    ("fichiers: contenu d'un QR", queries.QR_PAYLOAD,
+     ('X',), ()),
+    ("api: page de documents", queries.DOCUMENT_PAGE.format(where=f"WHERE {queries.DOCUMENT_PAGE_AFTER}"),
+     ('2100-01-01 00:00:00', '2100-01-01 00:00:00', 2 ** 31 - 1, 51), ()),
+    ("api: recherche par code", queries.SEARCH_BY_CODE,
+     ('RH-CONTRATS%', 20), ()),
+    ("api: recherche plein texte", queries.SEARCH_FULLTEXT,
+     ('+contrat*', '+contrat*', 20), ()),
+    ("admin: liste des catégories", queries.CATEGORY_LIST,
+     (), ('c',)),
+    ("admin: sous-catégories d'une catégorie", queries.CATEGORY_SUBCATEGORIES,
+     (1,), ()),
+    ("admin: arborescence des sous-catégories", queries.SUBCATEGORY_TREE,
+     (), ('sc',)),
+]
+
+def check_queries():
+    """EXPLAIN des requêtes fréquentes et signalement des parcours complets de table"""
+    connection = get_connection()
+    cursor = connection.cursor(dictionary=True)
+    problems = 0
+    
+    for name, query, params, allowed_full_scans in HOT_QUERIES:
+        cursor.execute(f"EXPLAIN {query}", params)
+        plan = cursor.fetchall()
+        
+        full_scans = [
+            row for row in plan
+            if row.get('type') == 'ALL' and row.get('table') not in allowed_full_scans
+        ]
+        if full_scans:
+            problems += 1
+            for row in full_scans:
+                logger.warning(
+                    f" [SCAN COMPLET] {name}: table {row.get('table')} "
+                    f"(~{row.get('rows')} lignes, clés possibles: {row.get('possible_keys')})"
+                )
+        else:
+            used = ', '.join(f"{row.get('table')}:{row.get('key')}" for row in plan)
+            logger.info(f" [OK] {name} ({used})")
+    
+    cursor.close()
+    connection.close()
+    
+    if problems:
+        logger.warning(f" {problems} requête(s) avec parcours complet de table")
+    else:
+        logger.info(" Aucune requête fréquente ne parcourt une table complète")
+    return problems == 0
+
 def main():
     """Fonction principale d'initialisation"""
+    parser = argparse.ArgumentParser(description="Initialiser et migrer la base de données")
+    parser.add_argument('--check', action='store_true',
+                        help="EXPLAIN des requêtes fréquentes et signalement des parcours complets")
+    args = parser.parse_args()
+    
+    if args.check:
+        return check_queries()
+    
     logger.info("=== Initialisation de la base de données ===")
     
     try:
@@ -184,6 +444,9 @@ def main():
         # Créer les tables
         create_tables()
         
+        # Appliquer les migrations
+        migrate()
+        
         logger.info("Initialisation terminée avec succès")
         logger.info("Vous pouvez maintenant lancer l'application avec: python app.py")
         
@@ -194,4 +457,4 @@ def main():
     return True
 
 if __name__ == "__main__":
-    main()
+    sys.exit(0 if main() else 1)
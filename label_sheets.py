@@ -0,0 +1,305 @@
+"""
+Planches d'étiquettes QR imprimables (A4, PDF ou PNG) composées en mémoire
+"""
+
+import os
+import io
+import zlib
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageDraw, ImageFont
+from qr_generator import render_qr_matrix, process_pool_context
+from dotenv import load_dotenv
+
+# Charger les variables d'environnement
+load_dotenv()
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Format A4 en millimètres et en points PDF
+A4_MM = (210, 297)
+A4_POINTS = (595.28, 841.89)
+
+# Nombre maximal d'étiquettes par tirage
+MAX_LABELS = int(os.environ.get('LABEL_MAX', 20000))
+
+class LabelSheetLayout:
+    def __init__(self, columns=None, rows=None, dpi=None, margin_mm=None):
+        """Grille d'étiquettes sur une page A4 (QR à gauche, légende à droite)"""
+        self.columns = columns or int(os.environ.get('LABEL_COLUMNS', 4))
+        self.rows = rows or int(os.environ.get('LABEL_ROWS', 10))
+        self.dpi = dpi or int(os.environ.get('LABEL_DPI', 300))
+        margin_mm = margin_mm if margin_mm is not None else float(os.environ.get('LABEL_MARGIN_MM', 8))
+        
+        self.page_size = tuple(round(mm * self.dpi / 25.4) for mm in A4_MM)
+        self.margin = round(margin_mm * self.dpi / 25.4)
+        self.cell_size = (
+            (self.page_size[0] - 2 * self.margin) // self.columns,
+            (self.page_size[1] - 2 * self.margin) // self.rows
+        )
+        self.padding = max(self.cell_size[1] // 12, 2)
+        self.qr_side = min(self.cell_size[1], self.cell_size[0] // 2) - 2 * self.padding
+        self.max_font_size = max(self.cell_size[1] // 8, 10)
+        self.font_path = os.environ.get('LABEL_FONT', 'DejaVuSans.ttf')
+        self._fonts = {}
+        self._widths = {}
+    
+    @property
+    def per_page(self):
+        """Nombre d'étiquettes par page"""
+        return self.columns * self.rows
+    
+    def font(self, size):
+        """Police de légende (vectorielle si FreeType est disponible)"""
+        if size not in self._fonts:
+            try:
+                # Police TrueType complète (accents), cherchée aussi dans les dossiers de polices du système
+                self._fonts[size] = ImageFont.truetype(self.font_path, size)
+            except (OSError, ImportError):
+                try:
+                    self._fonts[size] = ImageFont.load_default(size)
+                except (TypeError, OSError, ImportError):
+                    self._fonts[size] = ImageFont.load_default()
+        return self._fonts[size]
+    
+    def text_width(self, text, size):
+        """Largeur d'un texte, calculée à partir de la largeur mise en cache de chaque caractère"""
+        widths = self._widths.setdefault(size, {})
+        font = self.font(size)
+        total = 0
+        for char in text:
+            if char not in widths:
+                widths[char] = font.getlength(char)
+            total += widths[char]
+        return total
+    
+    def fit_font_size(self, texts, width):
+        """Plus grande taille de police où le texte le plus long tient sur la largeur"""
+        longest = max(texts, key=len, default='')
+        size = self.max_font_size
+        while size > 10 and self.text_width(longest, size) > width:
+            size -= 2
+        return size
+    
+    def fit_text(self, text, size, width):
+        """Tronquer une légende à la largeur disponible"""
+        text = text or ''
+        if self.text_width(text, size) <= width:
+            return text
+        # Recherche dichotomique de la plus longue troncature qui tient
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.text_width(text[:middle] + '…', size) <= width:
+                low = middle
+            else:
+                high = middle - 1
+        return text[:low] + '…'
+
+def fetch_labels(category=None, subcategory=None, year=None, identifiers=None, limit=MAX_LABELS):
+    """Sélectionner les QR codes à imprimer (identifiants explicites ou documents filtrés)"""
+    # Import local: les processus de rendu importent ce module sans ouvrir de connexion MySQL
+    from database import db
+    
+    if identifiers:
+        identifiers = list(dict.fromkeys(identifiers))[:limit]
+        placeholders = ', '.join(['%s'] * len(identifiers))
+        rows = db.execute_query(f"""
+        SELECT q.qr_identifier, q.qr_payload, COALESCE(d.title, sc.name, c.name) as caption
+        FROM qrcodes q
+        LEFT JOIN documents d ON q.document_id = d.id
+        LEFT JOIN subcategories sc ON q.subcategory_id = sc.id
+        LEFT JOIN categories c ON q.category_id = c.id
+        WHERE q.qr_identifier IN ({placeholders})
+        """, tuple(identifiers)) or []
+        # Conserver l'ordre demandé
+        by_identifier = {row['qr_identifier']: row for row in rows}
+        return [by_identifier[i] for i in identifiers if i in by_identifier]
+    
+    conditions = ["q.qr_type = 'DOCUMENT'"]
+    params = []
+    if category:
+        conditions.append("c.name = %s")
+        params.append(category)
+    if subcategory:
+        conditions.append("sc.name = %s")
+        params.append(subcategory)
+    if year:
+        conditions.append("d.year = %s")
+        params.append(year)
+    params.append(limit)
+    
+    return db.execute_query(f"""
+    SELECT q.qr_identifier, q.qr_payload, d.title as caption
+    FROM documents d
+    JOIN qrcodes q ON d.id = q.document_id
+    JOIN subcategories sc ON d.subcategory_id = sc.id
+    JOIN categories c ON sc.category_id = c.id
+    WHERE {' AND '.join(conditions)}
+    ORDER BY d.document_code
+    LIMIT %s
+    """, tuple(params)) or []
+
+def _matrix_batch(payloads):
+    """Matrices QR d'un lot de payloads, en niveaux de gris à un pixel par module"""
+    matrices = []
+    for payload in payloads:
+        matrix = render_qr_matrix(payload)
+        data = bytes(0 if module else 255 for row in matrix for module in row)
+        matrices.append((len(matrix), data))
+    return matrices
+
+def build_matrices(payloads, workers=None, batch_size=200):
+    """Encoder tous les QR codes en mémoire (en parallèle sur plusieurs processus)"""
+    workers = workers if workers is not None else int(os.environ.get('QR_RENDER_WORKERS', os.cpu_count() or 1))
+    batches = [payloads[i:i + batch_size] for i in range(0, len(payloads), batch_size)]
+    
+    if workers <= 1 or len(batches) <= 1:
+        return [matrix for batch in batches for matrix in _matrix_batch(batch)]
+    
+    with ProcessPoolExecutor(max_workers=workers, mp_context=process_pool_context()) as executor:
+        return [matrix for result in executor.map(_matrix_batch, batches) for matrix in result]
+
+def iter_pages(labels, matrices, layout):
+    """Composer les pages d'étiquettes (images 1 bit) à partir des matrices en mémoire"""
+    if not labels:
+        return
+    
+    # Une taille de légende pour tout le tirage: l'identifiant le plus long doit tenir
+    size = max(size for size, data in matrices)
+    scale = max(layout.qr_side // size, 1)
+    text_width = layout.cell_size[0] - size * scale - layout.padding * 3
+    font_size = layout.fit_font_size([label['qr_identifier'] for label in labels], text_width)
+    font = layout.font(font_size)
+    
+    for start in range(0, len(labels), layout.per_page):
+        page = Image.new('1', layout.page_size, 1)
+        draw = ImageDraw.Draw(page)
+        
+        for index, label in enumerate(labels[start:start + layout.per_page]):
+            size, data = matrices[start + index]
+            column, row = index % layout.columns, index // layout.columns
+            x = layout.margin + column * layout.cell_size[0]
+            y = layout.margin + row * layout.cell_size[1]
+            
+            # Agrandissement entier des modules: bords nets à l'impression
+            scale = max(layout.qr_side // size, 1)
+            qr = Image.frombytes('L', (size, size), data).resize((size * scale, size * scale), Image.NEAREST)
+            qr_y = y + (layout.cell_size[1] - size * scale) // 2
+            page.paste(qr, (x + layout.padding, qr_y))
+            
+            text_x = x + layout.padding * 2 + size * scale
+            text_width = layout.cell_size[0] - (text_x - x) - layout.padding
+            text_y = y + layout.cell_size[1] // 2 - font_size
+            draw.text((text_x, text_y), layout.fit_text(label['qr_identifier'], font_size, text_width), font=font, fill=0)
+            draw.text((text_x, text_y + font_size + layout.padding // 2),
+                      layout.fit_text(label.get('caption'), font_size, text_width), font=font, fill=0)
+        
+        yield page
+
+def iter_pdf(pages, layout):
+    """Écrire un PDF page par page (image 1 bit compressée par page, mémoire constante)"""
+    position = 0
+    offsets = {}
+    
+    def write(data):
+        nonlocal position
+        position += len(data)
+        return data
+    
+    def write_object(number, body, stream=None):
+        offsets[number] = position
+        data = f"{number} 0 obj\n".encode() + body.encode()
+        if stream is not None:
+            data += b"\nstream\n" + stream + b"\nendstream"
+        return write(data + b"\nendobj\n")
+    
+    yield write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    
+    width, height = layout.page_size
+    page_numbers = []
+    number = 3
+    for page in pages:
+        page_number, content_number, image_number = number, number + 1, number + 2
+        number += 3
+        page_numbers.append(page_number)
+        
+        # Mode '1' de Pillow: 1 bit par pixel, lignes alignées sur l'octet, 1 = blanc (comme DeviceGray)
+        image = zlib.compress(page.tobytes(), 6)
+        yield write_object(image_number, (
+            f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+            f"/ColorSpace /DeviceGray /BitsPerComponent 1 /Filter /FlateDecode /Length {len(image)} >>"
+        ), image)
+        
+        content = f"q {A4_POINTS[0]} 0 0 {A4_POINTS[1]} 0 0 cm /Im0 Do Q".encode()
+        yield write_object(content_number, f"<< /Length {len(content)} >>", content)
+        
+        yield write_object(page_number, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {A4_POINTS[0]} {A4_POINTS[1]}] "
+            f"/Resources << /XObject << /Im0 {image_number} 0 R >> >> /Contents {content_number} 0 R >>"
+        ))
+    
+    kids = ' '.join(f"{n} 0 R" for n in page_numbers)
+    yield write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(page_numbers)} >>")
+    yield write_object(1, "<< /Type /Catalog /Pages 2 0 R >>")
+    
+    xref = position
+    lines = [f"xref\n0 {number}\n", "0000000000 65535 f \n"]
+    lines.extend(f"{offsets[n]:010d} 00000 n \n" for n in range(1, number))
+    lines.append(f"trailer\n<< /Size {number} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n")
+    yield write(''.join(lines).encode())
+
+def render_page_png(page, layout):
+    """Encoder une page en PNG 1 bit"""
+    buffer = io.BytesIO()
+    page.save(buffer, 'PNG', dpi=(layout.dpi, layout.dpi), optimize=True)
+    return buffer.getvalue()
+
+def prepare(labels, layout=None, workers=None):
+    """Encoder les QR codes des étiquettes et retourner le générateur de pages"""
+    layout = layout or LabelSheetLayout()
+    matrices = build_matrices([label['qr_payload'] for label in labels], workers)
+    return layout, iter_pages(labels, matrices, layout)
+
+def main():
+    """Générer des planches d'étiquettes QR depuis la ligne de commande"""
+    parser = argparse.ArgumentParser(description="Générer des planches d'étiquettes QR imprimables (A4)")
+    parser.add_argument('--category', help="Nom de la catégorie")
+    parser.add_argument('--subcategory', help="Nom de la sous-catégorie")
+    parser.add_argument('--year', type=int, help="Année des documents")
+    parser.add_argument('--id', dest='identifiers', action='append', help="Identifiant QR (répétable)")
+    parser.add_argument('--format', choices=['pdf', 'png'], default='pdf', help="Format de sortie")
+    parser.add_argument('-o', '--output', default=None, help="Fichier de sortie (PNG: une image par page, suffixe -001...)")
+    parser.add_argument('--columns', type=int, default=None, help="Étiquettes par ligne (défaut: LABEL_COLUMNS ou 4)")
+    parser.add_argument('--rows', type=int, default=None, help="Lignes d'étiquettes par page (défaut: LABEL_ROWS ou 10)")
+    parser.add_argument('--dpi', type=int, default=None, help="Résolution des pages (défaut: LABEL_DPI ou 300)")
+    parser.add_argument('--workers', type=int, default=None, help="Processus d'encodage des QR (défaut: QR_RENDER_WORKERS)")
+    args = parser.parse_args()
+    
+    labels = fetch_labels(args.category, args.subcategory, args.year, args.identifiers)
+    if not labels:
+        logger.error("Aucun QR code ne correspond à la sélection")
+        return
+    
+    layout = LabelSheetLayout(args.columns, args.rows, args.dpi)
+    layout, pages = prepare(labels, layout, args.workers)
+    output = args.output or f"labels.{args.format}"
+    
+    if args.format == 'pdf':
+        with open(output, 'wb') as f:
+            for chunk in iter_pdf(pages, layout):
+                f.write(chunk)
+    else:
+        base, extension = os.path.splitext(output)
+        for number, page in enumerate(pages, 1):
+            with open(f"{base}-{number:03d}{extension}", 'wb') as f:
+                f.write(render_page_png(page, layout))
+    
+    page_count = (len(labels) + layout.per_page - 1) // layout.per_page
+    logger.info(f"{len(labels)} étiquettes sur {page_count} pages: {output}")
+
+if __name__ == "__main__":
+    main()
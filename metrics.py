@@ -0,0 +1,264 @@
+"""
+Métriques d'exécution exposées au format texte Prometheus (/metrics)
+"""
+
+import os
+import re
+import bisect
+import logging
+import threading
+from dotenv import load_dotenv
+
+# Charger les variables d'environnement
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() == 'true'
+
+# Nombre de fragments par métrique: chaque thread écrit dans le sien (verrous quasi jamais disputés)
+METRICS_SHARDS = int(os.environ.get('METRICS_SHARDS', 16))
+
+# Bornes des histogrammes de durée (secondes)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Longueur maximale d'une requête SQL normalisée utilisée comme label
+STATEMENT_MAX_LENGTH = 160
+
+# Normalisation des requêtes SQL: littéraux et listes de paramètres remplacés par ?
+_STATEMENT_PATTERNS = [
+    (re.compile(r'\s+'), ' '),
+    (re.compile(r"'(?:[^'\\]|\\.)*'"), '?'),
+    (re.compile(r'%s|%\(\w+\)s'), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(?)'),
+    (re.compile(r'\(\?\)(?:\s*,\s*\(\?\))+'), '(?)')
+]
+_statement_cache = {}
+
+def normalize_statement(query):
+    """Forme normalisée d'une requête SQL (label de faible cardinalité), mise en cache"""
+    statement = _statement_cache.get(query)
+    if statement is None:
+        statement = query
+        for pattern, replacement in _STATEMENT_PATTERNS:
+            statement = pattern.sub(replacement, statement)
+        statement = statement.strip()[:STATEMENT_MAX_LENGTH]
+        # Cache borné: les requêtes construites dynamiquement ne le font pas grossir indéfiniment
+        if len(_statement_cache) >= 4096:
+            _statement_cache.clear()
+        _statement_cache[query] = statement
+    return statement
+
+def _escape(value):
+    """Échapper une valeur de label (antislash, guillemet, retour à la ligne)"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=None):
+    """{a="x",b="y"} (vide sans label)"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value):
+    """Valeur numérique au format Prometheus"""
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+class _Shard:
+    __slots__ = ('lock', 'values')
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+
+class _Metric:
+    type = None
+    
+    def __init__(self, name, documentation, labelnames=()):
+        """Initialiser une métrique (nom, description, noms des labels)"""
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._shards = [_Shard() for _ in range(max(METRICS_SHARDS, 1))]
+    
+    def _shard(self):
+        """Fragment du thread courant (identifiant système séquentiel: bonne répartition)"""
+        return self._shards[threading.get_native_id() % len(self._shards)]
+    
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+class Counter(_Metric):
+    type = 'counter'
+    
+    def inc(self, labels=(), amount=1):
+        """Incrémenter le compteur des labels donnés (tuple dans l'ordre de labelnames)"""
+        if not METRICS_ENABLED:
+            return
+        shard = self._shard()
+        with shard.lock:
+            shard.values[labels] = shard.values.get(labels, 0) + amount
+    
+    def collect(self):
+        """Valeurs fusionnées de tous les fragments {labels: total}"""
+        merged = {}
+        for shard in self._shards:
+            with shard.lock:
+                items = list(shard.values.items())
+            for labels, value in items:
+                merged[labels] = merged.get(labels, 0) + value
+        return merged
+    
+    def render(self):
+        lines = self._header()
+        for labels, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+class Histogram(_Metric):
+    type = 'histogram'
+    
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """Initialiser un histogramme (bornes supérieures croissantes, +Inf ajoutée)"""
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+    
+    def observe(self, value, labels=()):
+        """Enregistrer une observation (durée en secondes)"""
+        if not METRICS_ENABLED:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        shard = self._shard()
+        with shard.lock:
+            entry = shard.values.get(labels)
+            if entry is None:
+                # Effectifs par classe (non cumulés), puis somme des valeurs
+                entry = shard.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+    
+    def collect(self):
+        """Effectifs et sommes fusionnés {labels: [classes..., somme]}"""
+        merged = {}
+        for shard in self._shards:
+            with shard.lock:
+                items = [(labels, list(entry)) for labels, entry in shard.values.items()]
+            for labels, entry in items:
+                total = merged.get(labels)
+                if total is None:
+                    merged[labels] = entry
+                else:
+                    merged[labels] = [a + b for a, b in zip(total, entry)]
+        return merged
+    
+    def render(self):
+        lines = self._header()
+        bounds = [_format_value(float(bound)) for bound in self.buckets] + ['+Inf']
+        for labels, entry in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip(bounds, entry):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            suffix = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{suffix} {_format_value(entry[-1])}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+class Gauge(_Metric):
+    type = 'gauge'
+    
+    def __init__(self, name, documentation, labelnames, callback):
+        """Jauge lue au moment de la collecte: callback() -> {labels: valeur}"""
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+    
+    def render(self):
+        lines = self._header()
+        try:
+            values = self.callback()
+        except Exception as e:
+            logger.warning(f"Métrique {self.name} indisponible: {e}")
+            return []
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self, namespace='qr_archives'):
+        """Initialiser le registre (préfixe commun des noms de métriques)"""
+        self.namespace = namespace
+        self._metrics = {}
+        self._lock = threading.Lock()
+    
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Métrique déjà enregistrée: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+    
+    def counter(self, name, documentation, labelnames=()):
+        """Créer et enregistrer un compteur"""
+        return self._register(Counter(f"{self.namespace}_{name}", documentation, labelnames))
+    
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """Créer et enregistrer un histogramme"""
+        return self._register(Histogram(f"{self.namespace}_{name}", documentation, labelnames, buckets))
+    
+    def gauge(self, name, documentation, labelnames, callback):
+        """Créer et enregistrer une jauge calculée à la collecte"""
+        return self._register(Gauge(f"{self.namespace}_{name}", documentation, labelnames, callback))
+    
+    def render(self):
+        """Toutes les métriques au format texte Prometheus 0.0.4"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+# Registre global des métriques
+registry = MetricsRegistry()
+
+# Requêtes HTTP (endpoint = blueprint.fonction)
+http_request_seconds = registry.histogram(
+    'http_request_duration_seconds', "Durée des requêtes HTTP par route", ('endpoint', 'method', 'status')
+)
+
+# Base de données (opération: query, procedure, many, last_id)
+db_query_seconds = registry.histogram(
+    'db_query_duration_seconds', "Durée des requêtes MySQL par requête normalisée", ('operation', 'statement')
+)
+db_query_errors = registry.counter(
+    'db_query_errors_total', "Requêtes MySQL en erreur par requête normalisée", ('operation', 'statement')
+)
+
+# Rendu des QR codes (source: generate, on_demand)
+qr_render_seconds = registry.histogram(
+    'qr_render_duration_seconds', "Durée de rendu d'une image QR", ('source', 'format')
+)
+qr_renders = registry.counter(
+    'qr_renders_total', "Images QR rendues", ('source', 'format', 'result')
+)
+qr_render_batch_seconds = registry.histogram(
+    'qr_render_batch_duration_seconds', "Durée des lots du pipeline de rendu QR (processus de rendu)",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+
+# Scanner des archives
+scanner_phase_seconds = registry.counter(
+    'scanner_phase_seconds_total', "Temps passé par le scanner dans chaque phase", ('phase',)
+)
+scanner_phase_entries = registry.counter(
+    'scanner_phase_entries_total', "Entrées du scanner dans chaque phase", ('phase',)
+)
+scanner_items = registry.counter(
+    'scanner_items_total', "Dossiers et fichiers traités par le scanner", ('result',)
+)
@@ -0,0 +1,130 @@
+"""
+Migration des images QR du dossier plat qr_images/ vers le stockage réparti adressé par contenu
+"""
+
+import os
+import logging
+import argparse
+from database import db
+import queries
+from qr_generator import qr_generator, QR_IMAGE_FORMATS
+from qr_image_store import QR_IMAGE_PATH_PREFIX
+from dotenv import load_dotenv
+
+# Charger les variables d'environnement
+load_dotenv()
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class QRImageMigration:
+    def __init__(self, dry_run=False, batch_size=1000):
+        """Initialiser la migration (dry_run: compter sans rien déplacer ni écrire en base)"""
+        self.store = qr_generator.store
+        self.dry_run = dry_run
+        self.batch_size = batch_size
+        self.stats = {
+            'qrcodes': 0,
+            'moved': 0,
+            'deduplicated': 0,
+            'paths_updated': 0,
+            'orphans_removed': 0
+        }
+    
+    def migrate(self):
+        """Déplacer les images {identifiant}.{format} et mettre à jour qrcodes.qr_image_path"""
+        updates = []
+        simulated = set()
+        for row in db.stream_query("SELECT id, qr_identifier, qr_payload, qr_image_path FROM qrcodes"):
+            self.stats['qrcodes'] += 1
+            
+            for image_format in QR_IMAGE_FORMATS:
+                legacy = self.store.legacy_path(row['qr_identifier'], image_format)
+                if not os.path.exists(legacy):
+                    continue
+                if self.dry_run:
+                    target = self.store.path(row['qr_payload'], image_format)
+                    duplicate = target in simulated or os.path.exists(target)
+                    simulated.add(target)
+                    self.stats['deduplicated' if duplicate else 'moved'] += 1
+                elif self.store.adopt(legacy, row['qr_payload'], image_format):
+                    self.stats['moved'] += 1
+                else:
+                    self.stats['deduplicated'] += 1
+            
+            column = qr_generator.image_column(row['qr_payload'])
+            if row['qr_image_path'] != column:
+                updates.append((column, row['id']))
+                if len(updates) >= self.batch_size:
+                    self._update_paths(updates)
+                    updates = []
+        
+        self._update_paths(updates)
+        logger.info(
+            f"Migration: {self.stats['qrcodes']} QR codes, {self.stats['moved']} images déplacées, "
+            f"{self.stats['deduplicated']} doublons supprimés, {self.stats['paths_updated']} chemins mis à jour"
+        )
+        
+        leftovers = 0 if self.dry_run else sum(
+            1 for entry in os.scandir(self.store.root)
+            if entry.is_file() and os.path.splitext(entry.name)[1][1:] in QR_IMAGE_FORMATS
+        )
+        if leftovers:
+            logger.warning(f"{leftovers} images à plat sans QR code en base laissées dans {self.store.root}")
+        return self.stats
+    
+    def _update_paths(self, updates):
+        """Enregistrer un lot de nouveaux chemins d'images"""
+        if not updates:
+            return
+        if not self.dry_run:
+            db.execute_many("UPDATE qrcodes SET qr_image_path = %s WHERE id = %s", updates)
+        self.stats['paths_updated'] += len(updates)
+    
+    def collect_garbage(self):
+        """Supprimer les images du stockage qu'aucun QR code ne référence plus
+        
+        Un dossier de premier niveau à la fois: une requête indexée par préfixe
+        de qr_image_path, mémoire bornée quelle que soit la taille du catalogue.
+        """
+        prefix = QR_IMAGE_PATH_PREFIX.replace('_', '\\_')
+        for shard in (f"{i:02x}" for i in range(256)):
+            rows = db.execute_query_safe(
+                queries.QR_IMAGE_PATHS_UNDER,
+                (f"{prefix}/{shard}/%",)
+            ) or []
+            referenced = {row['qr_image_path'].rsplit('/', 1)[-1].split('.', 1)[0] for row in rows}
+            
+            for key, path in self.store.iter_shard(shard):
+                if key in referenced:
+                    continue
+                if not self.dry_run:
+                    os.remove(path)
+                self.stats['orphans_removed'] += 1
+        
+        logger.info(f"Nettoyage: {self.stats['orphans_removed']} images orphelines supprimées")
+        return self.stats
+
+def main():
+    """Migrer le dossier d'images QR depuis la ligne de commande"""
+    parser = argparse.ArgumentParser(description="Migrer les images QR vers le stockage réparti adressé par contenu")
+    parser.add_argument('--dry-run', action='store_true', help="Compter les opérations sans rien modifier")
+    parser.add_argument('--gc', action='store_true', help="Supprimer ensuite les images que plus aucun QR code ne référence")
+    parser.add_argument('--batch-size', type=int, default=1000, help="Mises à jour de qr_image_path par requête")
+    args = parser.parse_args()
+    
+    migration = QRImageMigration(dry_run=args.dry_run, batch_size=args.batch_size)
+    migration.migrate()
+    if args.gc:
+        if args.dry_run and migration.stats['paths_updated']:
+            # Le nettoyage s'appuie sur les chemins migrés: une simulation compterait tout comme orphelin
+            logger.warning("Nettoyage non simulé: des chemins restent à migrer en base")
+        else:
+            migration.collect_garbage()
+    
+    if args.dry_run:
+        logger.info("Simulation: aucun fichier déplacé, aucune ligne modifiée")
+
+if __name__ == "__main__":
+    main()
@@ -3,52 +3,259 @@ Générateur de QR codes pour l'application QR Archives
 """
 
 import qrcode
+import io
 import os
+import time
 import logging
+import multiprocessing
+from PIL import Image
+from qr_image_store import QRImageStore
+from metrics import qr_render_seconds, qr_renders
 from dotenv import load_dotenv
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 # Charger les variables d'environnement
 load_dotenv()
 
+# Taille d'un module en pixels dans les PNG (1 = PNG minimal, à agrandir sans lissage)
+QR_BOX_SIZE = int(os.environ.get('QR_BOX_SIZE', 10))
+
+# Formats d'image des QR codes: extension -> type MIME
+QR_IMAGE_FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml'
+}
+
+def process_pool_context():
+    """Contexte multiprocessing des pools de rendu (QR_RENDER_START_METHOD)
+    
+    Les pools sont créés depuis des processus multi-threadés (workers Flask, pipeline):
+    un fork y copierait des verrous tenus par d'autres threads. forkserver, ou spawn là où
+    il n'existe pas (Windows), démarre des processus neufs.
+    """
+    method = os.environ.get('QR_RENDER_START_METHOD')
+    if not method:
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(method)
+
+def build_qr(payload):
+    """Encoder un payload en QR code (matrice calculée, sans rendu)"""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=QR_BOX_SIZE,
+        border=4,
+    )
+    qr.add_data(payload)
+    qr.make(fit=True)
+    return qr
+
+# Moteurs de rendu: matrice de modules (bordure incluse) -> image 1 bit mise à l'échelle
+RASTERIZERS = {}
+
+def register_rasterizer(name):
+    """Enregistrer un moteur de rendu sous un nom (sélection par QR_RASTERIZER)"""
+    def decorator(function):
+        RASTERIZERS[name] = function
+        return function
+    return decorator
+
+@register_rasterizer('qrcode')
+def rasterize_qrcode(matrix, box_size=QR_BOX_SIZE):
+    """Rendu de référence de la bibliothèque qrcode (un rectangle PIL par module)"""
+    from qrcode.image.pil import PilImage
+    
+    # Même boucle que QRCode.make_image, la bordure étant déjà dans la matrice
+    image = PilImage(0, len(matrix), box_size, qrcode_modules=matrix, fill_color="black", back_color="white")
+    for r, row in enumerate(matrix):
+        for c, module in enumerate(row):
+            if module:
+                image.drawrect(r, c)
+    return image.get_image()
+
+# Matrice de booléens -> octets 0 (blanc) / 1 (noir) -> niveaux de gris 255 / 0
+_MODULE_TO_GRAY = bytes.maketrans(b'\x00\x01', b'\xff\x00')
+
+def _module_bytes(matrix):
+    """Modules de la matrice en octets 0/1, ligne par ligne"""
+    return b''.join(map(bytes, matrix))
+
+@register_rasterizer('pillow')
+def rasterize_pillow(matrix, box_size=QR_BOX_SIZE):
+    """Image 1 bit à un pixel par module agrandie en plus proche voisin (sans NumPy)"""
+    size = len(matrix)
+    modules = Image.frombytes('L', (size, size), _module_bytes(matrix).translate(_MODULE_TO_GRAY))
+    return modules.convert('1', dither=Image.Dither.NONE).resize((size * box_size, size * box_size), Image.NEAREST)
+
+if numpy is not None:
+    @register_rasterizer('numpy')
+    def rasterize_numpy(matrix, box_size=QR_BOX_SIZE):
+        """Agrandissement vectoriel (repeat) des lignes empaquetées en 1 bit, lues directement par Pillow"""
+        size = len(matrix)
+        white = numpy.frombuffer(_module_bytes(matrix), dtype=numpy.uint8).reshape(size, size) == 0
+        # Empaqueter chaque ligne agrandie une seule fois, puis répéter les lignes déjà empaquetées
+        rows = numpy.packbits(numpy.repeat(white, box_size, axis=1), axis=1)
+        pixels = numpy.repeat(rows, box_size, axis=0)
+        return Image.frombuffer('1', (size * box_size, size * box_size), pixels.tobytes(), 'raw', '1', 0, 1)
+
+def get_rasterizer(name=None):
+    """Moteur de rendu demandé (QR_RASTERIZER), NumPy par défaut s'il est installé"""
+    name = name or os.environ.get('QR_RASTERIZER') or ('numpy' if numpy is not None else 'pillow')
+    if name not in RASTERIZERS:
+        raise ValueError(f"Moteur de rendu QR inconnu: {name} (disponibles: {', '.join(sorted(RASTERIZERS))})")
+    return RASTERIZERS[name]
+
+def render_qr_image(payload, rasterizer=None):
+    """Rendre l'image d'un QR code pour un payload"""
+    # Créer le QR code
+    qr = build_qr(payload)
+    
+    # Créer l'image (identique au pixel près au rendu de qrcode, quel que soit le moteur)
+    return get_rasterizer(rasterizer)(qr.get_matrix(), qr.box_size)
+
+def render_qr_matrix(payload):
+    """Matrice des modules d'un QR code, bordure incluse (True = module noir)"""
+    return build_qr(payload).get_matrix()
+
+def render_qr_png_bytes(payload, rasterizer=None):
+    """Rendre un QR code en PNG à palette 1 bit (noir/blanc), compressé au maximum"""
+    image = render_qr_image(payload, rasterizer).convert('P')
+    image.putpalette([0, 0, 0, 255, 255, 255])
+    
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG', optimize=True, bits=1)
+    return buffer.getvalue()
+
+def _svg_rectangles(matrix):
+    """Fusionner les modules noirs en rectangles: segments horizontaux, prolongés
+    verticalement tant que la ligne suivante contient exactement le même segment"""
+    rectangles = []
+    open_runs = {}
+    for y, row in enumerate(matrix + [[]]):
+        runs = set()
+        x = 0
+        while x < len(row):
+            if row[x]:
+                start = x
+                while x < len(row) and row[x]:
+                    x += 1
+                runs.add((start, x - start))
+            x += 1
+        
+        for run in list(open_runs):
+            if run not in runs:
+                top = open_runs.pop(run)
+                rectangles.append((run[0], top, run[1], y - top))
+        for run in runs:
+            open_runs.setdefault(run, y)
+    
+    return sorted(rectangles, key=lambda rectangle: (rectangle[1], rectangle[0]))
+
+def render_qr_svg(payload):
+    """Rendre un QR code en SVG vectoriel (un seul chemin, net à toute taille d'impression)"""
+    matrix = render_qr_matrix(payload)
+    size = len(matrix)
+    # Déplacements relatifs: après "z", la position courante revient au coin du rectangle précédent
+    commands = []
+    previous_x = previous_y = 0
+    for x, y, width, height in _svg_rectangles(matrix):
+        commands.append(f"m{x - previous_x} {y - previous_y}h{width}v{height}h-{width}z")
+        previous_x, previous_y = x, y
+    path = ''.join(commands)
+    pixels = size * QR_BOX_SIZE
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" '
+        f'width="{pixels}" height="{pixels}" shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/><path fill="#000" d="{path}"/></svg>\n'
+    ).encode()
+
+def render_qr_bytes(payload, image_format='png', rasterizer=None):
+    """Rendre un QR code dans le format demandé (clé de QR_IMAGE_FORMATS)"""
+    if image_format == 'svg':
+        return render_qr_svg(payload)
+    return render_qr_png_bytes(payload, rasterizer)
+
+def render_qr_file(payload, qr_folder, image_format='png', rasterizer=None):
+    """Rendre un QR code dans le stockage adressé par contenu (utilisable depuis un processus de rendu)"""
+    store = QRImageStore(qr_folder)
+    
+    # Même payload, même image: déjà stockée, rien à rendre
+    if store.exists(payload, image_format):
+        return store.path(payload, image_format)
+    
+    return store.put(payload, image_format, render_qr_bytes(payload, image_format, rasterizer))
+
 class QRGenerator:
     def __init__(self):
         """Initialiser le générateur de QR codes"""
         self.qr_folder = os.environ.get('QR_IMAGES_FOLDER', 'qr_images')
         self.base_url = os.environ.get('BASE_URL', 'http://localhost:5000')
         
+        # Rendu à la demande: aucune image écrite à l'enregistrement, rendu au premier accès
+        self.lazy_render = os.environ.get('QR_LAZY_RENDER', 'False').lower() == 'true'
+        
+        # Moteur de rendu (validé au démarrage plutôt qu'au premier QR code)
+        self.rasterizer = os.environ.get('QR_RASTERIZER') or None
+        get_rasterizer(self.rasterizer)
+        
+        # Format des images écrites à la génération (l'autre est rendu à la demande)
+        self.image_format = os.environ.get('QR_IMAGE_FORMAT', 'png').lower()
+        if self.image_format not in QR_IMAGE_FORMATS:
+            raise ValueError(f"Format d'image QR inconnu: {self.image_format}")
+        
         # Créer le dossier QR s'il n'existe pas
         if not os.path.exists(self.qr_folder):
             os.makedirs(self.qr_folder, exist_ok=True)
             logging.info(f"Dossier QR créé: {self.qr_folder}")
     
+        # Stockage réparti des images
+        self.store = QRImageStore(self.qr_folder)
+    
     def generate_qr_code(self, identifier, payload):
-        """Générer un QR code PNG"""
+        """Générer l'image d'un QR code (PNG ou SVG selon QR_IMAGE_FORMAT)"""
+        start = time.perf_counter()
         try:
-            # Créer le QR code
-            qr = qrcode.QRCode(
-                version=1,
-                error_correction=qrcode.constants.ERROR_CORRECT_L,
-                box_size=10,
-                border=4,
-            )
-            qr.add_data(payload)
-            qr.make(fit=True)
-            
-            # Créer l'image
-            img = qr.make_image(fill_color="black", back_color="white")
-            
-            # Sauvegarder l'image
-            filename = f"{identifier}.png"
-            filepath = os.path.join(self.qr_folder, filename)
-            img.save(filepath)
+            filepath = render_qr_file(payload, self.qr_folder, self.image_format, self.rasterizer)
             
+            qr_render_seconds.observe(time.perf_counter() - start, ('generate', self.image_format))
+            qr_renders.inc(('generate', self.image_format, 'ok'))
             logging.info(f"QR code généré: {filepath}")
             return filepath
             
         except Exception as e:
+            qr_renders.inc(('generate', self.image_format, 'error'))
             logging.error(f"Erreur génération QR code {identifier}: {e}")
             return None
     
+    def render_bytes(self, payload, image_format=None):
+        """Rendre une image QR en mémoire, sans l'écrire (rendu à la demande)"""
+        image_format = image_format or self.image_format
+        start = time.perf_counter()
+        try:
+            data = render_qr_bytes(payload, image_format, self.rasterizer)
+        except Exception:
+            qr_renders.inc(('on_demand', image_format, 'error'))
+            raise
+        qr_render_seconds.observe(time.perf_counter() - start, ('on_demand', image_format))
+        qr_renders.inc(('on_demand', image_format, 'ok'))
+        return data
+    
+    def image_path(self, payload, image_format=None):
+        """Chemin de l'image d'un QR code dans le format donné (par défaut celui de génération)"""
+        return self.store.path(payload, image_format or self.image_format)
+    
+    def image_column(self, payload):
+        """Valeur de qrcodes.qr_image_path pour un payload"""
+        return self.store.column_value(payload, self.image_format)
+    
+    def delete_qr_images(self, payload):
+        """Supprimer les images d'un payload dans tous les formats"""
+        self.store.remove(payload, QR_IMAGE_FORMATS)
+    
     def generate_document_qr(self, document_code):
         """Générer un QR code pour un document"""
         payload = f"{self.base_url}/qr/{document_code}"
@@ -0,0 +1,75 @@
+"""
+Cache LRU borné des images QR rendues à la demande
+"""
+
+import os
+import logging
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+# Charger les variables d'environnement
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+class QRImageCache:
+    def __init__(self, max_bytes=None):
+        """Initialiser le cache (taille maximale en octets)"""
+        self.max_bytes = max_bytes or int(os.environ.get('QR_RENDER_CACHE_BYTES', 64 * 1024 * 1024))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key):
+        """Récupérer une image du cache (None si absente)"""
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+    
+    def put(self, key, data):
+        """Ajouter une image en évinçant les moins récemment utilisées"""
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size_bytes -= len(previous)
+            self._entries[key] = data
+            self.size_bytes += len(data)
+            while self.size_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size_bytes -= len(evicted)
+                self.evictions += 1
+    
+    def discard(self, key):
+        """Retirer une image du cache (QR supprimé)"""
+        with self._lock:
+            data = self._entries.pop(key, None)
+            if data is not None:
+                self.size_bytes -= len(data)
+    
+    def stats(self):
+        """Statistiques du cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'size_bytes': self.size_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+# Instance globale du cache d'images QR
+qr_image_cache = QRImageCache()
@@ -0,0 +1,118 @@
+"""
+Stockage des images QR adressé par contenu, réparti en sous-dossiers (qr_images/ab/cd/<sha256>.png)
+"""
+
+import os
+import hashlib
+import logging
+import tempfile
+from dotenv import load_dotenv
+
+# Charger les variables d'environnement
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Préfixe des chemins enregistrés dans qrcodes.qr_image_path
+QR_IMAGE_PATH_PREFIX = 'qr_images'
+
+class QRImageStore:
+    def __init__(self, root=None):
+        """Initialiser le stockage (dossier racine des images QR)
+        
+        Le rendu étant déterministe, l'empreinte du payload désigne le contenu de l'image:
+        deux QR codes de même payload partagent un seul fichier. Deux niveaux de 256
+        sous-dossiers gardent chaque dossier petit, quelle que soit la taille du catalogue.
+        """
+        self.root = root or os.environ.get('QR_IMAGES_FOLDER', 'qr_images')
+    
+    @staticmethod
+    def key(payload):
+        """Empreinte SHA-256 d'un payload (nom du fichier stocké)"""
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def relative_path(self, payload, image_format='png'):
+        """Chemin d'une image relatif à la racine du stockage"""
+        key = self.key(payload)
+        return f"{key[:2]}/{key[2:4]}/{key}.{image_format}"
+    
+    def path(self, payload, image_format='png'):
+        """Chemin absolu (ou relatif au dossier courant) d'une image stockée"""
+        return os.path.join(self.root, *self.relative_path(payload, image_format).split('/'))
+    
+    def column_value(self, payload, image_format='png'):
+        """Valeur de qrcodes.qr_image_path pour un payload"""
+        return f"{QR_IMAGE_PATH_PREFIX}/{self.relative_path(payload, image_format)}"
+    
+    def legacy_path(self, identifier, image_format='png'):
+        """Ancien emplacement à plat ({identifiant}.{format}), lu tant que la migration n'est pas faite"""
+        return os.path.join(self.root, f"{identifier}.{image_format}")
+    
+    def exists(self, payload, image_format='png'):
+        """L'image d'un payload est déjà stockée"""
+        return os.path.exists(self.path(payload, image_format))
+    
+    def put(self, payload, image_format, data):
+        """Stocker une image (écriture atomique, ignorée si le même contenu existe déjà)"""
+        target = self.path(payload, image_format)
+        if os.path.exists(target):
+            return target
+        
+        directory = os.path.dirname(target)
+        os.makedirs(directory, exist_ok=True)
+        # Fichier temporaire dans le même dossier: os.replace reste atomique
+        fd, temporary = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temporary, target)
+        except Exception:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return target
+    
+    def adopt(self, source, payload, image_format='png'):
+        """Déplacer un fichier existant dans le stockage (doublon supprimé s'il y est déjà)
+        
+        Retourne True si le fichier a été déplacé, False s'il faisait doublon.
+        """
+        target = self.path(payload, image_format)
+        if os.path.exists(target):
+            os.remove(source)
+            return False
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(source, target)
+        return True
+    
+    def read(self, payload, image_format='png', identifier=None):
+        """Lire une image stockée (ou à l'ancien emplacement), None si absente"""
+        candidates = [self.path(payload, image_format)]
+        if identifier:
+            candidates.append(self.legacy_path(identifier, image_format))
+        for candidate in candidates:
+            try:
+                with open(candidate, 'rb') as f:
+                    return f.read()
+            except FileNotFoundError:
+                continue
+        return None
+    
+    def remove(self, payload, formats):
+        """Supprimer les images d'un payload dans les formats donnés"""
+        for image_format in formats:
+            target = self.path(payload, image_format)
+            if os.path.exists(target):
+                os.remove(target)
+    
+    def iter_shard(self, shard):
+        """Fichiers (empreinte, chemin) d'un sous-dossier de premier niveau ('00' à 'ff')"""
+        shard_path = os.path.join(self.root, shard)
+        if not os.path.isdir(shard_path):
+            return
+        for subshard in os.scandir(shard_path):
+            if not subshard.is_dir():
+                continue
+            for entry in os.scandir(subshard.path):
+                if entry.is_file() and not entry.name.startswith('.tmp-'):
+                    yield entry.name.split('.', 1)[0], entry.path
@@ -0,0 +1,202 @@
+"""
+Pipeline de rendu parallèle des images QR, découplé de l'enregistrement en base
+"""
+
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from qr_generator import qr_generator, render_qr_file, process_pool_context
+from qr_image_store import QRImageStore
+from metrics import qr_render_batch_seconds, qr_renders
+from dotenv import load_dotenv
+
+# Charger les variables d'environnement
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+def _render_batch(items, qr_folder, image_format='png'):
+    """Rendre un lot de QR codes dans un processus de rendu"""
+    start = time.monotonic()
+    rendered = 0
+    failures = []
+    
+    for identifier, payload in items:
+        try:
+            render_qr_file(payload, qr_folder, image_format)
+            rendered += 1
+        except Exception as e:
+            failures.append((identifier, str(e)))
+    
+    return rendered, failures, time.monotonic() - start
+
+class QRRenderPipeline:
+    def __init__(self, workers=None, batch_size=None, qr_folder=None):
+        """Initialiser le pipeline (file d'attente + pool de processus de rendu)
+        
+        Avec 0 processus, le rendu est synchrone dans le thread appelant.
+        """
+        if workers is None:
+            workers = int(os.environ.get('QR_RENDER_WORKERS', os.cpu_count() or 1))
+        self.workers = workers
+        self.batch_size = batch_size or int(os.environ.get('QR_RENDER_BATCH_SIZE', 200))
+        self.qr_folder = qr_folder or qr_generator.qr_folder
+        self.store = QRImageStore(self.qr_folder)
+        
+        self._queue = queue.Queue()
+        self._executor = None
+        self._dispatcher = None
+        self._lock = threading.Lock()
+        # Limiter le nombre de lots en vol pour borner la mémoire
+        self._in_flight = threading.BoundedSemaphore(max(self.workers, 1) * 2)
+        
+        self.stats = {
+            'submitted': 0,
+            'rendered': 0,
+            'failed': 0,
+            'batches': 0,
+            'render_time': 0.0
+        }
+        self.failures = []
+    
+    def start(self):
+        """Démarrer le pool de processus et le thread de distribution"""
+        with self._lock:
+            if self._dispatcher is not None or self.workers <= 0:
+                return self
+            self._executor = self._new_executor()
+            self._dispatcher = threading.Thread(target=self._dispatch, name='qr-render-dispatcher', daemon=True)
+            self._dispatcher.start()
+        logger.info(f"Pipeline de rendu QR démarré ({self.workers} processus, lots de {self.batch_size})")
+        return self
+    
+    def _new_executor(self):
+        """Pool de processus de rendu (processus neufs, sans fork du processus multi-threadé)"""
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=process_pool_context())
+    
+    def _replace_executor(self):
+        """Remplacer un pool cassé (processus de rendu tué, par exemple par manque de mémoire)"""
+        broken, self._executor = self._executor, self._new_executor()
+        try:
+            broken.shutdown(wait=False, cancel_futures=True)
+        except Exception as e:
+            logger.warning(f"Arrêt du pool de rendu QR cassé: {e}")
+    
+    def submit(self, identifier, payload):
+        """Mettre un QR code en file de rendu (retourne immédiatement)"""
+        if qr_generator.lazy_render:
+            # Rendu différé au premier accès à /qr_images/<identifiant>.png
+            return self.store.path(payload, qr_generator.image_format)
+        
+        with self._lock:
+            self.stats['submitted'] += 1
+        
+        if self.workers <= 0:
+            filepath = qr_generator.generate_qr_code(identifier, payload)
+            with self._lock:
+                self.stats['rendered' if filepath else 'failed'] += 1
+            return filepath
+        
+        if self._dispatcher is None:
+            self.start()
+        self._queue.put((identifier, payload))
+        return self.store.path(payload, qr_generator.image_format)
+    
+    def _dispatch(self):
+        """Regrouper les QR en attente par lots et les envoyer au pool de processus"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            
+            batch = [item]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=0.05)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            
+            self._in_flight.acquire()
+            try:
+                future = self._submit_batch(batch)
+            except Exception as e:
+                # Le thread de distribution ne doit jamais mourir: le lot est compté en échec
+                self._in_flight.release()
+                logger.error(f"Lot QR non rendu ({len(batch)} QR codes): {e}")
+                self._record_batch(len(batch), 0, [(identifier, str(e)) for identifier, _ in batch], 0.0)
+            else:
+                future.add_done_callback(lambda f, batch=batch: self._on_batch_done(f, batch))
+            
+            if stop:
+                break
+    
+    def _submit_batch(self, batch):
+        """Envoyer un lot au pool, recréé une fois s'il est cassé (BrokenProcessPool)"""
+        try:
+            return self._executor.submit(_render_batch, batch, self.qr_folder, qr_generator.image_format)
+        except Exception as e:
+            logger.error(f"Pool de rendu QR indisponible ({e}) - recréation du pool")
+            self._replace_executor()
+            return self._executor.submit(_render_batch, batch, self.qr_folder, qr_generator.image_format)
+    
+    def _on_batch_done(self, future, batch):
+        """Comptabiliser un lot terminé"""
+        self._in_flight.release()
+        try:
+            rendered, failures, elapsed = future.result()
+        except Exception as e:
+            # Processus de rendu tué pendant le lot: tout le lot est en échec
+            rendered, failures, elapsed = 0, [(identifier, str(e)) for identifier, _ in batch], 0.0
+        self._record_batch(len(batch), rendered, failures, elapsed)
+        
+    def _record_batch(self, size, rendered, failures, elapsed):
+        """Comptabiliser un lot (rendu ou en échec) et journaliser son débit"""
+        failed = size - rendered
+        with self._lock:
+            self.stats['batches'] += 1
+            self.stats['rendered'] += rendered
+            self.stats['failed'] += failed
+            self.stats['render_time'] += elapsed
+            self.failures.extend(failures)
+        
+        # Les rendus ont lieu dans les processus du pool: comptés ici, par lot
+        qr_render_batch_seconds.observe(elapsed)
+        qr_renders.inc(('pipeline', qr_generator.image_format, 'ok'), rendered)
+        if failed:
+            qr_renders.inc(('pipeline', qr_generator.image_format, 'error'), failed)
+        
+        throughput = rendered / elapsed if elapsed else 0.0
+        logger.info(f"Lot QR rendu: {rendered}/{size} en {elapsed:.2f}s ({throughput:.0f} QR/s)")
+        for identifier, error in failures:
+            logger.error(f"Erreur génération QR code {identifier}: {error}")
+    
+    def close(self):
+        """Vider la file, attendre la fin des rendus et arrêter le pool"""
+        with self._lock:
+            dispatcher, self._dispatcher = self._dispatcher, None
+        if dispatcher is None:
+            return self.stats
+        
+        self._queue.put(None)
+        dispatcher.join()
+        self._executor.shutdown(wait=True)
+        self._executor = None
+        
+        logger.info(
+            f"Pipeline de rendu QR terminé: {self.stats['rendered']} rendus, "
+            f"{self.stats['failed']} en échec, {self.stats['batches']} lots"
+        )
+        return self.stats
+
+# Instance globale du pipeline de rendu (démarrée au premier envoi)
+qr_render_pipeline = QRRenderPipeline()
+atexit.register(qr_render_pipeline.close)
@@ -0,0 +1,220 @@
+"""
+Requêtes SQL fréquentes, partagées par leurs appels et par init_db.py --check (EXPLAIN)
+"""
+
+# Scanner des archives
+
+DOCUMENT_BY_PATH = "SELECT id, document_code FROM documents WHERE filename = %s AND file_path = %s"
+
+QR_BY_IDENTIFIER = "SELECT id FROM qrcodes WHERE qr_identifier = %s"
+
+# Motif LIKE "<dossier>/%" (préfixe échappé)
+DOCUMENT_PATHS_UNDER = "SELECT file_path FROM documents WHERE file_path LIKE %s"
+
+# {placeholders}: un %s par chemin
+DOCUMENT_HASHES_BY_PATHS = """
+SELECT file_path, content_hash FROM documents
+WHERE file_path IN ({placeholders}) AND content_hash IS NOT NULL
+"""
+
+# {placeholders}: un %s par chemin
+DOCUMENT_PATHS_IN = "SELECT file_path FROM documents WHERE file_path IN ({placeholders})"
+
+# Migration du stockage des images QR (motif LIKE "<préfixe>/<fragment>/%")
+QR_IMAGE_PATHS_UNDER = "SELECT qr_image_path FROM qrcodes WHERE qr_image_path LIKE %s"
+
+# Séquences des documents
+SEQUENCE_RESERVE = """
+UPDATE sequences SET current_sequence = LAST_INSERT_ID(current_sequence + %s)
+WHERE subcategory_id = %s AND year = %s
+"""
+
+# Résolution des QR codes
+
+RESOLVE_DOCUMENT = """
+SELECT
+    d.document_code,
+    d.filename,
+    d.file_path,
+    d.year,
+    d.title,
+    d.description,
+    c.name as category_name,
+    sc.name as subcategory_name,
+    q.qr_payload,
+    'DOCUMENT' as type
+FROM documents d
+JOIN subcategories sc ON d.subcategory_id = sc.id
+JOIN categories c ON sc.category_id = c.id
+JOIN qrcodes q ON d.id = q.document_id
+WHERE q.qr_identifier = %s AND q.qr_type = 'DOCUMENT'
+"""
+
+RESOLVE_SUBCATEGORY = """
+SELECT
+    q.qr_identifier,
+    c.name as category_name,
+    sc.name as subcategory_name,
+    sc.description,
+    q.folder_path,
+    q.qr_payload,
+    'SUBCATEGORY' as type,
+    sc.document_count
+FROM qrcodes q
+JOIN subcategories sc ON q.subcategory_id = sc.id
+JOIN categories c ON sc.category_id = c.id
+WHERE q.qr_identifier = %s AND q.qr_type = 'SUBCATEGORY'
+"""
+
+SUBCATEGORY_DOCUMENTS = """
+SELECT d.document_code, d.filename, d.title, q.qr_identifier
+FROM documents d
+JOIN qrcodes q ON d.id = q.document_id
+JOIN subcategories sc ON d.subcategory_id = sc.id
+WHERE sc.name = %s AND sc.category_id = (
+    SELECT category_id FROM subcategories WHERE id = (
+        SELECT subcategory_id FROM qrcodes WHERE qr_identifier = %s
+    )
+)
+ORDER BY d.created_at DESC
+"""
+
+RESOLVE_CATEGORY = """
+SELECT
+    q.qr_identifier,
+    c.name as category_name,
+    c.description,
+    q.folder_path,
+    q.qr_payload,
+    'CATEGORY' as type,
+    c.subcategory_count,
+    c.document_count
+FROM qrcodes q
+JOIN categories c ON q.category_id = c.id
+WHERE q.qr_identifier = %s AND q.qr_type = 'CATEGORY'
+"""
+
+CATEGORY_SUBCATEGORIES_BY_QR = """
+SELECT
+    sc.name as subcategory_name,
+    sc.description,
+    q.qr_identifier,
+    sc.document_count
+FROM subcategories sc
+LEFT JOIN qrcodes q ON sc.id = q.subcategory_id AND q.qr_type = 'SUBCATEGORY'
+WHERE sc.category_id = (
+    SELECT category_id FROM qrcodes WHERE qr_identifier = %s
+)
+ORDER BY sc.name
+"""
+
+DOWNLOAD_DOCUMENT = """
+SELECT
+    d.filename,
+    d.file_path,
+    d.content_hash,
+    d.file_size,
+    d.file_mtime
+FROM documents d
+JOIN qrcodes q ON d.id = q.document_id
+WHERE q.qr_identifier = %s
+"""
+
+# Empreinte de contenu d'un document servi par /archives/ (ETag)
+DOCUMENT_CONTENT_BY_PATH = "SELECT content_hash, file_size, file_mtime FROM documents WHERE file_path = %s"
+
+QR_PAYLOAD = "SELECT qr_payload FROM qrcodes WHERE qr_identifier = %s"
+
+# API documents
+
+# {where}: filtres optionnels (catégorie, sous-catégorie, année, curseur)
+DOCUMENT_PAGE = """
+SELECT
+    d.id,
+    d.created_at,
+    d.document_code,
+    d.filename,
+    d.year,
+    d.title,
+    c.name as category_name,
+    sc.name as subcategory_name,
+    q.qr_identifier
+FROM documents d
+JOIN subcategories sc ON d.subcategory_id = sc.id
+JOIN categories c ON sc.category_id = c.id
+LEFT JOIN qrcodes q ON d.id = q.document_id
+{where}
+ORDER BY d.created_at DESC, d.id DESC
+LIMIT %s
+"""
+
+# Reprendre strictement après le dernier document de la page précédente
+DOCUMENT_PAGE_AFTER = "(d.created_at < %s OR (d.created_at = %s AND d.id < %s))"
+
+SEARCH_COLUMNS = "SELECT d.document_code, d.filename, d.year, d.title, c.name as category_name, sc.name as subcategory_name, q.qr_identifier"
+
+SEARCH_BY_CODE = f"""
+{SEARCH_COLUMNS}
+FROM documents d
+JOIN subcategories sc ON d.subcategory_id = sc.id
+JOIN categories c ON sc.category_id = c.id
+LEFT JOIN qrcodes q ON d.id = q.document_id
+WHERE d.document_code LIKE %s
+ORDER BY d.document_code
+LIMIT %s
+"""
+
+SEARCH_FULLTEXT = f"""
+{SEARCH_COLUMNS},
+    MATCH(d.title, d.description, d.filename, d.document_code)
+        AGAINST(%s IN BOOLEAN MODE) as score
+FROM documents d
+JOIN subcategories sc ON d.subcategory_id = sc.id
+JOIN categories c ON sc.category_id = c.id
+LEFT JOIN qrcodes q ON d.id = q.document_id
+WHERE MATCH(d.title, d.description, d.filename, d.document_code)
+      AGAINST(%s IN BOOLEAN MODE)
+ORDER BY score DESC
+LIMIT %s
+"""
+
+# Administration
+
+CATEGORY_LIST = """
+SELECT
+    c.id,
+    c.name,
+    c.description,
+    c.subcategory_count,
+    c.document_count,
+    q.qr_identifier
+FROM categories c
+LEFT JOIN qrcodes q ON c.id = q.category_id AND q.qr_type = 'CATEGORY'
+ORDER BY c.name
+"""
+
+CATEGORY_SUBCATEGORIES = """
+SELECT
+    sc.id,
+    sc.name,
+    sc.description,
+    sc.document_count,
+    q.qr_identifier
+FROM subcategories sc
+LEFT JOIN qrcodes q ON sc.id = q.subcategory_id AND q.qr_type = 'SUBCATEGORY'
+WHERE sc.category_id = %s
+ORDER BY sc.name
+"""
+
+SUBCATEGORY_TREE = """
+SELECT
+    sc.id,
+    sc.category_id,
+    sc.name,
+    sc.description,
+    sc.document_count,
+    q.qr_identifier
+FROM subcategories sc
+LEFT JOIN qrcodes q ON sc.id = q.subcategory_id AND q.qr_type = 'SUBCATEGORY'
+ORDER BY sc.name
+"""
@@ -0,0 +1,110 @@
+"""
+Cache TTL + LRU des résolutions de QR codes (/qr/<identifiant>)
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+# Charger les variables d'environnement
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+class ResolveCache:
+    def __init__(self, max_entries=None, ttl=None):
+        """Initialiser le cache (nombre maximal d'entrées, durée de vie en secondes)"""
+        self.max_entries = max_entries or int(os.environ.get('RESOLVE_CACHE_SIZE', 2048))
+        self.ttl = ttl if ttl is not None else float(os.environ.get('RESOLVE_CACHE_TTL', 300))
+        self._entries = OrderedDict()
+        self._content_types = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    def get(self, identifier, content_type):
+        """Récupérer une résolution en cache (None si absente ou expirée)"""
+        key = (identifier, content_type)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, identifier, content_type, value):
+        """Mettre une résolution en cache"""
+        if self.ttl <= 0:
+            return
+        key = (identifier, content_type)
+        with self._lock:
+            self._content_types.add(content_type)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def invalidate(self, *identifiers):
+        """Invalider toutes les représentations des identifiants donnés"""
+        with self._lock:
+            for identifier in identifiers:
+                for content_type in self._content_types:
+                    if self._entries.pop((identifier, content_type), None) is not None:
+                        self.invalidations += 1
+    
+    def invalidate_category(self, category_name):
+        """Invalider le QR d'une catégorie (compteurs, liste des sous-catégories)"""
+        self.invalidate(f"CAT-{category_name}")
+    
+    def invalidate_subcategory(self, category_name, subcategory_name):
+        """Invalider le QR d'une sous-catégorie et celui de sa catégorie"""
+        self.invalidate(f"SUBCAT-{category_name}-{subcategory_name}", f"CAT-{category_name}")
+    
+    def invalidate_document(self, document_code, category_name=None, subcategory_name=None):
+        """Invalider le QR d'un document et ceux de ses dossiers parents"""
+        identifiers = [document_code]
+        if category_name:
+            identifiers.append(f"CAT-{category_name}")
+            if subcategory_name:
+                identifiers.append(f"SUBCAT-{category_name}-{subcategory_name}")
+        self.invalidate(*identifiers)
+    
+    def clear(self):
+        """Vider le cache"""
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+    
+    def stats(self):
+        """Statistiques du cache (taux de succès)"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+# Instance globale du cache de résolution
+resolve_cache = ResolveCache()
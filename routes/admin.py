@@ -1,15 +1,27 @@
-from flask import Blueprint, render_template, request, jsonify, current_app
+from flask import Blueprint, render_template, request, jsonify, current_app, Response
 from database import db
+import queries
 from routes.decorators import admin_required
 from routes.utils import create_document_simple
+from qr_render_pipeline import qr_render_pipeline
 from qr_generator import qr_generator
+from qr_image_cache import qr_image_cache
+from resolve_cache import resolve_cache
+from counters import increment_subcategories, rebuild as rebuild_counters
+from scan_jobs import scan_job_manager, ScanAlreadyRunningError
 import os
+import json
+import time
+import hashlib
 import logging
 
 logger = logging.getLogger(__name__)
 
 admin_bp = Blueprint('admin', __name__)
 
+# Intervalle d'envoi de la progression des scans (secondes)
+SCAN_EVENTS_INTERVAL = 1.0
+
 @admin_bp.route('/')
 @admin_required
 def index():
@@ -25,52 +37,135 @@ def admin_panel():
 @admin_bp.route('/api/scan-archives', methods=['POST'])
 @admin_required
 def scan_archives():
-    """API: Scanner la structure Archives/ et créer tous les QR codes"""
+    """API: Lancer en arrière-plan le scan de la structure Archives/ (retourne l'id de la tâche)"""
     try:
-        from archive_scanner import ArchiveScanner
+        data = request.get_json(silent=True) or {}
+        job = scan_job_manager.submit(
+            incremental=bool(data.get('incremental', False)),
+            bulk=bool(data.get('bulk', False))
+        )
         
-        scanner = ArchiveScanner()
-        success = scanner.scan_and_register_all()
+        return jsonify({
+            'success': True,
+            'message': 'Scan de la structure Archives/ lancé',
+            'job_id': job.id,
+            'job': job.to_dict()
+        }), 202
         
-        if success:
-            return jsonify({
-                'success': True,
-                'message': 'Structure Archives/ scannée et QR codes générés avec succès'
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'error': 'Erreur lors du scan de la structure'
-            }), 500
-            
+    except ScanAlreadyRunningError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 409
+    except Exception as e:
+        logger.error(f"Erreur lors du lancement du scan des archives: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Erreur interne du serveur'
+        }), 500
+
+@admin_bp.route('/api/scan-jobs')
+@admin_required
+def list_scan_jobs():
+    """API: Lister les tâches de scan récentes"""
+    return jsonify({
+        'success': True,
+        'jobs': [job.to_dict() for job in scan_job_manager.list()]
+    })
+
+@admin_bp.route('/api/scan-jobs/<job_id>')
+@admin_required
+def get_scan_job(job_id):
+    """API: État et progression d'une tâche de scan"""
+    job = scan_job_manager.get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Tâche de scan introuvable'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'job': job.to_dict()
+    })
+
+@admin_bp.route('/api/scan-jobs/<job_id>/events')
+@admin_required
+def scan_job_events(job_id):
+    """API: Progression d'une tâche de scan en Server-Sent Events"""
+    job = scan_job_manager.get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Tâche de scan introuvable'
+        }), 404
+    
+    def events():
+        current = job
+        try:
+            while True:
+                state = current.to_dict()
+                yield f"event: progress\ndata: {json.dumps(state)}\n\n"
+                if current.finished:
+                    yield f"event: done\ndata: {json.dumps(state)}\n\n"
+                    break
+                time.sleep(SCAN_EVENTS_INTERVAL)
+                # Tâche d'un autre worker: état relu dans scan_jobs à chaque envoi
+                current = scan_job_manager.get(job_id) or current
+        finally:
+            # Flux lu après la fin de la requête: la connexion n'est pas rendue par le teardown
+            db.release_connection()
+    
+    return Response(
+        events(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@admin_bp.route('/api/rebuild-counters', methods=['POST'])
+@admin_required
+def rebuild_counters_api():
+    """API: Recalculer les compteurs de documents et de sous-catégories"""
+    try:
+        rebuild_counters()
+        resolve_cache.clear()
+        return jsonify({
+            'success': True,
+            'message': 'Compteurs recalculés'
+        })
     except Exception as e:
-        logger.error(f"Erreur lors du scan des archives: {e}")
+        logger.error(f"Erreur lors du recalcul des compteurs: {e}")
         return jsonify({
             'success': False,
             'error': 'Erreur interne du serveur'
         }), 500
 
+@admin_bp.route('/api/db-stats')
+@admin_required
+def db_stats():
+    """API: Statistiques du pool de connexions MySQL"""
+    return jsonify({
+        'success': True,
+        'pool': db.pool_stats()
+    })
+
+@admin_bp.route('/api/cache-stats')
+@admin_required
+def cache_stats():
+    """API: Statistiques des caches (résolution QR, images QR)"""
+    return jsonify({
+        'success': True,
+        'resolve_cache': resolve_cache.stats(),
+        'qr_image_cache': qr_image_cache.stats()
+    })
+
 @admin_bp.route('/api/categories', methods=['GET'])
 def list_categories():
     """API: Lister toutes les catégories"""
     try:
         # Vérifier si la table existe
         try:
-            query = """
-            SELECT 
-                c.id,
-                c.name,
-                c.description,
-                COUNT(DISTINCT sc.id) as subcategory_count,
-                COUNT(DISTINCT d.id) as document_count,
-                q.qr_identifier
-            FROM categories c
-            LEFT JOIN subcategories sc ON c.id = sc.category_id
-            LEFT JOIN documents d ON sc.id = d.subcategory_id
-            LEFT JOIN qrcodes q ON c.id = q.category_id AND q.qr_type = 'CATEGORY'
-            GROUP BY c.id, c.name, c.description, q.qr_identifier
-            ORDER BY c.name
-            """
+            query = queries.CATEGORY_LIST
             
             categories = db.execute_query(query)
             
@@ -124,7 +219,7 @@ def create_category():
         # Créer le QR code
         qr_identifier = f"CAT-{name}"
         qr_payload = f"{current_app.config['BASE_URL']}/qr/{qr_identifier}"
-        qr_image_path = f"qr_images/{qr_identifier}.png"
+        qr_image_path = qr_generator.image_column(qr_payload)
         folder_path = f"Archives/{name}"
         
         qr_query = """
@@ -132,9 +227,10 @@ def create_category():
         VALUES (%s, %s, %s, %s, %s, %s)
         """
         db.execute_query(qr_query, ('CATEGORY', qr_identifier, qr_payload, category_id, folder_path, qr_image_path))
+        resolve_cache.invalidate_category(name)
         
-        # Générer l'image QR
-        qr_generator.generate_qr_code(qr_identifier, qr_payload)
+        # Générer l'image QR (en arrière-plan)
+        qr_render_pipeline.submit(qr_identifier, qr_payload)
         
         # Créer le dossier physique
         os.makedirs(os.path.join(current_app.config['ARCHIVES_FOLDER'], name), exist_ok=True)
@@ -204,11 +300,12 @@ def create_subcategory():
             (category_id, name, description)
         )
         subcategory_id = db.execute_query("SELECT LAST_INSERT_ID() as id")[0]['id']
+        increment_subcategories(category_id)
         
         # Créer le QR code
         qr_identifier = f"SUBCAT-{category_name}-{name}"
         qr_payload = f"{current_app.config['BASE_URL']}/qr/{qr_identifier}"
-        qr_image_path = f"qr_images/{qr_identifier}.png"
+        qr_image_path = qr_generator.image_column(qr_payload)
         folder_path = f"Archives/{category_name}/{name}"
         
         qr_query = """
@@ -216,9 +313,10 @@ def create_subcategory():
         VALUES (%s, %s, %s, %s, %s, %s)
         """
         db.execute_query(qr_query, ('SUBCATEGORY', qr_identifier, qr_payload, subcategory_id, folder_path, qr_image_path))
+        resolve_cache.invalidate_subcategory(category_name, name)
         
-        # Générer l'image QR
-        qr_generator.generate_qr_code(qr_identifier, qr_payload)
+        # Générer l'image QR (en arrière-plan)
+        qr_render_pipeline.submit(qr_identifier, qr_payload)
         
         # Créer le dossier physique
         os.makedirs(os.path.join(current_app.config['ARCHIVES_FOLDER'], category_name, name), exist_ok=True)
@@ -246,20 +344,7 @@ def create_subcategory():
 def list_subcategories(category_id):
     """API: Lister les sous-catégories d'une catégorie"""
     try:
-        query = """
-        SELECT 
-            sc.id,
-            sc.name,
-            sc.description,
-            COUNT(d.id) as document_count,
-            q.qr_identifier
-        FROM subcategories sc
-        LEFT JOIN documents d ON sc.id = d.subcategory_id
-        LEFT JOIN qrcodes q ON sc.id = q.subcategory_id AND q.qr_type = 'SUBCATEGORY'
-        WHERE sc.category_id = %s
-        GROUP BY sc.id, sc.name, sc.description, q.qr_identifier
-        ORDER BY sc.name
-        """
+        query = queries.CATEGORY_SUBCATEGORIES
         
         subcategories = db.execute_query_safe(query, (category_id,))
         
@@ -275,6 +360,43 @@ def list_subcategories(category_id):
             'error': 'Erreur interne du serveur'
         }), 500
 
+@admin_bp.route('/api/tree')
+def category_tree():
+    """API: Arborescence complète catégories/sous-catégories en une requête (ETag)"""
+    try:
+        categories = db.execute_query_safe(queries.CATEGORY_LIST) or []
+        
+        subcategories = db.execute_query_safe(queries.SUBCATEGORY_TREE) or []
+        
+        # Rattacher les sous-catégories à leur catégorie
+        by_id = {}
+        for category in categories:
+            category['subcategories'] = []
+            by_id[category['id']] = category
+        for subcategory in subcategories:
+            category = by_id.get(subcategory.pop('category_id'))
+            if category is not None:
+                category['subcategories'].append(subcategory)
+        
+        payload = {
+            'success': True,
+            'categories': categories
+        }
+        
+        # ETag calculé sur le contenu: 304 si l'arborescence n'a pas changé
+        etag = hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+        response = jsonify(payload)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+    
+    except Exception as e:
+        logger.error(f"Erreur lors de la récupération de l'arborescence: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Erreur interne du serveur'
+        }), 500
+
 @admin_bp.route('/api/documents', methods=['POST'])
 @admin_required
 def create_document():
@@ -305,8 +427,8 @@ def create_document():
         if result:
             document_info = result[0]
             
-            # Générer l'image QR code physique
-            qr_path = qr_generator.generate_document_qr(document_info['document_code'])
+            # Générer l'image QR code physique (en arrière-plan)
+            qr_path = qr_render_pipeline.submit(document_info['qr_identifier'], document_info['qr_payload'])
             
             return jsonify({
                 'success': True,
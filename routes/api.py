@@ -1,36 +1,99 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request, Response, current_app
 from database import db
+import queries
+from routes.decorators import admin_required
+from routes.utils import set_attachment
+from catalog_export import iter_catalog_ndjson, iter_gzip
+from label_sheets import LabelSheetLayout, fetch_labels, prepare, iter_pdf, render_page_png
+from zip_export import iter_export_documents, has_export_documents, iter_zip, export_filename
+from datetime import datetime
+import base64
 import logging
+import os
+import re
 
 logger = logging.getLogger(__name__)
 
 api_bp = Blueprint('api', __name__)
 
+# Pagination de /api/documents
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Recherche plein texte (/api/search)
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+# Doit correspondre à innodb_ft_min_token_size: les termes plus courts ne sont pas indexés
+SEARCH_MIN_TOKEN_SIZE = int(os.environ.get('SEARCH_MIN_TOKEN_SIZE', 3))
+
+def _encode_cursor(created_at, document_id):
+    """Encoder la position (created_at, id) du dernier document d'une page"""
+    raw = f"{created_at.isoformat()}|{document_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor):
+    """Décoder un curseur de pagination (ValueError s'il est invalide)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, document_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(document_id)
+    except Exception:
+        raise ValueError(f"Curseur invalide: {cursor}")
+
 @api_bp.route('/api/documents')
 def list_documents():
-    """API: Lister tous les documents enregistrés"""
+    """API: Lister les documents (pagination par curseur, filtres catégorie/sous-catégorie/année)"""
     try:
-        query = """
-        SELECT 
-            d.document_code,
-            d.filename,
-            d.year,
-            d.title,
-            c.name as category_name,
-            sc.name as subcategory_name,
-            q.qr_identifier
-        FROM documents d
-        JOIN subcategories sc ON d.subcategory_id = sc.id
-        JOIN categories c ON sc.category_id = c.id
-        LEFT JOIN qrcodes q ON d.id = q.document_id
-        ORDER BY d.created_at DESC
-        """
-        
-        documents = db.execute_query_safe(query)
+        try:
+            limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+            year = request.args.get('year', type=int)
+            cursor = request.args.get('cursor')
+            position = _decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        conditions = []
+        params = []
+        
+        if request.args.get('category'):
+            conditions.append("c.name = %s")
+            params.append(request.args['category'])
+        if request.args.get('subcategory'):
+            conditions.append("sc.name = %s")
+            params.append(request.args['subcategory'])
+        if year is not None:
+            conditions.append("d.year = %s")
+            params.append(year)
+        if position:
+            conditions.append(queries.DOCUMENT_PAGE_AFTER)
+            params.extend([position[0], position[0], position[1]])
+        
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        query = queries.DOCUMENT_PAGE.format(where=where)
+        params.append(limit + 1)
+        
+        documents = db.execute_query_safe(query, tuple(params)) or []
+        
+        # Une ligne de plus que la page indique qu'il reste des documents
+        has_more = len(documents) > limit
+        documents = documents[:limit]
+        next_cursor = None
+        if has_more:
+            next_cursor = _encode_cursor(documents[-1]['created_at'], documents[-1]['id'])
+        
+        for document in documents:
+            document.pop('id')
+            document.pop('created_at')
         
         return jsonify({
             'success': True,
-            'documents': documents or []
+            'documents': documents,
+            'next_cursor': next_cursor,
+            'has_more': has_more
         })
         
     except Exception as e:
@@ -39,3 +102,171 @@ def list_documents():
             'success': False,
             'error': 'Erreur interne du serveur'
         }), 500
+
+def _boolean_query(text):
+    """Construire une expression MATCH ... IN BOOLEAN MODE (tous les termes, en préfixe)"""
+    terms = [term for term in re.findall(r'\w+', text) if len(term) >= SEARCH_MIN_TOKEN_SIZE]
+    return ' '.join(f"+{term}*" for term in terms)
+
+def _like_prefix(text):
+    """Motif LIKE de recherche par préfixe (caractères spéciaux échappés)"""
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"{escaped}%"
+
+@api_bp.route('/api/search')
+def search_documents():
+    """API: Recherche plein texte dans les titres, descriptions, noms de fichier et codes"""
+    text = request.args.get('q', '').strip()
+    if not text:
+        return jsonify({
+            'success': False,
+            'error': 'Paramètre q requis'
+        }), 400
+    
+    try:
+        limit = min(max(int(request.args.get('limit', DEFAULT_SEARCH_LIMIT)), 1), MAX_SEARCH_LIMIT)
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'Paramètre limit invalide'
+        }), 400
+    
+    try:
+        # Codes de document commençant par la saisie (index unique), classés en tête
+        results = db.execute_query_safe(queries.SEARCH_BY_CODE, (_like_prefix(text), limit)) or []
+        for result in results:
+            result['score'] = None
+        
+        # Index FULLTEXT, classement par pertinence
+        boolean_query = _boolean_query(text)
+        if boolean_query and len(results) < limit:
+            seen = {result['document_code'] for result in results}
+            matches = db.execute_query_safe(
+                queries.SEARCH_FULLTEXT, (boolean_query, boolean_query, limit)
+            ) or []
+            for match in matches:
+                if match['document_code'] not in seen and len(results) < limit:
+                    match['score'] = round(float(match['score']), 4)
+                    results.append(match)
+        
+        return jsonify({
+            'success': True,
+            'query': text,
+            'results': results
+        })
+    
+    except Exception as e:
+        logger.error(f"Erreur lors de la recherche de documents: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Erreur interne du serveur'
+        }), 500
+
+@api_bp.route('/api/documents/export')
+@admin_required
+def export_documents():
+    """API: Exporter tout le catalogue en NDJSON, en flux (?gzip=1 pour compresser)"""
+    stream = iter_catalog_ndjson()
+    
+    if request.args.get('gzip', '').lower() in ('1', 'true'):
+        return Response(
+            iter_gzip(stream),
+            mimetype='application/gzip',
+            headers={'Content-Disposition': 'attachment; filename=documents.ndjson.gz'}
+        )
+    
+    return Response(
+        stream,
+        mimetype='application/x-ndjson',
+        headers={'Content-Disposition': 'attachment; filename=documents.ndjson'}
+    )
+
+@api_bp.route('/api/documents/export.zip')
+@admin_required
+def export_documents_zip():
+    """API: Archive ZIP en flux des PDF d'une sélection (?category=&subcategory=&year=)"""
+    category = request.args.get('category')
+    subcategory = request.args.get('subcategory')
+    year = request.args.get('year', type=int)
+    
+    if not (category or subcategory or year):
+        return jsonify({
+            'success': False,
+            'error': 'Préciser au moins une catégorie, une sous-catégorie ou une année'
+        }), 400
+    
+    try:
+        # Sélection vide: 404 plutôt qu'une archive vide
+        if not has_export_documents(category, subcategory, year):
+            return jsonify({
+                'success': False,
+                'error': 'Aucun document ne correspond à la sélection'
+            }), 404
+    except Exception as e:
+        logger.error(f"Erreur lors de la sélection des documents à exporter: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Erreur interne du serveur'
+        }), 500
+    
+    response = Response(
+        iter_zip(iter_export_documents(category, subcategory, year), current_app.config['ARCHIVES_FOLDER']),
+        mimetype='application/zip'
+    )
+    return set_attachment(response, export_filename(category, subcategory, year))
+
+@api_bp.route('/api/labels')
+@admin_required
+def generate_label_sheets():
+    """API: Planches d'étiquettes QR A4 (?category=&subcategory=&year=&ids=a,b&format=pdf|png&page=N)"""
+    ids = [i.strip() for i in request.args.get('ids', '').split(',') if i.strip()]
+    year = request.args.get('year', type=int)
+    output_format = request.args.get('format', 'pdf').lower()
+    
+    if output_format not in ('pdf', 'png'):
+        return jsonify({
+            'success': False,
+            'error': f'Format inconnu: {output_format}'
+        }), 400
+    
+    try:
+        labels = fetch_labels(request.args.get('category'), request.args.get('subcategory'), year, ids)
+    except Exception as e:
+        logger.error(f"Erreur lors de la sélection des étiquettes: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Erreur interne du serveur'
+        }), 500
+    
+    if not labels:
+        return jsonify({
+            'success': False,
+            'error': 'Aucun QR code ne correspond à la sélection'
+        }), 404
+    
+    layout = LabelSheetLayout()
+    total_pages = (len(labels) + layout.per_page - 1) // layout.per_page
+    
+    if output_format == 'pdf':
+        layout, pages = prepare(labels, layout)
+        return Response(
+            iter_pdf(pages, layout),
+            mimetype='application/pdf',
+            headers={'Content-Disposition': 'attachment; filename=etiquettes.pdf', 'X-Total-Pages': str(total_pages)}
+        )
+    
+    # PNG: une seule page, seules ses étiquettes sont encodées
+    page = request.args.get('page', 1, type=int)
+    if page < 1 or page > total_pages:
+        return jsonify({
+            'success': False,
+            'error': f'Page hors limites (1-{total_pages})'
+        }), 400
+    
+    start = (page - 1) * layout.per_page
+    layout, pages = prepare(labels[start:start + layout.per_page], layout)
+    return Response(
+        render_page_png(next(pages), layout),
+        mimetype='image/png',
+        headers={'X-Total-Pages': str(total_pages)}
+    )
@@ -1,13 +1,85 @@
-from flask import Blueprint, send_from_directory, current_app
+from flask import Blueprint, send_from_directory, send_file, current_app, abort, request
+from database import db
+import queries
+from qr_generator import qr_generator, QR_IMAGE_FORMATS
+from qr_image_cache import qr_image_cache
+from routes.utils import send_archive_file
+import io
+import os
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
 
 files_bp = Blueprint('files', __name__)
 
+def _negotiate_image_format(requested):
+    """Choisir le format servi selon l'en-tête Accept
+    
+    L'extension demandée est servie sauf si le client préfère strictement un autre format
+    (les navigateurs acceptant tous les formats d'image reçoivent le format de l'URL).
+    """
+    best, best_quality = requested, request.accept_mimetypes.quality(QR_IMAGE_FORMATS[requested])
+    for image_format, mimetype in QR_IMAGE_FORMATS.items():
+        quality = request.accept_mimetypes.quality(mimetype)
+        if quality > best_quality:
+            best, best_quality = image_format, quality
+    return best
+
 @files_bp.route('/qr_images/<filename>')
 def serve_qr_image(filename):
-    """Servir les images de QR codes générées"""
-    return send_from_directory(current_app.config['QR_IMAGES_FOLDER'], filename)
+    """Servir les images de QR codes (PNG 1 bit ou SVG, négociés par l'en-tête Accept)
+    
+    Les images sont lues dans le stockage réparti via qrcodes.qr_payload et gardées en cache LRU.
+    """
+    folder = current_app.config['QR_IMAGES_FOLDER']
+    identifier, extension = os.path.splitext(filename)
+    requested = extension[1:].lower()
+    if requested not in QR_IMAGE_FORMATS:
+        return send_from_directory(folder, filename)
+    
+    image_format = _negotiate_image_format(requested)
+    served_name = f"{identifier}.{image_format}"
+    
+    data = qr_image_cache.get(served_name)
+    if data is None:
+        result = db.execute_query_safe(queries.QR_PAYLOAD, (identifier,))
+        if not result:
+            abort(404)
+        payload = result[0]['qr_payload']
+        
+        # Stockage réparti (ou ancien emplacement à plat avant migration), sinon rendu à la demande
+        data = qr_generator.store.read(payload, image_format, identifier)
+        if data is None:
+            try:
+                data = qr_generator.render_bytes(payload, image_format)
+            except Exception as e:
+                logger.error(f"Erreur génération QR code {identifier}: {e}")
+                abort(500)
+        qr_image_cache.put(served_name, data)
+    
+    response = send_file(
+        io.BytesIO(data),
+        mimetype=QR_IMAGE_FORMATS[image_format],
+        download_name=served_name,
+        etag=hashlib.sha1(data).hexdigest()
+    )
+    
+    # Le contenu dépend de l'en-tête Accept: les caches intermédiaires doivent le distinguer
+    response.vary.add('Accept')
+    return response
 
 @files_bp.route('/archives/<path:filename>')
 def serve_archive_document(filename):
     """Servir les documents PDF depuis le dossier Archives"""
-    return send_from_directory(current_app.config['ARCHIVES_FOLDER'], filename)
+    file_path = f"{current_app.config['ARCHIVES_FOLDER'].rstrip('/')}/{filename}"
+    result = db.execute_query_safe(queries.DOCUMENT_CONTENT_BY_PATH, (file_path,))
+    if not result:
+        return send_archive_file(file_path)
+    document = result[0]
+    return send_archive_file(
+        file_path,
+        content_hash=document['content_hash'],
+        file_size=document['file_size'],
+        file_mtime=document['file_mtime']
+    )
@@ -0,0 +1,61 @@
+from flask import Blueprint, Response, request, g, abort
+from database import db
+from resolve_cache import resolve_cache
+from qr_image_cache import qr_image_cache
+from metrics import registry, http_request_seconds
+import os
+import hmac
+import time
+
+metrics_bp = Blueprint('metrics', __name__)
+
+# Jeton optionnel exigé par /metrics (en-tête Authorization: Bearer <jeton>)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+@metrics_bp.before_app_request
+def start_timer():
+    """Horodater le début de chaque requête de l'application"""
+    g.metrics_start = time.perf_counter()
+
+@metrics_bp.after_app_request
+def observe_request(response):
+    """Durée de la requête par route (blueprint.fonction), méthode et statut
+    
+    Les réponses en flux (exports, étiquettes, SSE) sont mesurées à la fermeture du flux,
+    une fois le corps envoyé, et non au retour de la vue.
+    """
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return response
+    
+    labels = (request.endpoint or 'unmatched', request.method, str(response.status_code))
+    if response.is_streamed:
+        response.call_on_close(lambda: http_request_seconds.observe(time.perf_counter() - start, labels))
+    else:
+        http_request_seconds.observe(time.perf_counter() - start, labels)
+    return response
+
+def _pool_gauges():
+    """Connexions du pool MySQL par état"""
+    stats = db.pool_stats()
+    return {(state,): stats[state] for state in ('size', 'created', 'in_use', 'idle', 'waiting')}
+
+def _cache_gauges():
+    """Entrées, succès et échecs des caches de l'application"""
+    values = {}
+    for name, stats in (('resolve', resolve_cache.stats()), ('qr_image', qr_image_cache.stats())):
+        for key in ('entries', 'hits', 'misses', 'evictions'):
+            values[(name, key)] = stats[key]
+    return values
+
+registry.gauge('db_pool_connections', "Connexions du pool MySQL par état", ('state',), _pool_gauges)
+registry.gauge('cache', "Statistiques des caches (entrées, succès, échecs, évictions)", ('cache', 'stat'), _cache_gauges)
+
+@metrics_bp.route('/metrics')
+def metrics():
+    """Métriques au format texte Prometheus (protégées par METRICS_TOKEN s'il est défini)"""
+    if METRICS_TOKEN:
+        authorization = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(authorization.encode(), f"Bearer {METRICS_TOKEN}".encode()):
+            abort(401)
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
@@ -1,5 +1,10 @@
-from flask import Blueprint, render_template, request, jsonify, current_app
+from flask import Blueprint, render_template, request, jsonify, current_app, make_response
 from database import db
+import queries
+from resolve_cache import resolve_cache
+from routes.utils import send_archive_file
+from werkzeug.exceptions import HTTPException
+import os
 import logging
 
 logger = logging.getLogger(__name__)
@@ -10,23 +15,30 @@ qr_bp = Blueprint('qr', __name__)
 def resolve_qr(identifier):
     """Résoudre un QR code hiérarchique (catégorie, sous-catégorie ou document)"""
     try:
+        # 0. Résolution déjà en cache pour ce format de réponse
+        content_type = 'json' if request.headers.get('Accept', '').startswith('application/json') else 'html'
+        cached = resolve_cache.get(identifier, content_type)
+        if cached is not None:
+            body, mimetype = cached
+            return current_app.response_class(body, mimetype=mimetype)
+        
         # 1. Chercher dans les documents
         if not identifier.startswith('CAT-') and not identifier.startswith('SUBCAT-'):
             document_result = _resolve_document_qr(identifier)
             if document_result:
-                return document_result
+                return _cache_response(identifier, content_type, document_result)
         
         # 2. Chercher dans les sous-catégories
         if identifier.startswith('SUBCAT-'):
             subcategory_result = _resolve_subcategory_qr(identifier)
             if subcategory_result:
-                return subcategory_result
+                return _cache_response(identifier, content_type, subcategory_result)
         
         # 3. Chercher dans les catégories
         if identifier.startswith('CAT-'):
             category_result = _resolve_category_qr(identifier)
             if category_result:
-                return category_result
+                return _cache_response(identifier, content_type, category_result)
         
         return jsonify({
             'success': False,
@@ -40,27 +52,16 @@ def resolve_qr(identifier):
             'error': 'Erreur interne du serveur'
         }), 500
 
+def _cache_response(identifier, content_type, result):
+    """Mettre en cache le corps d'une résolution réussie"""
+    response = make_response(result)
+    resolve_cache.put(identifier, content_type, (response.get_data(), response.mimetype))
+    return response
+
 def _resolve_document_qr(identifier):
     """Résoudre un QR code de document"""
     try:
-        query = """
-        SELECT 
-            d.document_code,
-            d.filename,
-            d.file_path,
-            d.year,
-            d.title,
-            d.description,
-            c.name as category_name,
-            sc.name as subcategory_name,
-            q.qr_payload,
-            'DOCUMENT' as type
-        FROM documents d
-        JOIN subcategories sc ON d.subcategory_id = sc.id
-        JOIN categories c ON sc.category_id = c.id
-        JOIN qrcodes q ON d.id = q.document_id
-        WHERE q.qr_identifier = %s AND q.qr_type = 'DOCUMENT'
-        """
+        query = queries.RESOLVE_DOCUMENT
         
         result = db.execute_query_safe(query, (identifier,))
         
@@ -83,23 +84,7 @@ def _resolve_document_qr(identifier):
 def _resolve_subcategory_qr(identifier):
     """Résoudre un QR code de sous-catégorie"""
     try:
-        query = """
-        SELECT 
-            q.qr_identifier,
-            c.name as category_name,
-            sc.name as subcategory_name,
-            sc.description,
-            q.folder_path,
-            q.qr_payload,
-            'SUBCATEGORY' as type,
-            COUNT(d.id) as document_count
-        FROM qrcodes q
-        JOIN subcategories sc ON q.subcategory_id = sc.id
-        JOIN categories c ON sc.category_id = c.id
-        LEFT JOIN documents d ON sc.id = d.subcategory_id
-        WHERE q.qr_identifier = %s AND q.qr_type = 'SUBCATEGORY'
-        GROUP BY q.id, c.name, sc.name, sc.description, q.folder_path, q.qr_payload
-        """
+        query = queries.RESOLVE_SUBCATEGORY
         
         result = db.execute_query_safe(query, (identifier,))
         
@@ -107,18 +92,7 @@ def _resolve_subcategory_qr(identifier):
             subcategory = result[0]
             
             # Récupérer la liste des documents dans cette sous-catégorie
-            docs_query = """
-            SELECT d.document_code, d.filename, d.title, q.qr_identifier
-            FROM documents d
-            JOIN qrcodes q ON d.id = q.document_id
-            JOIN subcategories sc ON d.subcategory_id = sc.id
-            WHERE sc.name = %s AND sc.category_id = (
-                SELECT category_id FROM subcategories WHERE id = (
-                    SELECT subcategory_id FROM qrcodes WHERE qr_identifier = %s
-                )
-            )
-            ORDER BY d.created_at DESC
-            """
+            docs_query = queries.SUBCATEGORY_DOCUMENTS
             
             documents = db.execute_query_safe(docs_query, (subcategory['subcategory_name'], identifier))
             subcategory['documents'] = documents or []
@@ -140,23 +114,7 @@ def _resolve_subcategory_qr(identifier):
 def _resolve_category_qr(identifier):
     """Résoudre un QR code de catégorie"""
     try:
-        query = """
-        SELECT 
-            q.qr_identifier,
-            c.name as category_name,
-            c.description,
-            q.folder_path,
-            q.qr_payload,
-            'CATEGORY' as type,
-            COUNT(DISTINCT sc.id) as subcategory_count,
-            COUNT(DISTINCT d.id) as document_count
-        FROM qrcodes q
-        JOIN categories c ON q.category_id = c.id
-        LEFT JOIN subcategories sc ON c.id = sc.category_id
-        LEFT JOIN documents d ON sc.id = d.subcategory_id
-        WHERE q.qr_identifier = %s AND q.qr_type = 'CATEGORY'
-        GROUP BY q.id, c.name, c.description, q.folder_path, q.qr_payload
-        """
+        query = queries.RESOLVE_CATEGORY
         
         result = db.execute_query_safe(query, (identifier,))
         
@@ -164,21 +122,7 @@ def _resolve_category_qr(identifier):
             category = result[0]
             
             # Récupérer les sous-catégories
-            subcat_query = """
-            SELECT 
-                sc.name as subcategory_name,
-                sc.description,
-                q.qr_identifier,
-                COUNT(d.id) as document_count
-            FROM subcategories sc
-            LEFT JOIN qrcodes q ON sc.id = q.subcategory_id AND q.qr_type = 'SUBCATEGORY'
-            LEFT JOIN documents d ON sc.id = d.subcategory_id
-            WHERE sc.category_id = (
-                SELECT category_id FROM qrcodes WHERE qr_identifier = %s
-            )
-            GROUP BY sc.id, sc.name, sc.description, q.qr_identifier
-            ORDER BY sc.name
-            """
+            subcat_query = queries.CATEGORY_SUBCATEGORIES_BY_QR
             
             subcategories = db.execute_query_safe(subcat_query, (identifier,))
             category['subcategories'] = subcategories or []
@@ -201,29 +145,23 @@ def _resolve_category_qr(identifier):
 def download_document(identifier):
     """Télécharger directement un document via son identifiant QR"""
     try:
-        query = """
-        SELECT 
-            d.filename,
-            d.file_path
-        FROM documents d
-        JOIN qrcodes q ON d.id = q.document_id
-        WHERE q.qr_identifier = %s
-        """
+        query = queries.DOWNLOAD_DOCUMENT
         
         result = db.execute_query_safe(query, (identifier,))
         
         if result:
             document = result[0]
-            file_path = document['file_path']
-            filename = document['filename']
             
             # Vérifier si le fichier existe
-            import os
-            full_path = os.path.join(os.getcwd(), file_path)
-            if os.path.exists(full_path):
-                directory = os.path.dirname(file_path)
-                from flask import send_from_directory
-                return send_from_directory(directory, filename, as_attachment=True)
+            if os.path.isfile(document['file_path']):
+                return send_archive_file(
+                    document['file_path'],
+                    download_name=document['filename'],
+                    as_attachment=True,
+                    content_hash=document['content_hash'],
+                    file_size=document['file_size'],
+                    file_mtime=document['file_mtime']
+                )
             else:
                 return jsonify({
                     'success': False,
@@ -235,6 +173,9 @@ def download_document(identifier):
             'error': 'Document non trouvé'
         }), 404
         
+    except HTTPException:
+        # 404 hors d'Archives/, 416 sur une plage invalide
+        raise
     except Exception as e:
         logger.error(f"Erreur lors du téléchargement du document {identifier}: {e}")
         return jsonify({
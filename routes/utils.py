@@ -1,9 +1,23 @@
+import os
 import hashlib
 import logging
+import unicodedata
+from urllib.parse import quote
+from flask import current_app, request, abort
+from werkzeug.utils import send_file
 from database import db
+from sequence_allocator import sequence_allocator
+from qr_generator import qr_generator
+from resolve_cache import resolve_cache
+from counters import increment_documents, increment_subcategories
 
 logger = logging.getLogger(__name__)
 
+# Envoi des documents: 'none' (par Python), 'x-sendfile' (Apache, lighttpd) ou 'x-accel' (nginx)
+DOWNLOAD_OFFLOAD = os.environ.get('DOWNLOAD_OFFLOAD', 'none').lower()
+# Location interne nginx pointant sur ARCHIVES_FOLDER (mode x-accel)
+DOWNLOAD_ACCEL_PREFIX = os.environ.get('DOWNLOAD_ACCEL_PREFIX', '/protected-archives')
+
 def hash_password(password):
     """Hasher un mot de passe avec SHA256"""
     return hashlib.sha256(password.encode()).hexdigest()
@@ -31,7 +45,9 @@ def get_or_create_subcategory(category_id, name):
         
         # Créer la sous-catégorie
         db.execute_query("INSERT INTO subcategories (category_id, name) VALUES (%s, %s)", (category_id, name))
-        return db.execute_query("SELECT LAST_INSERT_ID() as id")[0]['id']
+        subcategory_id = db.execute_query("SELECT LAST_INSERT_ID() as id")[0]['id']
+        increment_subcategories(category_id)
+        return subcategory_id
     except Exception as e:
         logger.error(f"Erreur lors de la création/récupération de la sous-catégorie {name}: {e}")
         raise
@@ -39,19 +55,8 @@ def get_or_create_subcategory(category_id, name):
 def get_next_sequence(subcategory_id, year):
     """Obtenir le prochain numéro de séquence pour une sous-catégorie/année"""
     try:
-        result = db.execute_query_safe("SELECT current_sequence FROM sequences WHERE subcategory_id = %s AND year = %s", (subcategory_id, year))
-        
-        if result:
-            # Incrémenter la séquence existante
-            new_sequence = result[0]['current_sequence'] + 1
-            db.execute_query("UPDATE sequences SET current_sequence = %s WHERE subcategory_id = %s AND year = %s", 
-                            (new_sequence, subcategory_id, year))
-            return new_sequence
-        else:
-            # Créer une nouvelle séquence
-            db.execute_query("INSERT INTO sequences (subcategory_id, year, current_sequence) VALUES (%s, %s, 1)", 
-                            (subcategory_id, year))
-            return 1
+        # Incrément atomique en base (aucun doublon entre requêtes concurrentes)
+        return sequence_allocator.next(subcategory_id, year)
     except Exception as e:
         logger.error(f"Erreur lors de la gestion de la séquence pour subcategory_id={subcategory_id}, year={year}: {e}")
         raise
@@ -83,17 +88,19 @@ def create_document_simple(category_name, subcategory_name, filename, year, titl
         
         # 7. Récupérer l'ID du document créé
         document_id = db.execute_query("SELECT LAST_INSERT_ID() as id")[0]['id']
+        increment_documents(subcategory_id)
         
         # 8. Créer le QR code en base
         qr_identifier = document_code
         qr_payload = f"{base_url}/qr/{qr_identifier}"
-        qr_image_path = f"qr_images/{qr_identifier}.png"
+        qr_image_path = qr_generator.image_column(qr_payload)
         
         qr_query = """
         INSERT INTO qrcodes (qr_type, qr_identifier, qr_payload, document_id, qr_image_path)
         VALUES (%s, %s, %s, %s, %s)
         """
         db.execute_query(qr_query, ('DOCUMENT', qr_identifier, qr_payload, document_id, qr_image_path))
+        resolve_cache.invalidate_document(document_code, category_name, subcategory_name)
         
         # 9. Retourner les informations
         return [{
@@ -105,3 +112,74 @@ def create_document_simple(category_name, subcategory_name, filename, year, titl
     except Exception as e:
         logger.error(f"Erreur création document: {e}")
         return None
+
+def set_attachment(response, filename):
+    """En-tête Content-Disposition d'un téléchargement, comme download_name de send_file
+    
+    Nom entre guillemets si nécessaire, et variante filename* UTF-8 pour les noms non ASCII
+    (noms de catégories et sous-catégories issus des dossiers).
+    """
+    try:
+        filename.encode('ascii')
+        options = {'filename': filename}
+    except UnicodeEncodeError:
+        ascii_name = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        options = {'filename': ascii_name, 'filename*': f"UTF-8''{quote(filename, safe='!#$&+^`|~')}"}
+    response.headers.set('Content-Disposition', 'attachment', **options)
+    return response
+
+def _signature_matches(full_path, file_size, file_mtime):
+    """Taille et mtime (ns) enregistrés avec l'empreinte identiques à ceux du fichier"""
+    try:
+        st = os.stat(full_path)
+    except OSError:
+        return False
+    return (st.st_size, st.st_mtime_ns) == (file_size, file_mtime)
+
+def send_archive_file(file_path, download_name=None, as_attachment=False, content_hash=None,
+                      file_size=None, file_mtime=None):
+    """Envoyer un document d'Archives/ (plages d'octets, ETag/Last-Modified, délégation au serveur frontal)
+    
+    `file_path` est le chemin tel qu'enregistré dans documents.file_path. L'empreinte de contenu
+    sert d'ETag fort seulement si la taille et le mtime enregistrés avec elle sont ceux du fichier:
+    un fichier réécrit sur place depuis le dernier calcul reçoit l'ETag dérivé de son stat.
+    """
+    archives_root = os.path.realpath(current_app.config['ARCHIVES_FOLDER'])
+    full_path = os.path.realpath(file_path)
+    if not full_path.startswith(archives_root + os.sep) or not os.path.isfile(full_path):
+        abort(404)
+    
+    if content_hash and not _signature_matches(full_path, file_size, file_mtime):
+        content_hash = None
+    
+    offload = DOWNLOAD_OFFLOAD in ('x-sendfile', 'x-accel')
+    response = send_file(
+        full_path,
+        request.environ,
+        as_attachment=as_attachment,
+        download_name=download_name or os.path.basename(full_path),
+        etag=content_hash or True,
+        # Délégation: le serveur frontal traite les plages et lit le fichier
+        conditional=not offload,
+        use_x_sendfile=offload,
+        response_class=current_app.response_class,
+        _root_path=current_app.root_path
+    )
+    
+    if offload:
+        # Corps vide: Werkzeug ne doit pas annoncer Content-Length: 0 au serveur frontal
+        response.automatically_set_content_length = False
+        if DOWNLOAD_OFFLOAD == 'x-accel':
+            relative = os.path.relpath(full_path, archives_root).replace(os.sep, '/')
+            response.headers.pop('X-Sendfile', None)
+            response.headers['X-Accel-Redirect'] = f"{DOWNLOAD_ACCEL_PREFIX.rstrip('/')}/{quote(relative)}"
+            response.headers['Accept-Ranges'] = 'bytes'
+        
+        # Revalidation (304) traitée ici, sans solliciter le serveur frontal
+        response = response.make_conditional(request)
+        response.headers.pop('Content-Length', None)
+        if response.status_code == 304:
+            response.headers.pop('X-Sendfile', None)
+            response.headers.pop('X-Accel-Redirect', None)
+    
+    return response
@@ -0,0 +1,278 @@
+"""
+Tâches de scan de la structure Archives/ exécutées en arrière-plan, avec suivi de progression
+"""
+
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from database import db
+from dotenv import load_dotenv
+
+# Charger les variables d'environnement
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Délai au-delà duquel une tâche en cours d'un autre worker, non rafraîchie, est considérée interrompue
+SCAN_JOB_STALE_AFTER = float(os.environ.get('SCAN_JOB_STALE_AFTER', 60))
+
+class ScanAlreadyRunningError(Exception):
+    """Un scan de la même arborescence est déjà en cours"""
+
+class ScanLock:
+    """Verrou MySQL nommé (GET_LOCK) empêchant deux scans simultanés d'une même arborescence"""
+    
+    def __init__(self, archives_path):
+        """Initialiser le verrou pour le dossier d'archives donné"""
+        resolved = str(Path(archives_path).resolve())
+        # Les noms de verrou MySQL sont limités à 64 caractères
+        self.name = f"scan-{hashlib.sha1(resolved.encode()).hexdigest()}"
+        self._connection = None
+    
+    def acquire(self):
+        """Prendre le verrou sans attendre (ScanAlreadyRunningError s'il est déjà pris)"""
+        connection = db.pool.acquire()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT GET_LOCK(%s, 0)", (self.name,))
+            acquired = cursor.fetchone()[0] == 1
+            cursor.close()
+        except Exception:
+            db.pool.discard(connection)
+            raise
+        
+        if not acquired:
+            db.pool.release(connection)
+            raise ScanAlreadyRunningError("Un scan de cette arborescence est déjà en cours")
+        
+        # Le verrou vit avec la session: la connexion est conservée jusqu'à release()
+        self._connection = connection
+        return self
+    
+    def release(self):
+        """Libérer le verrou et rendre sa connexion au pool"""
+        connection, self._connection = self._connection, None
+        if connection is None:
+            return
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (self.name,))
+            cursor.fetchone()
+            cursor.close()
+            db.pool.release(connection)
+        except Exception as e:
+            logger.warning(f"Erreur lors de la libération du verrou de scan: {e}")
+            db.pool.discard(connection)
+    
+    def __enter__(self):
+        return self.acquire()
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+class ScanJob:
+    def __init__(self, incremental=False, bulk=False):
+        """Initialiser une tâche de scan en attente"""
+        self.id = uuid.uuid4().hex
+        self.mode = 'incremental' if incremental else 'full'
+        self.bulk = bulk
+        self.status = 'queued'
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.scanner = None
+        self.lock = None
+        # Progression enregistrée (tâche exécutée par un autre worker)
+        self.progress = None
+    
+    @classmethod
+    def from_row(cls, row):
+        """Tâche lue dans scan_jobs (exécutée par un autre worker)
+        
+        Une tâche en cours dont l'état n'est plus rafraîchi (worker arrêté pendant le scan)
+        est signalée en échec.
+        """
+        job = cls(incremental=row['mode'] == 'incremental', bulk=bool(row['bulk']))
+        job.id = row['id']
+        job.status = row['status']
+        job.error = row['error']
+        job.created_at = row['created_at']
+        job.started_at = row['started_at']
+        job.finished_at = row['finished_at']
+        job.progress = json.loads(row['progress']) if row['progress'] else None
+        
+        if not job.finished and time.time() - row['updated_at'] > SCAN_JOB_STALE_AFTER:
+            job.status = 'failed'
+            job.error = "Tâche interrompue (état non rafraîchi par son worker)"
+            job.finished_at = row['updated_at']
+        return job
+    
+    @property
+    def finished(self):
+        """La tâche est terminée (succès ou échec)"""
+        return self.status in ('succeeded', 'failed')
+    
+    def to_dict(self):
+        """Représentation JSON de la tâche et de sa progression"""
+        end = self.finished_at or time.time()
+        return {
+            'job_id': self.id,
+            'mode': self.mode,
+            'bulk': self.bulk,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'elapsed': round(end - self.started_at, 3) if self.started_at else 0.0,
+            'progress': self.scanner.progress_snapshot() if self.scanner else self.progress
+        }
+
+class ScanJobManager:
+    def __init__(self, max_history=None, persist_interval=None):
+        """Initialiser le gestionnaire (nombre de tâches terminées conservées)
+        
+        Les tâches sont exécutées par le worker qui les reçoit et leur état est recopié dans
+        la table scan_jobs: les autres workers de l'application peuvent ainsi les suivre.
+        """
+        self.max_history = max_history or int(os.environ.get('SCAN_JOB_HISTORY', 20))
+        self.persist_interval = persist_interval or float(os.environ.get('SCAN_JOB_PERSIST_INTERVAL', 2))
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def submit(self, incremental=False, bulk=False):
+        """Lancer un scan en arrière-plan et retourner la tâche immédiatement"""
+        archives_path = os.environ.get('ARCHIVES_FOLDER', 'Archives')
+        
+        with self._lock:
+            if any(not job.finished for job in self._jobs.values()):
+                raise ScanAlreadyRunningError("Un scan de cette arborescence est déjà en cours")
+            
+            # Verrou partagé entre processus (workers, ligne de commande)
+            job = ScanJob(incremental=incremental, bulk=bulk)
+            job.lock = ScanLock(archives_path).acquire()
+            
+            self._jobs[job.id] = job
+            self._prune()
+        
+        self._save(job)
+        thread = threading.Thread(target=self._run, args=(job,), name=f"scan-{job.id[:8]}", daemon=True)
+        thread.start()
+        logger.info(f"Tâche de scan {job.id} lancée ({job.mode}{', bulk' if bulk else ''})")
+        return job
+    
+    def get(self, job_id):
+        """Récupérer une tâche par son identifiant, de ce worker ou d'un autre (None si inconnue)"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        
+        rows = db.execute_query_safe("SELECT * FROM scan_jobs WHERE id = %s", (job_id,))
+        return ScanJob.from_row(rows[0]) if rows else None
+    
+    def list(self):
+        """Toutes les tâches connues, de la plus récente à la plus ancienne"""
+        rows = db.execute_query_safe(
+            "SELECT * FROM scan_jobs ORDER BY created_at DESC LIMIT %s", (self.max_history + 1,)
+        )
+        with self._lock:
+            # Les tâches de ce worker sont lues en direct plutôt que dans la table
+            jobs = {job.id: job for job in (ScanJob.from_row(row) for row in rows)}
+            jobs.update(self._jobs)
+        return sorted(jobs.values(), key=lambda job: job.created_at, reverse=True)
+    
+    def _prune(self):
+        """Oublier les tâches terminées les plus anciennes au-delà de l'historique"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(len(finished) - self.max_history, 0)]:
+            del self._jobs[job_id]
+    
+    def _save(self, job, status=None):
+        """Recopier l'état d'une tâche dans scan_jobs (sans jamais interrompre le scan)"""
+        state = job.to_dict()
+        try:
+            db.execute_query("""
+            INSERT INTO scan_jobs (id, mode, bulk, status, error, created_at, started_at, finished_at, updated_at, progress)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE status = VALUES(status), error = VALUES(error), started_at = VALUES(started_at),
+                finished_at = VALUES(finished_at), updated_at = VALUES(updated_at), progress = VALUES(progress)
+            """, (
+                job.id, job.mode, job.bulk, status or job.status, job.error, job.created_at,
+                job.started_at, job.finished_at, time.time(),
+                json.dumps(state['progress']) if state['progress'] is not None else None
+            ))
+            return True
+        except Exception as e:
+            logger.warning(f"État de la tâche de scan {job.id} non enregistré: {e}")
+            return False
+    
+    def _persist_progress(self, job, stop):
+        """Rafraîchir périodiquement l'état de la tâche en cours dans scan_jobs"""
+        try:
+            while not stop.wait(self.persist_interval):
+                self._save(job)
+        finally:
+            db.release_connection()
+    
+    def _delete_old_jobs(self):
+        """Supprimer de scan_jobs les tâches terminées au-delà de l'historique"""
+        rows = db.execute_query_safe("""
+        SELECT created_at FROM scan_jobs WHERE status IN ('succeeded', 'failed')
+        ORDER BY created_at DESC LIMIT 1 OFFSET %s
+        """, (self.max_history,))
+        if rows:
+            db.execute_query_safe(
+                "DELETE FROM scan_jobs WHERE status IN ('succeeded', 'failed') AND created_at <= %s",
+                (rows[0]['created_at'],)
+            )
+    
+    def _run(self, job):
+        """Exécuter le scan dans le thread de la tâche"""
+        from archive_scanner import ArchiveScanner
+        
+        job.status = 'running'
+        job.started_at = time.time()
+        stop = threading.Event()
+        publisher = threading.Thread(
+            target=self._persist_progress, args=(job, stop), name=f"scan-{job.id[:8]}-state", daemon=True
+        )
+        publisher.start()
+        
+        status, error = 'failed', None
+        try:
+            job.scanner = ArchiveScanner(bulk=job.bulk)
+            if job.mode == 'incremental':
+                success = job.scanner.scan_incremental()
+            else:
+                success = job.scanner.scan_and_register_all()
+            
+            status = 'succeeded' if success else 'failed'
+            if not success:
+                error = 'Erreur lors du scan de la structure'
+        except Exception as e:
+            logger.error(f"Erreur lors de la tâche de scan {job.id}: {e}")
+            error = str(e)
+        finally:
+            stop.set()
+            publisher.join()
+            
+            # Verrou libéré avant d'annoncer la fin: un nouveau scan peut être lancé dès "terminé"
+            job.lock.release()
+            job.error = error
+            job.finished_at = time.time()
+            self._save(job, status)
+            self._delete_old_jobs()
+            db.release_connection()
+            job.status = status
+            logger.info(f"Tâche de scan {job.id} terminée: {job.status} ({job.finished_at - job.started_at:.1f}s)")
+
+# Instance globale du gestionnaire de tâches de scan
+scan_job_manager = ScanJobManager()
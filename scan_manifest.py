@@ -0,0 +1,154 @@
+"""
+Manifeste persistant de la structure Archives/ pour les scans incrémentaux
+"""
+
+import os
+import json
+import logging
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Charger les variables d'environnement
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+class ScanManifest:
+    VERSION = 1
+    
+    def __init__(self, manifest_path=None):
+        """Initialiser le manifeste (mtime des dossiers, taille/mtime/inode des fichiers)"""
+        self.manifest_path = manifest_path or os.environ.get('SCAN_MANIFEST_FILE', 'scan_manifest.json')
+        self.directories = {}
+    
+    def load(self):
+        """Charger le manifeste du scan précédent (vide s'il n'existe pas)"""
+        self.directories = {}
+        if not os.path.exists(self.manifest_path):
+            logger.info(f"Aucun manifeste {self.manifest_path} - scan complet de l'arborescence")
+            return self
+        
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == self.VERSION:
+                self.directories = data.get('directories', {})
+            else:
+                logger.warning(f"Version de manifeste inconnue dans {self.manifest_path} - ignoré")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Manifeste {self.manifest_path} illisible ({e}) - scan complet")
+        
+        return self
+    
+    def save(self):
+        """Écrire le manifeste de façon atomique"""
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.VERSION, 'directories': self.directories}, f, separators=(',', ':'))
+        os.replace(tmp_path, self.manifest_path)
+        logger.info(f"Manifeste enregistré: {self.manifest_path} ({len(self.directories)} dossiers)")
+    
+    @staticmethod
+    def key(path):
+        """Clé d'un chemin dans le manifeste (même forme que documents.file_path)"""
+        return str(path).replace('\\', '/')
+    
+    def diff(self, root):
+        """Comparer l'arborescence au manifeste en ne listant que les dossiers dont le mtime a changé
+        
+        Retourne le nouvel état des dossiers et les changements détectés. Dans un dossier relisté,
+        un fichier conservé dont la taille, le mtime ou l'inode a changé (remplacé sous le même
+        nom) est signalé dans modified_files.
+        """
+        previous = self.directories
+        current = {}
+        changes = {
+            'new_dirs': [],
+            'new_files': [],
+            'modified_files': [],
+            'deleted_files': [],
+            'listed_dirs': 0,
+            'skipped_dirs': 0
+        }
+        
+        stack = [Path(root)]
+        while stack:
+            directory = stack.pop()
+            dir_key = self.key(directory)
+            
+            try:
+                mtime = directory.stat().st_mtime_ns
+            except FileNotFoundError:
+                continue
+            
+            before = previous.get(dir_key)
+            if before and before['mtime'] == mtime:
+                # Aucun ajout/suppression/renommage direct dans ce dossier
+                entry = before
+                changes['skipped_dirs'] += 1
+            else:
+                entry = self._list_directory(directory, mtime)
+                changes['listed_dirs'] += 1
+                
+                if before is None:
+                    changes['new_dirs'].append(directory)
+                
+                old_files = before['files'] if before else {}
+                for name, signature in entry['files'].items():
+                    if name not in old_files:
+                        changes['new_files'].append(directory / name)
+                    elif old_files[name] != signature:
+                        changes['modified_files'].append(directory / name)
+                for name in old_files:
+                    if name not in entry['files']:
+                        changes['deleted_files'].append(f"{dir_key}/{name}")
+            
+            current[dir_key] = entry
+            for name in entry['subdirs']:
+                stack.append(directory / name)
+        
+        # Dossiers disparus (supprimés ou renommés): tous leurs fichiers sont retirés
+        for dir_key, entry in previous.items():
+            if dir_key not in current:
+                changes['deleted_files'].extend(f"{dir_key}/{name}" for name in entry['files'])
+        
+        return current, changes
+    
+    def _list_directory(self, directory, mtime):
+        """Lister un dossier: sous-dossiers et PDF avec taille/mtime/inode"""
+        entry = {'mtime': mtime, 'subdirs': [], 'files': {}}
+        
+        with os.scandir(directory) as it:
+            for item in it:
+                try:
+                    if item.is_dir(follow_symlinks=False):
+                        entry['subdirs'].append(item.name)
+                    elif item.is_file() and item.name.lower().endswith('.pdf'):
+                        st = item.stat()
+                        entry['files'][item.name] = [st.st_size, st.st_mtime_ns, st.st_ino]
+                except OSError as e:
+                    logger.warning(f"Entrée illisible {item.path}: {e}")
+        
+        entry['subdirs'].sort()
+        return entry
+    
+    def forget_file(self, directories, file_path):
+        """Retirer un fichier de l'état pour qu'il soit retraité au prochain scan"""
+        file_path = Path(file_path)
+        entry = directories.get(self.key(file_path.parent))
+        if entry:
+            entry['files'].pop(file_path.name, None)
+            # Forcer le relistage du dossier au prochain scan
+            entry['mtime'] = None
+
+    def forget_directory(self, directories, directory):
+        """Retirer un dossier de l'état pour qu'il soit retraité comme nouveau au prochain scan"""
+        directories.pop(self.key(directory), None)
+    
+    def mark_modified(self, directories, file_path):
+        """Garder un fichier connu mais le signaler modifié au prochain scan (empreinte à recalculer)"""
+        file_path = Path(file_path)
+        entry = directories.get(self.key(file_path.parent))
+        if entry and file_path.name in entry['files']:
+            entry['files'][file_path.name] = None
+            entry['mtime'] = None
@@ -0,0 +1,142 @@
+"""
+Allocation atomique des numéros de séquence des documents (par sous-catégorie et année)
+"""
+
+import os
+import time
+import logging
+import argparse
+import threading
+from database import db
+import queries
+from dotenv import load_dotenv
+
+# Charger les variables d'environnement
+load_dotenv()
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class SequenceAllocator:
+    def __init__(self, block_size=None):
+        """Initialiser l'allocateur (taille des blocs réservés en base)"""
+        self.block_size = block_size or int(os.environ.get('SEQUENCE_BLOCK_SIZE', 1))
+        self._blocks = {}
+        # Un verrou par (sous-catégorie, année): la réservation d'un bloc en base ne bloque que ce couple
+        self._key_locks = {}
+        self._lock = threading.Lock()
+    
+    def reserve(self, subcategory_id, year, count=1):
+        """Réserver atomiquement `count` numéros consécutifs et retourner le premier
+        
+        Une seule requête UPDATE ... LAST_INSERT_ID(current_sequence + n): le
+        verrou de ligne InnoDB garantit qu'aucun autre écrivain n'obtient la même plage.
+        """
+        query = queries.SEQUENCE_RESERVE
+        rowcount, last_id = db.execute_with_last_id(query, (count, subcategory_id, year))
+        
+        if rowcount == 0:
+            # Première séquence pour ce couple: créer la ligne puis réserver
+            db.execute_query(
+                "INSERT IGNORE INTO sequences (subcategory_id, year, current_sequence) VALUES (%s, %s, 0)",
+                (subcategory_id, year)
+            )
+            rowcount, last_id = db.execute_with_last_id(query, (count, subcategory_id, year))
+        
+        if not last_id:
+            last_id = db.execute_query("SELECT LAST_INSERT_ID() as id")[0]['id']
+        
+        return last_id - count + 1
+    
+    def next(self, subcategory_id, year):
+        """Obtenir le prochain numéro, servi depuis un bloc réservé en mémoire"""
+        if self.block_size <= 1:
+            return self.reserve(subcategory_id, year, 1)
+        
+        key = (subcategory_id, year)
+        with self._key_lock(key):
+            block = self._blocks.get(key)
+            if not block or block[0] > block[1]:
+                start = self.reserve(subcategory_id, year, self.block_size)
+                block = [start, start + self.block_size - 1]
+                self._blocks[key] = block
+            sequence = block[0]
+            block[0] += 1
+            return sequence
+    
+    def _key_lock(self, key):
+        """Verrou d'un couple (sous-catégorie, année), créé au premier usage"""
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+    
+    def invalidate(self, subcategory_id=None, year=None):
+        """Abandonner les blocs en mémoire (les numéros non servis sont perdus)"""
+        with self._lock:
+            if subcategory_id is None:
+                self._blocks.clear()
+            else:
+                self._blocks.pop((subcategory_id, year), None)
+
+# Instance globale de l'allocateur de séquences
+sequence_allocator = SequenceAllocator()
+
+def benchmark(threads, allocations, block_sizes):
+    """Mesurer le débit d'allocation avec de nombreux écrivains concurrents"""
+    from routes.utils import get_or_create_category, get_or_create_subcategory
+    
+    # Séquence dédiée au benchmark (année hors plage réelle)
+    category_id = get_or_create_category("BENCH")
+    subcategory_id = get_or_create_subcategory(category_id, "SEQUENCES")
+    year = 1900
+    
+    for block_size in block_sizes:
+        db.execute_query("DELETE FROM sequences WHERE subcategory_id = %s AND year = %s", (subcategory_id, year))
+        allocator = SequenceAllocator(block_size=block_size)
+        results = [[] for _ in range(threads)]
+        errors = []
+        
+        def writer(index):
+            try:
+                for _ in range(allocations):
+                    results[index].append(allocator.next(subcategory_id, year))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                db.release_connection()
+        
+        workers = [threading.Thread(target=writer, args=(i,)) for i in range(threads)]
+        start = time.monotonic()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.monotonic() - start
+        
+        allocated = [n for result in results for n in result]
+        duplicates = len(allocated) - len(set(allocated))
+        logger.info(
+            f"Bloc {block_size}: {len(allocated)} numéros en {elapsed:.2f}s "
+            f"({len(allocated) / elapsed:.0f}/s), {threads} écrivains, "
+            f"{duplicates} doublons, {len(errors)} erreurs"
+        )
+    
+    db.execute_query("DELETE FROM sequences WHERE subcategory_id = %s AND year = %s", (subcategory_id, year))
+    logger.info(f"Pool MySQL: {db.pool_stats()}")
+
+def main():
+    """Benchmark de l'allocateur de séquences en ligne de commande"""
+    parser = argparse.ArgumentParser(description="Benchmark de l'allocation concurrente des séquences")
+    parser.add_argument('--threads', type=int, default=32, help="Nombre d'écrivains concurrents")
+    parser.add_argument('--allocations', type=int, default=500, help="Numéros alloués par écrivain")
+    parser.add_argument('--block-sizes', default='1,10,100',
+                        help="Tailles de bloc à comparer, séparées par des virgules")
+    args = parser.parse_args()
+    
+    benchmark(args.threads, args.allocations, [int(size) for size in args.block_sizes.split(',')])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import os
+from scan_manifest import ScanManifest
+
+def _write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+
+def _touch_dir(path, offset_ns):
+    """Changer le mtime d'un dossier de façon déterministe (granularité du système de fichiers)"""
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + offset_ns))
+
+def _initial(root, tmp_path):
+    manifest = ScanManifest(str(tmp_path / 'manifest.json'))
+    manifest.directories, changes = manifest.diff(root)
+    return manifest, changes
+
+def test_first_diff_reports_everything_as_new(tmp_path):
+    root = tmp_path / 'Archives'
+    _write(root / 'FINANCE' / 'FACTURES' / '2024' / 'a.pdf', b'a')
+    _write(root / 'FINANCE' / 'FACTURES' / '2024' / 'notes.txt', b'ignored')
+    
+    _, changes = _initial(root, tmp_path)
+    
+    assert changes['new_files'] == [root / 'FINANCE' / 'FACTURES' / '2024' / 'a.pdf']
+    assert changes['modified_files'] == []
+    assert changes['deleted_files'] == []
+    assert len(changes['new_dirs']) == 4
+
+def test_unchanged_tree_skips_every_directory(tmp_path):
+    root = tmp_path / 'Archives'
+    _write(root / 'FINANCE' / 'FACTURES' / '2024' / 'a.pdf', b'a')
+    manifest, _ = _initial(root, tmp_path)
+    
+    _, changes = manifest.diff(root)
+    
+    assert changes['listed_dirs'] == 0
+    assert changes['new_files'] == changes['modified_files'] == changes['deleted_files'] == []
+
+def test_file_replaced_under_same_name_is_modified(tmp_path):
+    root = tmp_path / 'Archives'
+    year = root / 'FINANCE' / 'FACTURES' / '2024'
+    _write(year / 'a.pdf', b'old')
+    _write(year / 'b.pdf', b'kept')
+    manifest, _ = _initial(root, tmp_path)
+    
+    # mv new.pdf a.pdf: nouvel inode, nouveau contenu, mtime du dossier modifié
+    _write(year / 'new.pdf', b'new content')
+    os.replace(year / 'new.pdf', year / 'a.pdf')
+    _touch_dir(year, 1_000_000)
+    
+    _, changes = manifest.diff(root)
+    
+    assert changes['modified_files'] == [year / 'a.pdf']
+    assert changes['new_files'] == []
+    assert changes['deleted_files'] == []
+
+def test_added_and_deleted_files_in_relisted_directory(tmp_path):
+    root = tmp_path / 'Archives'
+    year = root / 'FINANCE' / 'FACTURES' / '2024'
+    _write(year / 'a.pdf', b'a')
+    manifest, _ = _initial(root, tmp_path)
+    
+    (year / 'a.pdf').unlink()
+    _write(year / 'c.pdf', b'c')
+    _touch_dir(year, 1_000_000)
+    
+    _, changes = manifest.diff(root)
+    
+    assert changes['new_files'] == [year / 'c.pdf']
+    assert changes['deleted_files'] == [f"{ScanManifest.key(year)}/a.pdf"]
+    assert changes['modified_files'] == []
+
+def test_removed_directory_deletes_its_files(tmp_path):
+    root = tmp_path / 'Archives'
+    year = root / 'FINANCE' / 'FACTURES' / '2024'
+    _write(year / 'a.pdf', b'a')
+    manifest, _ = _initial(root, tmp_path)
+    
+    (year / 'a.pdf').unlink()
+    year.rmdir()
+    _touch_dir(year.parent, 1_000_000)
+    
+    _, changes = manifest.diff(root)
+    
+    assert changes['deleted_files'] == [f"{ScanManifest.key(year)}/a.pdf"]
+
+def test_mark_modified_reports_file_again(tmp_path):
+    root = tmp_path / 'Archives'
+    year = root / 'FINANCE' / 'FACTURES' / '2024'
+    _write(year / 'a.pdf', b'a')
+    manifest, _ = _initial(root, tmp_path)
+    
+    manifest.mark_modified(manifest.directories, year / 'a.pdf')
+    _, changes = manifest.diff(root)
+    
+    assert changes['modified_files'] == [year / 'a.pdf']
+    assert changes['new_files'] == []
+
+def test_forget_directory_reports_it_as_new_again(tmp_path):
+    root = tmp_path / 'Archives'
+    subcategory = root / 'FINANCE' / 'FACTURES'
+    _write(subcategory / '2024' / 'a.pdf', b'a')
+    manifest, _ = _initial(root, tmp_path)
+    
+    manifest.forget_directory(manifest.directories, subcategory)
+    _, changes = manifest.diff(root)
+    
+    assert changes['new_dirs'] == [subcategory]
+    assert changes['new_files'] == []
@@ -0,0 +1,152 @@
+"""
+Export en flux des PDF d'une catégorie, sous-catégorie ou année dans une archive ZIP
+"""
+
+import os
+import zipfile
+import logging
+import argparse
+from database import db
+from dotenv import load_dotenv
+
+# Charger les variables d'environnement
+load_dotenv()
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Taille des blocs lus dans chaque PDF
+ZIP_CHUNK_SIZE = 1024 * 1024
+
+# Mêmes jointures que la résolution des QR de sous-catégorie, filtres ajoutés selon la sélection
+EXPORT_JOINS = """
+FROM documents d
+JOIN subcategories sc ON d.subcategory_id = sc.id
+JOIN categories c ON sc.category_id = c.id
+"""
+
+class _ZipStream:
+    """Tampon d'écriture non positionnable: zipfile y écrit, le générateur le vide au fil de l'eau"""
+    
+    def __init__(self):
+        self._chunks = []
+    
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def drain(self):
+        """Récupérer les octets écrits depuis le dernier appel"""
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def export_filename(category=None, subcategory=None, year=None):
+    """Nom de l'archive d'après la sélection (export-FINANCE-FACTURES-2024.zip)"""
+    parts = [str(part) for part in (category, subcategory, year) if part]
+    return f"export-{'-'.join(parts) or 'archives'}.zip"
+
+def _export_conditions(category=None, subcategory=None, year=None):
+    """Clause WHERE et paramètres d'une sélection"""
+    conditions = []
+    params = []
+    if category:
+        conditions.append("c.name = %s")
+        params.append(category)
+    if subcategory:
+        conditions.append("sc.name = %s")
+        params.append(subcategory)
+    if year:
+        conditions.append("d.year = %s")
+        params.append(year)
+    
+    return ' AND '.join(conditions) or '1 = 1', tuple(params)
+
+def has_export_documents(category=None, subcategory=None, year=None):
+    """La sélection contient au moins un document"""
+    where, params = _export_conditions(category, subcategory, year)
+    return bool(db.execute_query_safe(f"SELECT 1 {EXPORT_JOINS} WHERE {where} LIMIT 1", params))
+
+def iter_export_documents(category=None, subcategory=None, year=None, chunk_size=1000):
+    """Documents de la sélection, lus en flux depuis la base"""
+    where, params = _export_conditions(category, subcategory, year)
+    query = f"""
+    SELECT d.document_code, d.filename, d.file_path, d.year, c.name as category_name, sc.name as subcategory_name
+    {EXPORT_JOINS}
+    WHERE {where}
+    ORDER BY c.name, sc.name, d.year, d.filename
+    """
+    return db.stream_query(query, params, chunk_size=chunk_size)
+
+def iter_zip(documents, archives_folder=None, chunk_size=ZIP_CHUNK_SIZE):
+    """Produire l'archive ZIP par morceaux (entrées stockées sans compression: les PDF le sont déjà)
+    
+    Seuls le bloc en cours de lecture et le répertoire central (quelques centaines
+    d'octets par entrée) sont en mémoire, quelle que soit la taille de l'export.
+    """
+    archives_folder = archives_folder or os.environ.get('ARCHIVES_FOLDER', 'Archives')
+    archives_root = os.path.realpath(archives_folder)
+    stream = _ZipStream()
+    missing = []
+    exported = 0
+    
+    # Sortie non positionnable: zipfile écrit des descripteurs de données et passe en ZIP64 si besoin
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for document in documents:
+            path = os.path.realpath(document['file_path'])
+            if os.path.commonpath([archives_root, path]) != archives_root or not os.path.isfile(path):
+                missing.append(document['file_path'])
+                continue
+            
+            # Arborescence de l'archive: <catégorie>/<sous-catégorie>/<année>/<fichier>
+            arcname = os.path.relpath(path, archives_root).replace(os.sep, '/')
+            info = zipfile.ZipInfo.from_file(path, arcname, strict_timestamps=False)
+            info.compress_type = zipfile.ZIP_STORED
+            
+            try:
+                with open(path, 'rb') as source, archive.open(info, 'w') as target:
+                    while True:
+                        chunk = source.read(chunk_size)
+                        if not chunk:
+                            break
+                        target.write(chunk)
+                        data = stream.drain()
+                        if data:
+                            yield data
+            except OSError as e:
+                # L'en-tête local est peut-être déjà parti: l'archive ne peut plus être réparée
+                logger.error(f"Erreur de lecture de {document['file_path']} pendant l'export: {e}")
+                raise
+            exported += 1
+        
+        if missing:
+            archive.writestr('FICHIERS_MANQUANTS.txt', '\n'.join(missing) + '\n')
+            logger.warning(f"Export ZIP: {len(missing)} fichiers introuvables listés dans FICHIERS_MANQUANTS.txt")
+    
+    logger.info(f"Export ZIP terminé: {exported} documents")
+    yield stream.drain()
+
+def main():
+    """Exporter une sélection de documents en ZIP depuis la ligne de commande"""
+    parser = argparse.ArgumentParser(description="Exporter les PDF d'une catégorie, sous-catégorie ou année en ZIP")
+    parser.add_argument('--category', help="Nom de la catégorie")
+    parser.add_argument('--subcategory', help="Nom de la sous-catégorie")
+    parser.add_argument('--year', type=int, help="Année des documents")
+    parser.add_argument('-o', '--output', default=None, help="Fichier de sortie (défaut: export-<sélection>.zip)")
+    args = parser.parse_args()
+    
+    if not (args.category or args.subcategory or args.year):
+        parser.error("Préciser au moins --category, --subcategory ou --year")
+    
+    output = args.output or export_filename(args.category, args.subcategory, args.year)
+    with open(output, 'wb') as f:
+        for chunk in iter_zip(iter_export_documents(args.category, args.subcategory, args.year)):
+            f.write(chunk)
+    logger.info(f"Archive écrite: {output}")
+
+if __name__ == "__main__":
+    main()